@@ -0,0 +1,136 @@
+"""
+Índice de acesso: quais colaboradores cada usuário pode ver.
+
+- staff/superusuário: todos (sem filtro);
+- todo usuário: o próprio cadastro de colaborador;
+- gestor: os colaboradores que têm o seu cadastro como gestor, e os
+  liderados desses, em cascata. Vale o campo gestor; cadastros só com
+  gestor_nome usam o nome, e só quando ele é de um único colaborador
+  (homônimos não herdam a equipe de ninguém);
+- permissão por objeto do django-guardian (accounts.view_collaborator), dada
+  ao usuário ou a um grupo dele.
+
+O índice inteiro ({user_id: ids}) é montado de uma vez, com poucas
+consultas, e fica no cache com uma versão na chave; os sinais de
+accounts/signals.py trocam a versão quando cadastro, grupos ou permissões
+mudam. As telas aplicam o resultado como um único filtro IN
+(scope_collaborators) em vez de checar permissão colaborador a colaborador.
+"""
+from __future__ import annotations
+
+import unicodedata
+from collections import defaultdict
+from typing import Dict, FrozenSet, Optional
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from guardian.models import GroupObjectPermission, UserObjectPermission
+
+from metrics.versions import bump_cache_version, cache_timeout, cache_version
+
+from .models import Collaborator
+
+ACCESS_VERSION_KEY = "accounts:access_version"
+VIEW_PERMISSION = "view_collaborator"
+
+# segundos que o índice fica no cache sem mudança (a troca de versão invalida antes;
+# em cache local, por processo, vale cache_timeout: no máximo LOCAL_CACHE_SECONDS)
+INDEX_TIMEOUT = 24 * 60 * 60
+
+
+def _norm(name: str) -> str:
+    name = unicodedata.normalize("NFD", (name or "").strip().lower())
+    return " ".join("".join(ch for ch in name if unicodedata.category(ch) != "Mn").split())
+
+
+def build_index() -> Dict[int, FrozenSet[int]]:
+    """{user_id: ids de colaborador visíveis} de todos os usuários que não são staff."""
+    User = get_user_model()
+    visible: Dict[int, set] = defaultdict(set)
+
+    rows = list(Collaborator.objects.values_list("id", "user_id", "nome", "gestor_id", "gestor_nome"))
+
+    # nome -> colaborador, só para nomes sem homônimo
+    by_name: Dict[str, Optional[int]] = {}
+    for cid, _, nome, _, _ in rows:
+        key = _norm(nome)
+        by_name[key] = None if key in by_name else cid
+
+    # liderados diretos por id do gestor
+    reports: Dict[int, list] = defaultdict(list)
+    for cid, _, _, gestor_id, gestor_nome in rows:
+        if gestor_id is None and gestor_nome:
+            gestor_id = by_name.get(_norm(gestor_nome))
+        if gestor_id is not None:
+            reports[gestor_id].append(cid)
+
+    for cid, user_id, _, _, _ in rows:
+        if user_id is None:
+            continue
+        ids = visible[user_id]
+        ids.add(cid)
+        # cascata: liderados dos liderados (seen evita ciclo gestor <-> liderado)
+        pending, seen = [cid], set()
+        while pending:
+            key = pending.pop()
+            if key in seen:
+                continue
+            seen.add(key)
+            for report_id in reports.get(key, ()):
+                ids.add(report_id)
+                pending.append(report_id)
+
+    ct = ContentType.objects.get_for_model(Collaborator)
+    for user_id, object_pk in UserObjectPermission.objects.filter(
+        content_type=ct, permission__codename=VIEW_PERMISSION,
+    ).values_list("user_id", "object_pk"):
+        visible[user_id].add(int(object_pk))
+
+    by_group: Dict[int, set] = defaultdict(set)
+    for group_id, object_pk in GroupObjectPermission.objects.filter(
+        content_type=ct, permission__codename=VIEW_PERMISSION,
+    ).values_list("group_id", "object_pk"):
+        by_group[group_id].add(int(object_pk))
+    if by_group:
+        for user_id, group_id in User.groups.through.objects.filter(
+            group_id__in=list(by_group),
+        ).values_list("user_id", "group_id"):
+            visible[user_id] |= by_group[group_id]
+
+    return {user_id: frozenset(ids) for user_id, ids in visible.items()}
+
+
+def access_index() -> Dict[int, FrozenSet[int]]:
+    key = f"access-index:{cache_version(ACCESS_VERSION_KEY)}"
+    index = cache.get(key)
+    if index is None:
+        index = build_index()
+        cache.set(key, index, cache_timeout(INDEX_TIMEOUT))
+    return index
+
+
+def invalidate_access_index() -> None:
+    bump_cache_version(ACCESS_VERSION_KEY)
+
+
+def visible_collaborator_ids(user) -> Optional[FrozenSet[int]]:
+    """Ids que o usuário pode ver; None = todos (staff)."""
+    if not user.is_authenticated:
+        return frozenset()
+    if user.is_staff or user.is_superuser:
+        return None
+    return access_index().get(user.pk, frozenset())
+
+
+def can_view(user, collaborator_id: int) -> bool:
+    ids = visible_collaborator_ids(user)
+    return ids is None or collaborator_id in ids
+
+
+def scope_collaborators(qs, user, field: str = "collaborator_id"):
+    """Restringe um queryset aos colaboradores visíveis, num filtro IN só."""
+    ids = visible_collaborator_ids(user)
+    if ids is None:
+        return qs
+    return qs.filter(**{f"{field}__in": sorted(ids)})
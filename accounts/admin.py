@@ -3,4 +3,5 @@ from .models import Collaborator
 @admin.register(Collaborator)
 class CAdmin(admin.ModelAdmin):
     list_display = ("colaborador_id", "nome", "equipe", "ativo")
-    search_fields = ("colaborador_id", "nome", "equipe")
\ No newline at end of file
+    search_fields = ("colaborador_id", "nome", "equipe")
+    autocomplete_fields = ("gestor",)
\ No newline at end of file
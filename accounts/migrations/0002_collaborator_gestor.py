@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:25
+
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _norm(name):
+    name = unicodedata.normalize("NFD", (name or "").strip().lower())
+    return " ".join("".join(ch for ch in name if unicodedata.category(ch) != "Mn").split())
+
+
+def fill_gestor(apps, schema_editor):
+    """gestor a partir de gestor_nome, só quando o nome é de um único colaborador."""
+    Collaborator = apps.get_model("accounts", "Collaborator")
+    by_name = {}
+    for cid, nome in Collaborator.objects.values_list("id", "nome"):
+        key = _norm(nome)
+        by_name[key] = None if key in by_name else cid
+    for cid, gestor_nome in Collaborator.objects.exclude(gestor_nome="").values_list("id", "gestor_nome"):
+        gestor_id = by_name.get(_norm(gestor_nome))
+        if gestor_id is not None and gestor_id != cid:
+            Collaborator.objects.filter(pk=cid).update(gestor_id=gestor_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collaborator',
+            name='gestor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='liderados', to='accounts.collaborator'),
+        ),
+        migrations.RunPython(fill_gestor, migrations.RunPython.noop),
+    ]
@@ -8,6 +8,8 @@ class Collaborator(models.Model):
     nome = models.CharField(max_length=255)
     equipe = models.CharField(max_length=255, blank=True)
     gestor_nome = models.CharField(max_length=255, blank=True)
+    # gestor de fato (índice de acesso); gestor_nome fica como texto de cadastro
+    gestor = models.ForeignKey("self", null=True, blank=True, on_delete=models.SET_NULL, related_name="liderados")
     ativo = models.BooleanField(default=True)
 
 
@@ -1,5 +1,10 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from allauth.account.signals import user_logged_in, user_signed_up
+from guardian.models import GroupObjectPermission, UserObjectPermission
+from .access import VIEW_PERMISSION, invalidate_access_index
 from .models import Collaborator
 
 def _ensure_collaborator(user):
@@ -19,3 +24,23 @@ def on_user_signed_up(request, user, **kwargs):
 @receiver(user_logged_in)
 def on_user_logged_in(request, user, **kwargs):
     _ensure_collaborator(user)
+
+
+# ---------- índice de acesso (accounts/access.py) ----------
+
+def _access_changed(**kwargs):
+    # depois do commit, para o índice novo não ser montado com dados antigos
+    transaction.on_commit(invalidate_access_index)
+
+
+def _on_object_permission(sender, instance, **kwargs):
+    if instance.permission.codename == VIEW_PERMISSION:
+        _access_changed()
+
+
+post_save.connect(_access_changed, sender=Collaborator, dispatch_uid="access_collaborator_saved")
+post_delete.connect(_access_changed, sender=Collaborator, dispatch_uid="access_collaborator_deleted")
+m2m_changed.connect(_access_changed, sender=get_user_model().groups.through, dispatch_uid="access_user_groups")
+for model in (UserObjectPermission, GroupObjectPermission):
+    post_save.connect(_on_object_permission, sender=model, dispatch_uid=f"access_{model.__name__}_saved")
+    post_delete.connect(_on_object_permission, sender=model, dispatch_uid=f"access_{model.__name__}_deleted")
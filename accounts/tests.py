@@ -1,3 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
 from django.test import TestCase
+from guardian.shortcuts import assign_perm
 
-# Create your tests here.
+from .access import build_index, can_view, scope_collaborators, visible_collaborator_ids
+from .models import Collaborator
+
+User = get_user_model()
+
+
+class AccessIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.boss_user = User.objects.create_user("chefe")
+        self.boss = Collaborator.objects.create(user=self.boss_user, colaborador_id="G1", nome="Ana Chefe")
+        self.lead = Collaborator.objects.create(colaborador_id="L1", nome="Lia Líder", gestor=self.boss)
+        self.agent = Collaborator.objects.create(colaborador_id="A1", nome="Alan", gestor=self.lead)
+        self.other = Collaborator.objects.create(colaborador_id="O1", nome="Olga")
+
+    def visible(self, user):
+        return build_index().get(user.pk, frozenset())
+
+    def test_cascade_through_gestor(self):
+        self.assertEqual(self.visible(self.boss_user), {self.boss.id, self.lead.id, self.agent.id})
+
+    def test_plain_user_sees_only_own_record(self):
+        user = User.objects.create_user("olga")
+        Collaborator.objects.filter(pk=self.other.pk).update(user=user)
+        self.assertEqual(self.visible(user), {self.other.id})
+
+    def test_staff_is_not_filtered(self):
+        staff = User.objects.create_user("staff", is_staff=True)
+        self.assertIsNone(visible_collaborator_ids(staff))
+        qs = Collaborator.objects.all()
+        self.assertEqual(scope_collaborators(qs, staff, field="id").count(), 4)
+
+    def test_gestor_nome_fallback_only_when_unique(self):
+        named = Collaborator.objects.create(colaborador_id="N1", nome="Nina", gestor_nome="ana  chefe")
+        self.assertIn(named.id, self.visible(self.boss_user))
+
+        # homônimo: o nome deixa de apontar para alguém
+        twin_user = User.objects.create_user("homonimo")
+        twin = Collaborator.objects.create(user=twin_user, colaborador_id="G2", nome="Ana Chefe")
+        self.assertNotIn(named.id, self.visible(self.boss_user))
+        self.assertEqual(self.visible(twin_user), {twin.id})
+        # o gestor de fato continua valendo
+        self.assertIn(self.agent.id, self.visible(self.boss_user))
+
+    def test_cycle_does_not_loop(self):
+        Collaborator.objects.filter(pk=self.boss.pk).update(gestor=self.agent)
+        self.assertEqual(self.visible(self.boss_user), {self.boss.id, self.lead.id, self.agent.id})
+
+    def test_object_permission_for_user_and_group(self):
+        user = User.objects.create_user("auditor")
+        assign_perm("accounts.view_collaborator", user, self.other)
+        group = Group.objects.create(name="rh")
+        user.groups.add(group)
+        assign_perm("accounts.view_collaborator", group, self.agent)
+        self.assertEqual(self.visible(user), {self.other.id, self.agent.id})
+
+    def test_index_is_rebuilt_after_commit(self):
+        user = User.objects.create_user("novo")
+        self.assertFalse(can_view(user, self.other.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.user = user
+            self.other.save()
+        self.assertTrue(can_view(user, self.other.id))
+        self.assertEqual(
+            list(scope_collaborators(Collaborator.objects.all(), user, field="id")), [self.other],
+        )
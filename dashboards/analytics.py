@@ -0,0 +1,177 @@
+"""
+Comparativo do colaborador com a equipe: média da equipe, quartis e posição
+por métrica num período.
+
+Uma consulta por equipe/período: as médias por colaborador (valores > 0,
+como no dashboard) são agregadas no banco e ranqueadas com funções de
+janela (RANK/CUME_DIST/SUM OVER por métrica), sem trazer os registros da
+equipe para a memória. O mesmo SQL roda no PostgreSQL e no SQLite >= 3.25;
+em bancos sem janela as posições são calculadas a partir das médias.
+
+O resultado da equipe inteira vai para o cache com a versão dos dados na
+chave (metrics/versions.py): todos os colaboradores da equipe usam a mesma
+entrada, e um import ou mudança de meta invalida tudo de uma vez.
+"""
+from __future__ import annotations
+
+import hashlib
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+
+from accounts.models import Collaborator
+from metrics.models import MetricRecord, MetricType
+from metrics.versions import cache_timeout, data_version
+
+_PER_COLLAB = """
+    SELECT r.metric_type_id AS metric_id, r.collaborator_id AS collaborator_id,
+           COUNT(*) AS n, SUM(r.value) AS total, AVG(r.value) AS avg_value
+    FROM {record} r
+    JOIN {collab} c ON c.id = r.collaborator_id
+    WHERE c.equipe = %s AND r.value > 0{period}
+    GROUP BY r.metric_type_id, r.collaborator_id
+"""
+
+_RANKED = """
+WITH per_collab AS ({per_collab})
+SELECT metric_id, collaborator_id, avg_value,
+       RANK() OVER (PARTITION BY metric_id ORDER BY avg_value DESC) AS rank_high,
+       RANK() OVER (PARTITION BY metric_id ORDER BY avg_value ASC) AS rank_low,
+       CUME_DIST() OVER (PARTITION BY metric_id ORDER BY avg_value ASC) AS cume_high,
+       CUME_DIST() OVER (PARTITION BY metric_id ORDER BY avg_value DESC) AS cume_low,
+       SUM(total) OVER (PARTITION BY metric_id) AS team_total,
+       SUM(n) OVER (PARTITION BY metric_id) AS team_n
+FROM per_collab
+ORDER BY metric_id, avg_value
+"""
+
+
+def _connection():
+    """Banco de leitura do request (réplica sob @use_replica), como o ORM escolheria para MetricRecord."""
+    return connections[router.db_for_read(MetricRecord)]
+
+
+def _sql(connection, template: str, start: date | None, end: date | None):
+    period, params = "", []
+    if start:
+        period += " AND r.date >= %s"
+        params.append(start)
+    if end:
+        period += " AND r.date <= %s"
+        params.append(end)
+    per_collab = _PER_COLLAB.format(
+        record=connection.ops.quote_name(MetricRecord._meta.db_table),
+        collab=connection.ops.quote_name(Collaborator._meta.db_table),
+        period=period,
+    )
+    return template.format(per_collab=per_collab), params
+
+
+def percentile_cont(ordered: List[float], q: float) -> Optional[float]:
+    """Mesmo cálculo do percentile_cont do PostgreSQL (interpolação linear)."""
+    if not ordered:
+        return None
+    pos = q * (len(ordered) - 1)
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def _ranked_rows(equipe: str, start: date | None, end: date | None):
+    """(metric_id, collaborator_id, média, rank_high, rank_low, cume_high, cume_low, total, n) por colaborador."""
+    connection = _connection()
+    if connection.features.supports_over_clause:
+        sql, params = _sql(connection, _RANKED, start, end)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [equipe, *params])
+            yield from cursor.fetchall()
+        return
+
+    # sem funções de janela: mesmas colunas a partir das médias por colaborador
+    sql, params = _sql(connection, "{per_collab}", start, end)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [equipe, *params])
+        by_metric = defaultdict(list)
+        for metric_id, collaborator_id, n, total, avg_value in cursor.fetchall():
+            by_metric[metric_id].append((collaborator_id, n, total, avg_value))
+    for metric_id, rows in sorted(by_metric.items()):
+        avgs = sorted(r[3] for r in rows)
+        size = len(avgs)
+        team_total = sum(r[2] for r in rows)
+        team_n = sum(r[1] for r in rows)
+        for collaborator_id, _, _, avg_value in sorted(rows, key=lambda r: r[3]):
+            below = sum(1 for a in avgs if a < avg_value)
+            above = sum(1 for a in avgs if a > avg_value)
+            yield (
+                metric_id, collaborator_id, avg_value,
+                above + 1, below + 1,
+                (size - above) / size, (size - below) / size,
+                team_total, team_n,
+            )
+
+
+def compute_team(equipe: str, start: date | None, end: date | None, metrics: List[MetricType]) -> Dict:
+    """
+    {"metrics": {code: {"team_avg", "size", "p25", "p50", "p75"}},
+     "members": {collaborator_id: {code: {"avg", "rank", "percentile"}}}}.
+    rank 1 = melhor da equipe e percentile 1.0 = à frente de todos, conforme
+    better_when da métrica.
+    """
+    by_id = {m.id: m for m in metrics}
+    ordered: Dict[int, List[float]] = defaultdict(list)
+    team: Dict[str, Dict] = {}
+    members: Dict[int, Dict[str, Dict]] = defaultdict(dict)
+    for metric_id, collaborator_id, avg_value, rank_high, rank_low, cume_high, cume_low, total, n in _ranked_rows(equipe, start, end):
+        m = by_id.get(metric_id)
+        if m is None:
+            continue
+        higher = m.better_when == "higher"
+        ordered[metric_id].append(float(avg_value))
+        team[m.code] = {"team_avg": float(total) / n if n else None}
+        members[collaborator_id][m.code] = {
+            "avg": float(avg_value),
+            "rank": rank_high if higher else rank_low,
+            "percentile": float(cume_high if higher else cume_low),
+        }
+    for metric_id, values in ordered.items():
+        team[by_id[metric_id].code].update({
+            "size": len(values),
+            "p25": percentile_cont(values, 0.25),
+            "p50": percentile_cont(values, 0.5),
+            "p75": percentile_cont(values, 0.75),
+        })
+    return {"metrics": team, "members": dict(members)}
+
+
+def _cache_key(equipe: str, start: date | None, end: date | None) -> str:
+    team = hashlib.sha1(equipe.encode()).hexdigest()[:16]
+    return f"team-analytics:{data_version()}:{team}:{start or ''}:{end or ''}"
+
+
+def team_analytics(equipe: str, start: date | None, end: date | None, metrics: List[MetricType]) -> Dict:
+    """compute_team com cache por equipe, período e versão dos dados."""
+    key = _cache_key(equipe, start, end)
+    result = cache.get(key)
+    if result is None:
+        result = compute_team(equipe, start, end, metrics)
+        cache.set(key, result, cache_timeout(getattr(settings, "TEAM_ANALYTICS_CACHE_SECONDS", 3600)))
+    return result
+
+
+def load_team_comparison(collab: Collaborator, start: date | None, end: date | None, metrics: List[MetricType]) -> Dict:
+    """
+    "Você x equipe" por código de métrica: {code: {"team_avg", "size",
+    "p25", "p50", "p75", "rank", "percentile"}}. Vazio para quem não tem equipe.
+    """
+    if not collab.equipe:
+        return {}
+    data = team_analytics(collab.equipe, start, end, metrics)
+    mine = data["members"].get(collab.id, {})
+    return {
+        code: {**stats, **{k: v for k, v in mine.get(code, {}).items() if k != "avg"}}
+        for code, stats in data["metrics"].items()
+    }
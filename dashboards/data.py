@@ -0,0 +1,219 @@
+"""
+Consultas do dashboard individual.
+
+Cada função recebe o colaborador/período (ou o queryset já filtrado) e é
+independente das demais, para que a versão assíncrona possa rodá-las em
+paralelo (ver views.my_dashboard_data).
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db.models import Avg, Count, Q, Sum
+
+from metrics.models import MetricMonthStat, MetricType, MetricRecord
+from metrics.targets import month_start, next_month, timeline_for, timelines_for
+
+SECTIONS = [
+    ("bonus", "Bônus"),
+    ("rv", "Remuneração Variável"),
+    ("ics_ivs", "ICS e IVS"),
+]
+
+
+def looks_like_time_metric(m: MetricType) -> bool:
+    code = (m.code or "").lower()
+    unit = (m.unit or "").lower()
+    name = (m.name or "").lower()
+    hints = ("time", "tempo", "hh:mm", "hhmm", "ti", "duracao", "duração", "sla")
+    unit_hints = ("min", "minuto", "minutos", "hora", "horas", "h")
+    return any(h in code for h in hints) or any(h in name for h in hints) or any(u in unit for u in unit_hints)
+
+
+def group_key_for_metric(m: MetricType) -> str:
+    import unicodedata
+    def norm(s: str) -> str:
+        s = (s or "").lower()
+        s = unicodedata.normalize("NFD", s)
+        return "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
+    name = norm(m.name); code = norm(m.code)
+    if ("aderencia" in name and "raio" in name) or ("aderencia" in code and "raio" in code):
+        return "bonus"
+    if ("aderencia" in name and "checklist" in name) or ("aderencia" in code and "checklist" in code):
+        return "bonus"
+    if ("producao" in name) or ("producao" in code):
+        return "rv"
+    if ("devolucao" in name) or ("devolucao" in code):
+        return "rv"
+    return "ics_ivs"
+
+
+def period_queryset(collaborator_id: int, start: date | None, end: date | None):
+    base_q = MetricRecord.objects.filter(collaborator_id=collaborator_id)
+    if start:
+        base_q = base_q.filter(date__gte=start)
+    if end:
+        base_q = base_q.filter(date__lte=end)
+    return base_q
+
+
+def build_meta(all_metrics, equipe: str = "", on: date | None = None) -> tuple[dict, list]:
+    """
+    Metadados por código de métrica e seções (Bônus, RV, ICS e IVS).
+    target_value/better_when são os da meta vigente em `on` (padrão: hoje)
+    para a equipe; "targets" traz as vigências para a linha de meta do gráfico.
+    """
+    on = on or date.today()
+    timelines = timelines_for(all_metrics)
+    meta = {}
+    by_group = {key: [] for key, _ in SECTIONS}
+    for m in all_metrics:
+        timeline = timeline_for(timelines[m.id], equipe)
+        current = timeline.at(on)
+        meta[m.code] = {
+            "name": m.name,
+            "unit": m.unit or "",
+            "is_time": looks_like_time_metric(m),
+            "target_value": current.target_value,
+            "better_when": current.better_when,
+            "targets": [p.as_json() for p in timeline.periods],
+        }
+        by_group[group_key_for_metric(m)].append(m.code)
+    sections = [{"key": key, "title": title, "codes": by_group[key]} for key, title in SECTIONS]
+    return meta, sections
+
+
+def load_series(base_q, all_metrics) -> dict:
+    """
+    {code: {"dates": ["YYYY-MM-DD", ...], "values": [float, ...]}} para todas
+    as métricas em uma consulta. Colunas em vez de um dict por ponto: o JSON
+    sai menor e o gráfico usa "values" direto.
+    """
+    code_by_id = {m.id: m.code for m in all_metrics}
+    series = {m.code: {"dates": [], "values": []} for m in all_metrics}
+    rows = base_q.order_by("metric_type_id", "date").values_list("metric_type_id", "date", "value")
+    current_id, dates, values = None, None, None
+    for metric_id, d, value in rows:
+        if metric_id != current_id:
+            current_id = metric_id
+            code = code_by_id.get(metric_id)
+            column = series.get(code)
+            dates, values = (column["dates"], column["values"]) if column else (None, None)
+        if dates is not None:
+            dates.append(d.isoformat())
+            values.append(value)
+    return series
+
+
+def _full_months(start: date | None, end: date | None) -> tuple[date, date] | None:
+    """[primeiro mês, mês seguinte ao último) dos meses inteiros do período, ou None."""
+    if not start or not end:
+        return None
+    first = start if start.day == 1 else next_month(start)
+    after = next_month(end) if (end + timedelta(days=1)).day == 1 else month_start(end)
+    return (first, after) if first < after else None
+
+
+def load_self_stats(collaborator_id: int, start: date | None, end: date | None) -> dict:
+    """
+    Média e contagem por métrica (ignora zeros). Meses inteiros do período
+    vêm dos contadores mensais (MetricMonthStat); só as pontas parciais
+    são agregadas a partir dos registros.
+    """
+    acc = defaultdict(lambda: [0, 0.0])  # code -> [n, soma]
+    months = _full_months(start, end)
+    if months is None:
+        edges = [(start, end)]
+    else:
+        first, after = months
+        stats = MetricMonthStat.objects.filter(
+            collaborator_id=collaborator_id, month__gte=first, month__lt=after,
+        ).values_list("metric_type__code", "count", "total")
+        for code, n, total in stats:
+            acc[code][0] += n
+            acc[code][1] += total
+        edges = [
+            (a, b) for a, b in ((start, first - timedelta(days=1)), (after, end)) if a <= b
+        ]
+
+    for a, b in edges:
+        rows = (
+            period_queryset(collaborator_id, a, b).filter(value__gt=0)
+            .values("metric_type__code")
+            .annotate(n=Count("id"), total=Sum("value"))
+            .order_by()
+        )
+        for row in rows:
+            acc[row["metric_type__code"]][0] += row["n"]
+            acc[row["metric_type__code"]][1] += float(row["total"])
+
+    return {
+        code: {"avg": total / n if n else None, "count": n}
+        for code, (n, total) in acc.items()
+    }
+
+
+def load_fail_days(base_q, all_metrics) -> dict:
+    """
+    Dias fora da meta por métrica: {code: ["YYYY-MM-DD", ...]}. A situação
+    já vem gravada em target_status (índice parcial só das linhas fora da meta).
+    """
+    fail_days = {m.code: [] for m in all_metrics}
+    code_by_id = {m.id: m.code for m in all_metrics}
+    days_qs = (
+        base_q.filter(target_status=MetricRecord.TARGET_MISSED)
+              .order_by("metric_type_id", "date")
+              .values_list("metric_type_id", "date")
+    )
+    for metric_id, d in days_qs:
+        code = code_by_id.get(metric_id)
+        if code is not None:
+            fail_days[code].append(d.isoformat())
+    return fail_days
+
+
+def unmet_metric_codes(meta: dict, fail_days: dict, self_stats: dict) -> list:
+    """Códigos com algum dia fora da meta ou com a média fora da meta vigente (ver build_meta)."""
+    unmet_codes = [c for c, days in fail_days.items() if days]
+    for code, m in meta.items():
+        if code in unmet_codes:
+            continue
+        t = m["target_value"]
+        if t is None:
+            continue
+        stat = self_stats.get(code)
+        avg = stat["avg"] if stat else None
+        if avg is None:
+            continue
+        if (m["better_when"] == "higher" and avg < t) or (m["better_when"] == "lower" and avg > t):
+            unmet_codes.append(code)
+    return unmet_codes
+
+
+def load_team_stats(base_q, all_metrics) -> dict:
+    """
+    Média, quantidade e dias fora da meta por colaborador e métrica numa
+    consulta agregada: {collaborator_id: {code: {"avg", "count", "missed"}}}.
+    """
+    code_by_id = {m.id: m.code for m in all_metrics}
+    out = defaultdict(dict)
+    rows = (
+        base_q.filter(value__gt=0)
+        .values("collaborator_id", "metric_type_id")
+        .annotate(
+            avg=Avg("value"),
+            n=Count("id"),
+            missed=Count("id", filter=Q(target_status=MetricRecord.TARGET_MISSED)),
+        )
+        .order_by()
+    )
+    for row in rows:
+        code = code_by_id.get(row["metric_type_id"])
+        if code is not None:
+            out[row["collaborator_id"]][code] = {
+                "avg": float(row["avg"]),
+                "count": row["n"],
+                "missed": row["missed"],
+            }
+    return dict(out)
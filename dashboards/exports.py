@@ -0,0 +1,97 @@
+"""
+Exportação de registros de métricas em CSV/XLSX com memória constante.
+
+As linhas vêm do banco via iterator(chunk_size=...) (cursor do lado do
+servidor no PostgreSQL) e vão direto para a resposta, nos dois formatos: o
+XLSX é montado em streaming por xlsx_writer.py (sem arquivo temporário),
+então o download começa com as primeiras linhas.
+"""
+from __future__ import annotations
+
+import csv
+from datetime import date
+
+from django.http import StreamingHttpResponse
+
+from metrics.models import MetricRecord
+
+from . import xlsx_writer
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_HEADER = ["colaborador_id", "nome", "equipe", "metrica", "data", "valor"]
+EXPORT_FIELDS = (
+    "collaborator__colaborador_id",
+    "collaborator__nome",
+    "collaborator__equipe",
+    "metric_type__code",
+    "date",
+    "value",
+)
+
+
+class _Echo:
+    """Buffer mínimo para o csv.writer devolver a linha em vez de gravar."""
+
+    def write(self, value):
+        return value
+
+
+def export_queryset(
+    *,
+    collaborator_ids=None,
+    equipe: str | None = None,
+    metric_code: str | None = None,
+    start: date | None = None,
+    end: date | None = None,
+):
+    qs = MetricRecord.objects.all()
+    if collaborator_ids is not None:
+        qs = qs.filter(collaborator_id__in=collaborator_ids)
+    if equipe:
+        qs = qs.filter(collaborator__equipe=equipe)
+    if metric_code:
+        qs = qs.filter(metric_type__code=metric_code)
+    if start:
+        qs = qs.filter(date__gte=start)
+    if end:
+        qs = qs.filter(date__lte=end)
+    return qs.order_by("date", "metric_type_id", "collaborator_id").values_list(*EXPORT_FIELDS)
+
+
+def _rows(qs):
+    for row in qs.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield list(row)
+
+
+def csv_rows_response(header, rows, filename: str) -> StreamingHttpResponse:
+    """CSV em streaming para qualquer iterável de linhas (datas saem em ISO)."""
+    writer = csv.writer(_Echo())
+
+    def stream():
+        # BOM para o Excel abrir o UTF-8 corretamente
+        yield "\ufeff" + writer.writerow(header)
+        for row in rows:
+            yield writer.writerow([v.isoformat() if isinstance(v, date) else v for v in row])
+
+    response = StreamingHttpResponse(stream(), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def xlsx_rows_response(header, rows, filename: str, sheet: str = "registros") -> StreamingHttpResponse:
+    """XLSX em streaming (xlsx_writer.stream); acima do limite de linhas do Excel a aba é cortada com aviso."""
+    response = StreamingHttpResponse(
+        xlsx_writer.stream(header, rows, sheet),
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}.xlsx"'
+    return response
+
+
+def csv_response(qs, filename: str) -> StreamingHttpResponse:
+    return csv_rows_response(EXPORT_HEADER, _rows(qs), filename)
+
+
+def xlsx_response(qs, filename: str) -> StreamingHttpResponse:
+    return xlsx_rows_response(EXPORT_HEADER, _rows(qs), filename)
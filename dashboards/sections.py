@@ -0,0 +1,147 @@
+"""
+Seções do dashboard individual (Bônus, RV, ICS e IVS) carregadas sob demanda.
+
+A página (views.my_dashboard) só traz o cabeçalho, o aviso de fora da meta
+e o resultado mensal; cada seção vem de views.my_dashboard_section quando
+chega perto da tela. O fragmento da seção fica no cache ({% cache %} em
+_section.html) com colaborador, equipe, período, métricas da seção e versão
+dos dados (metrics/versions.py) na chave. SectionData só consulta o banco
+quando o template pede um atributo, ou seja, quando o fragmento não está no
+cache.
+"""
+from __future__ import annotations
+
+import hashlib
+from datetime import date
+from typing import Dict, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+
+from accounts.models import Collaborator
+from metrics.models import MetricType
+from metrics.versions import cache_timeout, data_version
+
+from .analytics import load_team_comparison
+from .data import (
+    SECTIONS,
+    build_meta,
+    group_key_for_metric,
+    load_fail_days,
+    load_self_stats,
+    load_series,
+    period_queryset,
+    unmet_metric_codes,
+)
+
+SECTION_KEYS = [key for key, _ in SECTIONS]
+SECTION_TITLES = dict(SECTIONS)
+# dias fora da meta listados no card (o resto vira "e +N")
+FAIL_DAYS_SHOWN = 8
+
+
+def cache_seconds() -> int:
+    return cache_timeout(getattr(settings, "DASHBOARD_CACHE_SECONDS", 3600))
+
+
+def section_metrics(all_metrics: List[MetricType]) -> Dict[str, List[MetricType]]:
+    """{seção: métricas} na ordem de all_metrics (sem consulta: só pelo nome/código)."""
+    out: Dict[str, List[MetricType]] = {key: [] for key in SECTION_KEYS}
+    for m in all_metrics:
+        out[group_key_for_metric(m)].append(m)
+    return out
+
+
+def _off_target(m: dict, avg) -> bool:
+    t = m["target_value"]
+    if not avg or t is None:
+        return False
+    return (m["better_when"] == "higher" and avg < t) or (m["better_when"] == "lower" and avg > t)
+
+
+class SectionData:
+    """Dados de uma seção para _section.html; cada parte é calculada no primeiro acesso."""
+
+    def __init__(self, collab: Collaborator, key: str, metrics: List[MetricType],
+                 all_metrics: List[MetricType], start: date | None, end: date | None):
+        self.collab = collab
+        self.key = key
+        self.title = SECTION_TITLES[key]
+        self.metrics = metrics
+        self.all_metrics = all_metrics
+        self.start = start
+        self.end = end
+        self.codes = [m.code for m in metrics]
+        self.data_version = data_version()
+
+    @cached_property
+    def cache_vary(self) -> str:
+        """Parte variável da chave do {% cache %} (equipe e códigos podem ter qualquer caractere)."""
+        raw = "|".join([self.collab.equipe or "", ",".join(self.codes)])
+        return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+    @cached_property
+    def _base_q(self):
+        return period_queryset(self.collab.id, self.start, self.end).filter(
+            metric_type_id__in=[m.id for m in self.metrics]
+        )
+
+    @cached_property
+    def meta(self) -> dict:
+        return build_meta(self.metrics, self.collab.equipe, self.end)[0]
+
+    @cached_property
+    def fail_days(self) -> dict:
+        return load_fail_days(self._base_q, self.metrics)
+
+    @cached_property
+    def cards(self) -> List[dict]:
+        stats = load_self_stats(self.collab.id, self.start, self.end)
+        # o comparativo fica em cache por equipe com todas as métricas (analytics.team_analytics)
+        team = load_team_comparison(self.collab, self.start, self.end, self.all_metrics)
+        cards = []
+        for code in self.codes:
+            m = self.meta[code]
+            stat = stats.get(code) or {}
+            days = self.fail_days.get(code) or []
+            cards.append({
+                "code": code,
+                "m": m,
+                "avg": stat.get("avg"),
+                "count": stat.get("count"),
+                "off_target": _off_target(m, stat.get("avg")),
+                "team": team.get(code),
+                "fail_days": [f"{d[8:10]}/{d[5:7]}" for d in days[:FAIL_DAYS_SHOWN]],
+                "fail_more": max(len(days) - FAIL_DAYS_SHOWN, 0),
+            })
+        return cards
+
+    @cached_property
+    def chart_data(self) -> dict:
+        return {
+            "codes": self.codes,
+            "meta": {
+                code: {k: m[k] for k in ("name", "unit", "is_time", "targets")}
+                for code, m in self.meta.items()
+            },
+            "series": load_series(self._base_q, self.metrics),
+            "fail_days": self.fail_days,
+        }
+
+
+def unmet_metric_names(collab: Collaborator, start: date | None, end: date | None,
+                       all_metrics: List[MetricType]) -> List[str]:
+    """Nomes das métricas fora da meta no período (aviso do topo), em cache pela versão dos dados."""
+    equipe = hashlib.sha1((collab.equipe or "").encode()).hexdigest()[:16]
+    key = f"dash-unmet:{data_version()}:{collab.id}:{equipe}:{start or ''}:{end or ''}"
+    names = cache.get(key)
+    if names is None:
+        meta, _ = build_meta(all_metrics, collab.equipe, end)
+        base_q = period_queryset(collab.id, start, end)
+        codes = unmet_metric_codes(
+            meta, load_fail_days(base_q, all_metrics), load_self_stats(collab.id, start, end),
+        )
+        names = [m.name for m in all_metrics if m.code in codes]
+        cache.set(key, names, cache_seconds())
+    return names
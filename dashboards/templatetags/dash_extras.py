@@ -25,3 +25,11 @@ def minutes_to_hms(value):
     m = (total_seconds % 3600) // 60
     s = total_seconds % 60
     return f"{h:02d}:{m:02d}:{s:02d}"
+
+@register.filter
+def percent(value, digits=0):
+    """Fração (0..1) como porcentagem. Ex.: 0.875 -> '88%'"""
+    try:
+        return f"{float(value) * 100:.{int(digits)}f}%"
+    except (TypeError, ValueError):
+        return "—"
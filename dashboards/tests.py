@@ -1,3 +1,118 @@
+import io
+import zipfile
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.db import connections
 from django.test import TestCase
+from openpyxl import load_workbook
+
+from accounts.models import Collaborator
+from metrics.models import MetricRecord, MetricType
+from uploads.models import UploadBatch
+
+from visibilidade.db_router import use_replica
+
+from . import analytics, xlsx_writer
+
+
+def _load(chunks):
+    return load_workbook(io.BytesIO(b"".join(chunks)), read_only=True)
+
+
+class XlsxWriterTests(TestCase):
+    def test_values_round_trip(self):
+        rows = [
+            ["C1", "Ana & <Bia>", date(2025, 3, 1), 1.5, 7, None],
+            ["C2", "quebra\x01de controle", date(1999, 12, 31), -0.25, 0, True],
+        ]
+        wb = _load(xlsx_writer.stream(["id", "nome", "data", "valor", "n", "extra"], rows, sheet="dados"))
+        self.assertEqual(wb.sheetnames, ["dados"])
+        got = [list(r) for r in wb["dados"].iter_rows(values_only=True)]
+        self.assertEqual(got[0], ["id", "nome", "data", "valor", "n", "extra"])
+        self.assertEqual(got[1][:5], ["C1", "Ana & <Bia>", got[1][2], 1.5, 7])
+        self.assertEqual(got[1][2].date(), date(2025, 3, 1))
+        self.assertEqual(got[2][1], "quebrade controle")
+        self.assertEqual(got[2][2].date(), date(1999, 12, 31))
+        self.assertIs(got[2][5], True)
+
+    def test_non_finite_floats_become_empty_cells(self):
+        data = b"".join(xlsx_writer.stream(["a", "b", "c", "d"], [[float("nan"), float("inf"), -float("inf"), 2.5]]))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            sheet = zf.read("xl/worksheets/sheet1.xml").decode()
+        self.assertNotIn("nan", sheet)
+        self.assertNotIn("inf", sheet)
+        got = [list(r) for r in _load([data]).active.iter_rows(values_only=True)]
+        self.assertEqual(got[1], [None, None, None, 2.5])
+
+    def test_streams_in_chunks(self):
+        rows = ([f"C{i}", f"nome {i}" * 20, i] for i in range(20000))
+        with mock.patch.object(xlsx_writer, "FLUSH_BYTES", 16 * 1024):
+            chunks = list(xlsx_writer.stream(["id", "nome", "n"], rows))
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual(sum(1 for _ in _load(chunks).active.iter_rows()), 20001)
+
+    def test_truncates_at_row_limit(self):
+        with mock.patch.object(xlsx_writer, "MAX_ROWS", 5):
+            wb = _load(xlsx_writer.stream(["n"], ([i] for i in range(10))))
+        got = [r[0] for r in wb.active.iter_rows(values_only=True)]
+        self.assertEqual(got, ["n", 0, 1, 2, xlsx_writer.TRUNCATED_NOTE])
+
+
+class ExportRecordsTests(TestCase):
+    def test_xlsx_export_is_streamed(self):
+        user = get_user_model().objects.create_superuser("admin", "a@a.com", "x")
+        metric = MetricType.objects.create(name="Produção", code="producao")
+        collab = Collaborator.objects.create(colaborador_id="C1", nome="Ana", equipe="A")
+        batch = UploadBatch.objects.create(metric_type=metric, original_filename="m.csv")
+        MetricRecord.objects.create(collaborator=collab, metric_type=metric, date=date(2025, 1, 2),
+                                    value=3.5, source_batch=batch)
+        self.client.force_login(user)
+        response = self.client.get("/dashboard/export/?format=xlsx")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('filename="metricas.xlsx"', response["Content-Disposition"])
+        rows = list(_load(response.streaming_content).active.iter_rows(values_only=True))
+        self.assertEqual(rows[0], ("colaborador_id", "nome", "equipe", "metrica", "data", "valor"))
+        self.assertEqual(rows[1][:4] + rows[1][5:], ("C1", "Ana", "A", "producao", 3.5))
+        self.assertEqual(rows[1][4].date(), date(2025, 1, 2))
+
+
+class TeamAnalyticsReplicaTests(TestCase):
+    """O SQL de janela do comparativo tem de ir para o banco que o router escolhe."""
+
+    def setUp(self):
+        self.metric = MetricType.objects.create(name="Produção", code="producao")
+        batch = UploadBatch.objects.create(metric_type=self.metric, original_filename="m.csv")
+        for i, value in enumerate([4, 8, 8, 2]):
+            collab = Collaborator.objects.create(colaborador_id=f"C{i}", nome=f"N{i}", equipe="A")
+            MetricRecord.objects.create(collaborator=collab, metric_type=self.metric, date=date(2025, 1, 2),
+                                        value=value, source_batch=batch)
+
+    def run_compute(self, wrap=lambda f: f):
+        """compute_team com o alias de cada consulta anotado (a réplica é o mesmo banco de teste)."""
+        used = []
+
+        class Recorder:
+            def __getitem__(self, alias):
+                used.append(alias)
+                return connections["default"]
+
+        with mock.patch.object(analytics, "connections", Recorder()), \
+                mock.patch.dict(settings.DATABASES, {"replica": settings.DATABASES["default"]}):
+            result = wrap(lambda: analytics.compute_team("A", None, None, [self.metric]))()
+        return used, result
+
+    def test_window_query_uses_replica_under_use_replica(self):
+        used, result = self.run_compute(use_replica)
+        self.assertEqual(used, ["replica"])
+        ranks = {cid: m["producao"]["rank"] for cid, m in result["members"].items()}
+        # empate: as duas médias 8 ficam em 1º e a seguinte em 3º
+        self.assertEqual(sorted(ranks.values()), [1, 1, 3, 4])
+        self.assertEqual(result["metrics"]["producao"]["team_avg"], 5.5)
 
-# Create your tests here.
+    def test_window_query_uses_default_outside_marked_views(self):
+        used, _ = self.run_compute()
+        self.assertEqual(used, ["default"])
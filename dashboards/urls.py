@@ -6,4 +6,8 @@ app_name = "dashboards"
 
 urlpatterns = [
     path("me/", views.my_dashboard, name="my"),
+    path("me/data/", views.my_dashboard_data, name="my_data"),
+    path("me/section/<slug:key>/", views.my_dashboard_section, name="my_section"),
+    path("team/", views.team_dashboard, name="team"),
+    path("export/", views.export_records, name="export"),
 ]
\ No newline at end of file
@@ -1,12 +1,33 @@
+import asyncio
 from datetime import date, timedelta, datetime
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import close_old_connections
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render
+from django.utils.text import slugify
 from django.contrib import messages
-from django.db.models import Avg, Count, Q
 
+from accounts.access import scope_collaborators
 from accounts.models import Collaborator
-from metrics.models import MetricType, MetricRecord
+from metrics.models import MetricRecord, MetricType
+from resultados.scorecards import load_scorecards
+from visibilidade.db_router import pin_read, use_replica
+from .analytics import load_team_comparison
+from .data import (
+    SECTIONS,
+    build_meta,
+    load_fail_days,
+    load_self_stats,
+    load_series,
+    load_team_stats,
+    period_queryset,
+    unmet_metric_codes,
+)
+from .exports import csv_response, export_queryset, xlsx_response
+from .sections import SECTION_KEYS, SectionData, cache_seconds, section_metrics, unmet_metric_names
 
 
 def _parse_date_param(s: str | None) -> date | None:
@@ -18,48 +39,15 @@ def _parse_date_param(s: str | None) -> date | None:
         return None
 
 
-def _looks_like_time_metric(m: MetricType) -> bool:
-    code = (m.code or "").lower()
-    unit = (m.unit or "").lower()
-    name = (m.name or "").lower()
-    hints = ("time", "tempo", "hh:mm", "hhmm", "ti", "duracao", "duração", "sla")
-    unit_hints = ("min", "minuto", "minutos", "hora", "horas", "h")
-    return any(h in code for h in hints) or any(h in name for h in hints) or any(u in unit for u in unit_hints)
-
-
-def _group_key_for_metric(m: MetricType) -> str:
-    import unicodedata
-    def norm(s: str) -> str:
-        s = (s or "").lower()
-        s = unicodedata.normalize("NFD", s)
-        return "".join(ch for ch in s if unicodedata.category(ch) != "Mn")
-    name = norm(m.name); code = norm(m.code)
-    if ("aderencia" in name and "raio" in name) or ("aderencia" in code and "raio" in code):
-        return "bonus"
-    if ("aderencia" in name and "checklist" in name) or ("aderencia" in code and "checklist" in code):
-        return "bonus"
-    if ("producao" in name) or ("producao" in code):
-        return "rv"
-    if ("devolucao" in name) or ("devolucao" in code):
-        return "rv"
-    return "ics_ivs"
-
+def _collaborator_defaults(user) -> dict:
+    return {
+        "colaborador_id": f"U{user.id}",
+        "nome": user.get_full_name() or user.get_username(),
+        "equipe": "",
+    }
 
-@login_required
-def my_dashboard(request):
-    # garante colaborador
-    collab, created = Collaborator.objects.get_or_create(
-        user=request.user,
-        defaults={
-            "colaborador_id": f"U{request.user.id}",
-            "nome": request.user.get_full_name() or request.user.get_username(),
-            "equipe": "",
-        },
-    )
-    if created:
-        messages.info(request, "Criamos seu cadastro de colaborador automaticamente.")
 
-    # Filtro de datas
+def _period_from_request(request) -> tuple[date | None, date | None]:
     start = _parse_date_param(request.GET.get("start"))
     end = _parse_date_param(request.GET.get("end"))
     if not start and not end:
@@ -67,107 +55,207 @@ def my_dashboard(request):
         start = end - timedelta(days=29)
     if start and end and start > end:
         start, end = end, start
+    return start, end
 
-    base_q = MetricRecord.objects.filter(collaborator=collab)
-    if start:
-        base_q = base_q.filter(date__gte=start)
-    if end:
-        base_q = base_q.filter(date__lte=end)
 
-    # Séries, metadados e grupos
-    series = {}
-    meta = {}
-    by_group = {"bonus": [], "rv": [], "ics_ivs": []}
-    all_metrics = list(MetricType.objects.all().order_by("name"))
+def _in_worker_thread(fn):
+    """
+    Roda uma consulta síncrona em uma thread do pool (thread_sensitive=False),
+    com conexão própria, para que várias consultas do mesmo request rodem em
+    paralelo. As conexões seguem o ciclo normal (CONN_MAX_AGE/pool).
+    """
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
 
-    for m in all_metrics:
-        qs = base_q.filter(metric_type=m).order_by("date")
-        series[m.code] = list(qs.values("date", "value"))
-        meta[m.code] = {
-            "name": m.name,
-            "unit": m.unit or "",
-            "is_time": _looks_like_time_metric(m),
-            "target_value": m.target_value,
-            "better_when": m.better_when,
-        }
-        by_group[_group_key_for_metric(m)].append(m.code)
-
-    # Média e contagem (ignora zeros)
-    self_stats_qs = (
-        base_q.values("metric_type__code")
-        .annotate(
-            media=Avg("value", filter=Q(value__gt=0)),
-            n=Count("id", filter=Q(value__gt=0)),
-        )
+@login_required
+@use_replica
+def my_dashboard(request):
+    # garante colaborador
+    collab, created = Collaborator.objects.get_or_create(
+        user=request.user,
+        defaults=_collaborator_defaults(request.user),
     )
-    self_stats = {
-        row["metric_type__code"]: {"avg": row["media"], "count": row["n"]}
-        for row in self_stats_qs
-    }
+    if created:
+        messages.info(request, "Criamos seu cadastro de colaborador automaticamente.")
 
-    # Dias fora da meta por métrica (ignora zeros)
-    fail_days = {}  # {code: ["YYYY-MM-DD", ...]}
-    for m in all_metrics:
-        code = m.code
-        t = m.target_value
-        if t is None:
-            fail_days[code] = []
-            continue
-        cond = Q(value__gt=0)
-        if m.better_when == "higher":
-            cond &= Q(value__lt=t)
-        else:  # lower
-            cond &= Q(value__gt=t)
-        days_qs = (
-            base_q.filter(metric_type=m)
-                  .filter(cond)
-                  .order_by("date")
-                  .values_list("date", flat=True)
-        )
-        fail_days[code] = [d.isoformat() for d in days_qs]
-
-    # Códigos com qualquer dia fora da meta
-    unmet_codes = [c for c, days in fail_days.items() if days]
-    # Ou média fora da meta também conta:
-    for m in all_metrics:
-        code = m.code
-        if code in unmet_codes:
-            continue
-        t = m.target_value
-        if t is None:
-            continue
-        stat = self_stats.get(code)
-        avg = stat["avg"] if stat else None
-        if avg is None:
-            continue
-        if (m.better_when == "higher" and avg < t) or (m.better_when == "lower" and avg > t):
-            unmet_codes.append(code)
-
-    unmet_names = [m.name for m in all_metrics if m.code in unmet_codes]
-    has_unmet = bool(unmet_codes)
-    forms_url = getattr(settings, "MS_FORMS_URL", "")
+    # Filtro de datas
+    start, end = _period_from_request(request)
 
+    # só a estrutura: cards e gráficos de cada seção vêm de my_dashboard_section
+    all_metrics = list(MetricType.objects.all().order_by("name"))
+    by_section = section_metrics(all_metrics)
     sections = [
-        {"key": "bonus", "title": "Bônus", "codes": by_group["bonus"]},
-        {"key": "rv", "title": "Remuneração Variável", "codes": by_group["rv"]},
-        {"key": "ics_ivs", "title": "ICS e IVS", "codes": by_group["ics_ivs"]},
+        {"key": key, "title": title, "count": len(by_section[key])}
+        for key, title in SECTIONS
     ]
+    forms_url = getattr(settings, "MS_FORMS_URL", "")
+    unmet_names = unmet_metric_names(collab, start, end, all_metrics) if forms_url else []
 
     return render(
         request,
         "dashboards/my_dashboard.html",
         {
             "collab": collab,
-            "series": series,
-            "meta": meta,
-            "self_stats": self_stats,
             "sections": sections,
             "start": start.isoformat() if start else "",
             "end": end.isoformat() if end else "",
             "forms_url": forms_url,
-            "has_unmet": has_unmet,
-            "unmet_codes": unmet_codes,
+            "has_unmet": bool(unmet_names),
             "unmet_names": unmet_names,
-            "fail_days": fail_days,  # << NOVO: dias fora da meta por métrica
+            "scorecards": load_scorecards(collab.id, start, end),
         },
     )
+
+
+@login_required
+@use_replica
+def my_dashboard_section(request, key):
+    """
+    Fragmento HTML de uma seção (cards + dados dos gráficos), pedido pela
+    página quando a seção chega perto da tela. Ver dashboards/sections.py.
+    """
+    if key not in SECTION_KEYS:
+        raise Http404
+    collab, _ = Collaborator.objects.get_or_create(
+        user=request.user,
+        defaults=_collaborator_defaults(request.user),
+    )
+    start, end = _period_from_request(request)
+    all_metrics = list(MetricType.objects.all().order_by("name"))
+    section = SectionData(collab, key, section_metrics(all_metrics)[key], all_metrics, start, end)
+    return render(
+        request,
+        "dashboards/_section.html",
+        {
+            "section": section,
+            "start": start.isoformat() if start else "",
+            "end": end.isoformat() if end else "",
+            "cache_seconds": cache_seconds(),
+        },
+    )
+
+
+@login_required
+@use_replica
+async def my_dashboard_data(request):
+    """
+    Versão assíncrona (ASGI) dos dados do dashboard em JSON.
+    Metas vigentes, séries, médias, dias fora da meta e comparativo da equipe são consultas independentes e rodam
+    em paralelo, sem prender o worker enquanto o banco responde.
+    """
+    user = await request.auser()
+    collab, _ = await Collaborator.objects.aget_or_create(
+        user=user,
+        defaults=_collaborator_defaults(user),
+    )
+    start, end = _period_from_request(request)
+    base_q = period_queryset(collab.id, start, end)
+
+    all_metrics = [m async for m in MetricType.objects.all().order_by("name")]
+    (meta, sections), series, self_stats, fail_days, team = await asyncio.gather(
+        _in_worker_thread(build_meta)(all_metrics, collab.equipe, end),
+        _in_worker_thread(load_series)(base_q, all_metrics),
+        _in_worker_thread(load_self_stats)(collab.id, start, end),
+        _in_worker_thread(load_fail_days)(base_q, all_metrics),
+        _in_worker_thread(load_team_comparison)(collab, start, end, all_metrics),
+    )
+    unmet_codes = unmet_metric_codes(meta, fail_days, self_stats)
+
+    return JsonResponse({
+        "collaborator": {"colaborador_id": collab.colaborador_id, "nome": collab.nome, "equipe": collab.equipe},
+        "start": start.isoformat() if start else "",
+        "end": end.isoformat() if end else "",
+        "series": series,
+        "meta": meta,
+        "self_stats": self_stats,
+        "sections": sections,
+        "fail_days": fail_days,
+        "unmet_codes": unmet_codes,
+        "team": team,
+    })
+
+
+@login_required
+@use_replica
+def team_dashboard(request):
+    """
+    Tabela da equipe: colaboradores visíveis ao usuário (accounts/access.py)
+    x métricas, com média e dias fora da meta no período.
+    """
+    start, end = _period_from_request(request)
+    collaborators = scope_collaborators(Collaborator.objects.filter(ativo=True), request.user, field="id")
+    equipes = sorted(set(collaborators.exclude(equipe="").values_list("equipe", flat=True)))
+    equipe = request.GET.get("equipe") or ""
+    records = scope_collaborators(MetricRecord.objects.all(), request.user)
+    if equipe:
+        collaborators = collaborators.filter(equipe=equipe)
+        records = records.filter(collaborator__equipe=equipe)
+    if start:
+        records = records.filter(date__gte=start)
+    if end:
+        records = records.filter(date__lte=end)
+
+    all_metrics = list(MetricType.objects.all().order_by("name"))
+    meta, sections = build_meta(all_metrics, equipe, end)
+    stats = load_team_stats(records, all_metrics)
+    rows = [
+        {"collab": c, "stats": stats.get(c.id, {})}
+        for c in collaborators.order_by("equipe", "nome")
+    ]
+    return render(
+        request,
+        "dashboards/team_dashboard.html",
+        {
+            "rows": rows,
+            "meta": meta,
+            "sections": [s for s in sections if s["codes"]],
+            "equipes": equipes,
+            "equipe": equipe,
+            "start": start.isoformat() if start else "",
+            "end": end.isoformat() if end else "",
+        },
+    )
+
+
+@login_required
+@use_replica
+def export_records(request):
+    """
+    Exporta registros (CSV ou XLSX) filtrando por colaborador, equipe,
+    métrica e período. Quem não é staff só exporta os colaboradores que
+    pode ver (accounts/access.py).
+    """
+    fmt = (request.GET.get("format") or "csv").lower()
+    if fmt not in ("csv", "xlsx"):
+        return HttpResponseBadRequest("Formato inválido (use csv ou xlsx).")
+
+    start = _parse_date_param(request.GET.get("start"))
+    end = _parse_date_param(request.GET.get("end"))
+    if start and end and start > end:
+        start, end = end, start
+
+    equipe = request.GET.get("equipe") or None
+    cid = request.GET.get("colaborador_id") or None
+    collaborator_ids = Collaborator.objects.filter(colaborador_id=cid).values("id") if cid else None
+
+    qs = export_queryset(
+        collaborator_ids=collaborator_ids,
+        equipe=equipe,
+        metric_code=request.GET.get("metric") or None,
+        start=start,
+        end=end,
+    )
+    qs = pin_read(scope_collaborators(qs, request.user))
+    filename = slugify("-".join(
+        p for p in ("metricas", cid, equipe, request.GET.get("metric"),
+                    start.isoformat() if start else "", end.isoformat() if end else "") if p
+    ))
+    if fmt == "xlsx":
+        return xlsx_response(qs, filename)
+    return csv_response(qs, filename)
@@ -1,14 +1,62 @@
 from django.contrib import admin
-from .models import MetricType, MetricRecord, UploadBatch
+from .models import ArchivedMonth, MetricTarget, MetricType, MetricRecord, PendingRecompute, UploadBatch
+from .paginators import EstimatedCountPaginator
 admin.site.register(UploadBatch)
+class MetricTargetInline(admin.TabularInline):
+    model = MetricTarget
+    extra = 0
+    fields = ("equipe", "valid_from", "target_value", "better_when")
+
+
 @admin.register(MetricType)
 class MetricTypeAdmin(admin.ModelAdmin):
     list_display = ("name", "code", "unit", "target_value", "better_when")
     list_editable = ("target_value", "better_when")
     search_fields = ("name", "code")
+    inlines = [MetricTargetInline]
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and {"target_value", "better_when"} & set(form.changed_data):
+            # a nova meta vale a partir de hoje; o recálculo roda em segundo plano (metrics/signals.py)
+            self.message_user(
+                request,
+                f"Meta de {obj} alterada a partir de hoje; o histórico mantém a meta anterior. "
+                "Para outra data de vigência ou meta por equipe, use as metas da métrica.",
+            )
 
 @admin.register(MetricRecord)
 class MetricRecordAdmin(admin.ModelAdmin):
-    list_display = ("metric_type", "collaborator", "date", "value", "source_batch")
-    list_filter = ("metric_type", "date")
-    search_fields = ("collaborator__nome", "collaborator__colaborador_id")
\ No newline at end of file
+    list_display = ("metric_type", "collaborator", "date", "value", "target_status", "source_batch")
+    list_filter = ("metric_type", "target_status")
+    search_fields = ("collaborator__nome", "collaborator__colaborador_id")
+    # tabela com milhões de linhas: evita N+1 nos FKs e COUNT(*) sem limite
+    list_select_related = ("metric_type", "collaborator", "source_batch__metric_type", "source_batch__user")
+    date_hierarchy = "date"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    raw_id_fields = ("collaborator", "source_batch")
+    ordering = ("-date",)
+
+
+@admin.register(ArchivedMonth)
+class ArchivedMonthAdmin(admin.ModelAdmin):
+    list_display = ("month", "records", "archived_at")
+    readonly_fields = ("month", "records", "archived_at")
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(PendingRecompute)
+class PendingRecomputeAdmin(admin.ModelAdmin):
+    """Recálculos pedidos e ainda não concluídos (drain_recomputes refaz os esquecidos)."""
+    list_display = ("metric_type", "kind", "start", "end", "created_at")
+    list_filter = ("kind",)
+    list_select_related = ("metric_type",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .versions import shared_cache
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Fora do DEBUG (vários workers), versões de cache e índice de acesso precisam de cache compartilhado."""
+    if settings.DEBUG or shared_cache():
+        return []
+    return [
+        Warning(
+            "CACHES['default'] é local ao processo: a versão dos dados e o índice de acesso "
+            "só mudam no worker que recebeu a alteração.",
+            hint=(
+                "Use um cache compartilhado (CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache "
+                "+ manage.py createcachetable, ou Redis/Memcached). Enquanto isso as entradas "
+                "versionadas valem no máximo LOCAL_CACHE_SECONDS."
+            ),
+            id="metrics.W001",
+        )
+    ]
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from metrics.partitions import compact, maintain_partitions, months_to_archive
+from metrics.targets import month_start
+
+
+def _months_back(d, n):
+    total = d.year * 12 + d.month - 1 - n
+    return d.replace(year=total // 12, month=total % 12 + 1, day=1)
+
+
+class Command(BaseCommand):
+    """
+    Rodar pelo cron do servidor, ex. todo dia de madrugada:
+
+        30 3 * * * cd /srv/visibilidade && python manage.py compact_metrics
+    """
+
+    help = (
+        "Cria as partições mensais dos próximos meses (PostgreSQL) e arquiva os meses de "
+        "MetricRecord mais antigos que o horizonte quente (METRICS_HOT_MONTHS)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months", type=int, default=None,
+                            help="meses quentes, contando o atual (padrão: METRICS_HOT_MONTHS)")
+        parser.add_argument("--dry-run", action="store_true", help="só lista os meses que seriam arquivados")
+
+    def handle(self, *args, months, dry_run, **options):
+        months = months if months is not None else settings.METRICS_HOT_MONTHS
+        if months < 1:
+            raise CommandError("--months precisa ser ao menos 1.")
+        before = _months_back(month_start(timezone.localdate()), months - 1)
+
+        if dry_run:
+            pending = months_to_archive(before)
+            for month in pending:
+                self.stdout.write(f"{month:%m/%Y}")
+            self.stdout.write(f"{len(pending)} mês(es) seriam arquivados (antes de {before:%m/%Y}).")
+            return
+
+        for month, moved in compact(before):
+            self.stdout.write(f"{month:%m/%Y}: {moved} registro(s) arquivado(s)")
+        created = maintain_partitions(settings.METRICS_PARTITION_AHEAD_MONTHS)
+        if created:
+            self.stdout.write(f"Partições criadas: {', '.join(created)}")
+        self.stdout.write(self.style.SUCCESS("Compactação concluída."))
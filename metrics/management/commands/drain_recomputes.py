@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from metrics.snapshots import drain_refreshes
+from metrics.targets import drain_recomputes
+
+
+class Command(BaseCommand):
+    """
+    Refaz os recálculos pedidos (PendingRecompute) que não terminaram, ex.
+    porque o worker reiniciou no meio da thread. Agendar no cron do servidor:
+
+        */10 * * * * cd /srv/visibilidade && python manage.py drain_recomputes
+    """
+
+    help = (
+        "Executa os recálculos de metas e as atualizações de snapshot pendentes "
+        "(pedidos com mais de --older-than minutos, para não disputar com a thread do worker)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, default=15, metavar="MINUTOS",
+                            help="só pedidos mais velhos que isso (padrão: 15; 0 = todos)")
+
+    def handle(self, *args, older_than, **options):
+        age = timedelta(minutes=older_than) if older_than else None
+        targets = drain_recomputes(older_than=age)
+        snapshots = drain_refreshes(older_than=age)
+        self.stdout.write(self.style.SUCCESS(
+            f"Metas: {targets} métrica(s) recalculada(s). Snapshots: {snapshots} métrica(s) atualizada(s)."
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from metrics.models import MetricType
+from metrics.targets import recompute_metric
+
+
+class Command(BaseCommand):
+    help = "Recalcula a situação em relação à meta e os contadores mensais dos registros."
+
+    def add_arguments(self, parser):
+        parser.add_argument("codes", nargs="*", help="códigos das métricas (padrão: todas)")
+
+    def handle(self, *args, codes, **options):
+        metrics = MetricType.objects.order_by("code")
+        if codes:
+            metrics = metrics.filter(code__in=codes)
+            unknown = set(codes) - set(metrics.values_list("code", flat=True))
+            if unknown:
+                raise CommandError(f"Métricas não encontradas: {', '.join(sorted(unknown))}")
+        for metric in metrics:
+            recompute_metric(metric.id)
+            self.stdout.write(f"{metric.code}: ok")
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from metrics import snapshots
+from metrics.models import MetricType
+
+
+class Command(BaseCommand):
+    """
+    O import e o recálculo de metas já regravam os meses que tocam, mas só
+    de métricas que já têm snapshot: a primeira carga é sempre por aqui. A
+    reconstrução completa também serve de conferência, ex. pelo cron toda
+    semana:
+
+        0 4 * * 0 cd /srv/visibilidade && python manage.py snapshot_metrics --full
+    """
+
+    help = (
+        "Gera os snapshots colunares (.npy) de MetricRecord por métrica em METRICS_SNAPSHOT_DIR. "
+        "Sem --full, só cria os que ainda não existem."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="reconstrói todos a partir do banco")
+        parser.add_argument("--metric", action="append", default=[], metavar="CODIGO",
+                            help="só estas métricas (pode repetir)")
+
+    def handle(self, *args, full, metric, **options):
+        if snapshots.np is None:
+            raise CommandError("numpy não está instalado (pip install numpy).")
+        if not snapshots.snapshot_root():
+            raise CommandError("METRICS_SNAPSHOT_DIR não configurado.")
+
+        metrics = MetricType.objects.order_by("code")
+        if metric:
+            metrics = metrics.filter(code__in=metric)
+            missing = set(metric) - set(metrics.values_list("code", flat=True))
+            if missing:
+                raise CommandError(f"Métrica(s) não encontrada(s): {', '.join(sorted(missing))}")
+
+        for m in metrics:
+            try:
+                current = snapshots.open_snapshot(m.id)
+            except snapshots.SnapshotUnavailable:
+                current = None
+            if current is None or full:
+                rows = snapshots.build(m.id)
+                self.stdout.write(f"{m.code}: {rows} linha(s)")
+            else:
+                self.stdout.write(f"{m.code}: já existe ({len(current)} linha(s), gerado em {current.manifest['built_at']})")
+        self.stdout.write(self.style.SUCCESS("Snapshots atualizados."))
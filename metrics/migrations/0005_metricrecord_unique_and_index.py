@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('metrics', '0004_rename_max_value_metrictype_target_value_and_more'),
+        ('uploads', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='metricrecord',
+            unique_together={('collaborator', 'metric_type', 'date')},
+        ),
+        migrations.AddIndex(
+            model_name='metricrecord',
+            index=models.Index(fields=['metric_type', 'date'], name='metrics_met_metric__156436_idx'),
+        ),
+    ]
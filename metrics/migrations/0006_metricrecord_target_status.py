@@ -0,0 +1,90 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill(apps, schema_editor):
+    """Situação em relação à meta e contadores mensais dos registros existentes."""
+    MetricType = apps.get_model("metrics", "MetricType")
+    MetricRecord = apps.get_model("metrics", "MetricRecord")
+    MetricMonthStat = apps.get_model("metrics", "MetricMonthStat")
+
+    for metric in MetricType.objects.exclude(target_value=None):
+        qs = MetricRecord.objects.filter(metric_type_id=metric.id, value__gt=0)
+        if metric.better_when == "higher":
+            missed = Q(value__lt=metric.target_value)
+        else:
+            missed = Q(value__gt=metric.target_value)
+        qs.filter(missed).update(target_status=2)
+        qs.exclude(missed).update(target_status=1)
+
+    rows = (
+        MetricRecord.objects.filter(value__gt=0)
+        .annotate(month=TruncMonth("date"))
+        .values("collaborator_id", "metric_type_id", "month")
+        .annotate(n=Count("id"), total=Sum("value"), missed=Count("id", filter=Q(target_status=2)))
+        .order_by()
+    )
+    MetricMonthStat.objects.bulk_create(
+        (
+            MetricMonthStat(
+                collaborator_id=r["collaborator_id"],
+                metric_type_id=r["metric_type_id"],
+                month=r["month"],
+                count=r["n"],
+                total=r["total"] or 0,
+                missed=r["missed"],
+            )
+            for r in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('metrics', '0005_metricrecord_unique_and_index'),
+        ('uploads', '0005_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricMonthStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('missed', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='metricrecord',
+            name='target_status',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Não avaliado'), (1, 'Dentro da meta'), (2, 'Fora da meta')], default=0),
+        ),
+        migrations.AddIndex(
+            model_name='metricrecord',
+            index=models.Index(condition=models.Q(('target_status', 2)), fields=['collaborator', 'date'], name='metricrecord_missed_idx'),
+        ),
+        migrations.AddField(
+            model_name='metricmonthstat',
+            name='collaborator',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.collaborator'),
+        ),
+        migrations.AddField(
+            model_name='metricmonthstat',
+            name='metric_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='metrics.metrictype'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='metricmonthstat',
+            unique_together={('collaborator', 'metric_type', 'month')},
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
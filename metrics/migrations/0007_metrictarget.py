@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:47
+
+import django.db.models.deletion
+import datetime
+
+from django.db import migrations, models
+
+
+def create_baseline_targets(apps, schema_editor):
+    """A meta atual de cada métrica passa a valer "desde sempre" (histórico sem reavaliação)."""
+    MetricType = apps.get_model("metrics", "MetricType")
+    MetricTarget = apps.get_model("metrics", "MetricTarget")
+    MetricTarget.objects.bulk_create([
+        MetricTarget(
+            metric_type_id=m.id,
+            equipe="",
+            valid_from=datetime.date(1900, 1, 1),
+            target_value=m.target_value,
+            better_when=m.better_when,
+        )
+        for m in MetricType.objects.all()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0006_metricrecord_target_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricTarget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('equipe', models.CharField(blank=True, default='', max_length=255)),
+                ('valid_from', models.DateField()),
+                ('target_value', models.FloatField(blank=True, null=True)),
+                ('better_when', models.CharField(choices=[('higher', 'Quanto maior, melhor'), ('lower', 'Quanto menor, melhor')], default='higher', max_length=10)),
+                ('metric_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='targets', to='metrics.metrictype')),
+            ],
+            options={
+                'ordering': ['metric_type', 'equipe', 'valid_from'],
+                'unique_together': {('metric_type', 'equipe', 'valid_from')},
+            },
+        ),
+        migrations.RunPython(create_baseline_targets, migrations.RunPython.noop),
+    ]
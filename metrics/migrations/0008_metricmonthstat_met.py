@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:51
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+
+
+def backfill(apps, schema_editor):
+    """Dias dentro da meta dos contadores mensais já existentes."""
+    MetricRecord = apps.get_model("metrics", "MetricRecord")
+    MetricMonthStat = apps.get_model("metrics", "MetricMonthStat")
+
+    rows = (
+        MetricRecord.objects.filter(value__gt=0, target_status=1)
+        .annotate(month=TruncMonth("date"))
+        .values("collaborator_id", "metric_type_id", "month")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    for r in list(rows):
+        MetricMonthStat.objects.filter(
+            collaborator_id=r["collaborator_id"], metric_type_id=r["metric_type_id"], month=r["month"],
+        ).update(met=r["n"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0007_metrictarget'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metricmonthstat',
+            name='met',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def partition(apps, schema_editor):
+    """PostgreSQL: metrics_metricrecord passa a ser particionada por mês (ver metrics/partitions.py)."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    from metrics.partitions import rebuild_table
+
+    with schema_editor.connection.cursor() as cursor:
+        rebuild_table(cursor, partitioned=True)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    from metrics.partitions import rebuild_table
+
+    with schema_editor.connection.cursor() as cursor:
+        rebuild_table(cursor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('metrics', '0008_metricmonthstat_met'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('records', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MetricRecordArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('record_id', models.BigIntegerField()),
+                ('date', models.DateField()),
+                ('value', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('source_batch_id', models.BigIntegerField()),
+                ('target_status', models.PositiveSmallIntegerField(choices=[(0, 'Não avaliado'), (1, 'Dentro da meta'), (2, 'Fora da meta')], default=0)),
+                ('collaborator', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='accounts.collaborator')),
+                ('metric_type', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='metrics.metrictype')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'metric_type'], name='metrics_met_date_754a6d_idx')],
+            },
+        ),
+        migrations.RunPython(partition, unpartition),
+    ]
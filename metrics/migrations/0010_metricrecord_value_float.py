@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:08
+
+"""
+MetricRecord.value e MetricRecordArchive.value: numeric(14, 4) -> double precision.
+
+Vale para toda instalação, sem opção: o tipo da coluna não pode depender de
+configuração (as migrações de cada instalação divergiriam e o makemigrations
+acusaria mudança conforme o .env), e o resto do código já trabalha em float
+(metas, MetricMonthStat.total, conversão do import, snapshots .npy).
+
+Mudança de precisão dos dados existentes: numeric(14, 4) tem no máximo 14
+dígitos significativos e o double guarda 15 com ida e volta exata, então todo
+valor gravado volta igual quando arredondado a 4 casas (ex.: 0.1000 vira o
+double mais próximo de 0.1, exibido como 0.1). Somas e médias passam a ter o
+erro de arredondamento do ponto flutuante (~1e-15 relativo), abaixo do que
+floatformat mostra. Valores novos deixam de ser cortados em 4 casas
+decimais. A volta (migrate metrics 0009) arredonda para 4 casas de novo.
+"""
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0009_metricrecord_partitioning'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='metricrecord',
+            name='value',
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name='metricrecordarchive',
+            name='value',
+            field=models.FloatField(),
+        ),
+    ]
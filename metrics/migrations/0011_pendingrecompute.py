@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('metrics', '0010_metricrecord_value_float'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRecompute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('targets', 'Metas'), ('snapshot', 'Snapshot')], max_length=16)),
+                ('start', models.DateField(blank=True, null=True)),
+                ('end', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('metric_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='metrics.metrictype')),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['kind', 'metric_type'], name='metrics_pen_kind_d4166e_idx')],
+            },
+        ),
+    ]
@@ -22,6 +22,28 @@ class MetricType(models.Model):
         return f"{self.name}"
 
 
+class MetricTarget(models.Model):
+    """
+    Meta com vigência: vale de valid_from até a próxima meta da mesma
+    métrica/equipe. equipe vazia = todas as equipes; meta de uma equipe tem
+    prioridade sobre a geral no mesmo período. Antes da primeira meta
+    cadastrada vale a de MetricType (target_value/better_when).
+    """
+    metric_type = models.ForeignKey(MetricType, on_delete=models.CASCADE, related_name="targets")
+    equipe = models.CharField(max_length=255, blank=True, default="")
+    valid_from = models.DateField()
+    target_value = models.FloatField(null=True, blank=True)  # vazio = sem meta no período
+    better_when = models.CharField(max_length=10, choices=MetricType.BETTER_CHOICES, default="higher")
+
+    class Meta:
+        ordering = ["metric_type", "equipe", "valid_from"]
+        unique_together = ("metric_type", "equipe", "valid_from")
+
+    def __str__(self):
+        who = self.equipe or "todas as equipes"
+        return f"{self.metric_type} · {who} · desde {self.valid_from:%d/%m/%Y}"
+
+
 class UploadBatch(models.Model):
     metric_type = models.ForeignKey(MetricType, on_delete=models.PROTECT)
     uploaded_by = models.ForeignKey('auth.User', on_delete=models.PROTECT)
@@ -32,17 +54,131 @@ class UploadBatch(models.Model):
 
 
 class MetricRecord(models.Model):
+    # situação em relação à meta, gravada no import e recalculada quando a
+    # meta/direção da métrica muda (ver metrics/targets.py)
+    TARGET_NONE = 0  # sem meta ou valor <= 0 (não avaliado)
+    TARGET_MET = 1
+    TARGET_MISSED = 2
+    TARGET_STATUS_CHOICES = [
+        (TARGET_NONE, "Não avaliado"),
+        (TARGET_MET, "Dentro da meta"),
+        (TARGET_MISSED, "Fora da meta"),
+    ]
+
     collaborator = models.ForeignKey(Collaborator, on_delete=models.CASCADE, db_index=True)
     metric_type = models.ForeignKey(MetricType, on_delete=models.PROTECT)
     date = models.DateField(db_index=True)
-    value = models.DecimalField(max_digits=14, decimal_places=4)
+    # double precision: o ORM devolve float direto (métricas de tempo em minutos
+    # fracionários); a troca do numeric(14, 4) e a precisão estão na migração 0010
+    value = models.FloatField()
     source_batch = models.ForeignKey(
         'uploads.UploadBatch',               # <— note a string com app.model
         on_delete=models.PROTECT,
         related_name='records',
     )
+    target_status = models.PositiveSmallIntegerField(choices=TARGET_STATUS_CHOICES, default=TARGET_NONE)
+
+    class Meta:
+        unique_together = ("collaborator", "metric_type", "date")
+        indexes = [
+            models.Index(fields=["metric_type", "date"]),
+            # dias fora da meta do dashboard: só as linhas fora da meta entram no índice
+            models.Index(
+                fields=["collaborator", "date"],
+                condition=models.Q(target_status=2),
+                name="metricrecord_missed_idx",
+            ),
+        ]
 
 
-class Meta:
-    unique_together = ("collaborator", "metric_type", "date")
-    indexes = [models.Index(fields=["metric_type", "date"])]
\ No newline at end of file
+class MetricMonthStat(models.Model):
+    """
+    Contadores por colaborador/métrica/mês (só valores > 0, como o dashboard):
+    quantidade, soma e dias dentro/fora da meta. Mantidos pelo import e pelo
+    recálculo de metas (metrics/targets.py).
+    """
+    collaborator = models.ForeignKey(Collaborator, on_delete=models.CASCADE, related_name="+")
+    metric_type = models.ForeignKey(MetricType, on_delete=models.CASCADE, related_name="+")
+    month = models.DateField()  # primeiro dia do mês
+    count = models.PositiveIntegerField(default=0)
+    total = models.FloatField(default=0)
+    met = models.PositiveIntegerField(default=0)
+    missed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("collaborator", "metric_type", "month")
+
+    @property
+    def evaluated(self) -> int:
+        """Dias avaliados contra alguma meta (met + missed)."""
+        return self.met + self.missed
+
+    @property
+    def average(self) -> float | None:
+        return self.total / self.count if self.count else None
+
+
+class MetricRecordArchive(models.Model):
+    """
+    Registros de meses compactados (ver metrics/partitions.py): cópia fria,
+    fora do caminho do dashboard e do import. Os totais do mês continuam em
+    MetricMonthStat.
+    """
+    record_id = models.BigIntegerField()
+    collaborator = models.ForeignKey(
+        Collaborator, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name="+",
+    )
+    metric_type = models.ForeignKey(
+        MetricType, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, related_name="+",
+    )
+    date = models.DateField()
+    value = models.FloatField()
+    source_batch_id = models.BigIntegerField()
+    target_status = models.PositiveSmallIntegerField(
+        choices=MetricRecord.TARGET_STATUS_CHOICES, default=MetricRecord.TARGET_NONE,
+    )
+
+    class Meta:
+        indexes = [models.Index(fields=["date", "metric_type"])]
+
+
+class ArchivedMonth(models.Model):
+    """Mês já compactado: registros em MetricRecordArchive, contadores congelados."""
+    month = models.DateField(unique=True)  # primeiro dia do mês
+    records = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-month"]
+
+    def __str__(self):
+        return f"{self.month:%m/%Y}"
+
+
+class PendingRecompute(models.Model):
+    """
+    Recálculo pedido e ainda não concluído: situação/contadores depois de uma
+    mudança de meta (targets) ou meses do snapshot colunar (snapshot).
+    Gravado na mesma transação da mudança; quem recalcula (a thread disparada
+    no commit ou o comando drain_recomputes) apaga ao terminar. Se o processo
+    morrer no meio, o pedido continua aqui para o próximo drain_recomputes.
+    """
+    KIND_TARGETS = "targets"
+    KIND_SNAPSHOT = "snapshot"
+    KIND_CHOICES = [
+        (KIND_TARGETS, "Metas"),
+        (KIND_SNAPSHOT, "Snapshot"),
+    ]
+
+    metric_type = models.ForeignKey(MetricType, on_delete=models.CASCADE, related_name="+")
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    start = models.DateField(null=True, blank=True)  # vazio = histórico inteiro
+    end = models.DateField(null=True, blank=True)  # vazio = até o fim
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["created_at"]
+        indexes = [models.Index(fields=["kind", "metric_type"])]
+
+    def __str__(self):
+        return f"{self.metric_type} · {self.get_kind_display()} · {self.start or 'início'}–{self.end or 'fim'}"
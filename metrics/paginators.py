@@ -0,0 +1,45 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator para tabelas grandes no admin.
+
+    Sem filtros, o COUNT(*) exato é trocado pela estimativa do planejador do
+    PostgreSQL (pg_class.reltuples, somado nas partições). Com filtros/busca,
+    ou em outros bancos, faz a contagem normal.
+    """
+
+    # abaixo disso a estimativa não compensa: conta de verdade
+    min_estimate = 10_000
+
+    @cached_property
+    def count(self):
+        estimate = self._estimated_count()
+        if estimate is not None and estimate >= self.min_estimate:
+            return estimate
+        return super().count
+
+    def _estimated_count(self):
+        qs = self.object_list
+        query = getattr(qs, "query", None)
+        if query is None or query.where:
+            return None
+        db = getattr(qs, "db", "default")
+        connection = connections[db]
+        if connection.vendor != "postgresql":
+            return None
+        table = qs.model._meta.db_table
+        with connection.cursor() as cursor:
+            # tabela particionada (metrics/partitions.py): a estimativa é a soma das partições
+            cursor.execute(
+                "SELECT SUM(c.reltuples)::bigint FROM pg_class c WHERE c.reltuples >= 0 AND ("
+                "c.oid = %s::regclass OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass))",
+                [table, table],
+            )
+            row = cursor.fetchone()
+        if not row or row[0] is None or row[0] < 0:
+            return None
+        return int(row[0])
@@ -0,0 +1,243 @@
+"""
+Particionamento mensal de MetricRecord (PostgreSQL) e compactação do histórico.
+
+No PostgreSQL a migração 0009 transforma metrics_metricrecord numa tabela
+particionada por faixa de data: uma partição por mês
+(metrics_metricrecord_pAAAAMM) e uma DEFAULT para datas sem partição. A
+chave primária passa a ser (id, date); o resto (unique por
+colaborador/métrica/data, índices, FKs) mantém os nomes do Django, então o
+ORM e o upsert do import não mudam. maintain_partitions() cria as
+partições dos próximos meses e tira da DEFAULT os meses que caíram nela.
+Em outros bancos (SQLite) a tabela continua única; só a compactação vale.
+
+Compactação (compact_metrics): meses inteiros mais antigos que o
+horizonte quente (METRICS_HOT_MONTHS) têm os contadores mensais
+(MetricMonthStat) refeitos uma última vez, os registros copiados para
+MetricRecordArchive e removidos da tabela quente — no PostgreSQL, com DROP
+da partição do mês, sem DELETE nem VACUUM. Meses arquivados ficam
+congelados: refresh_month_stats não os recalcula e o import recusa linhas
+com data neles (archived_before()).
+"""
+from __future__ import annotations
+
+import logging
+from datetime import date
+from typing import List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Max
+from django.db.models.functions import TruncMonth
+
+from .versions import cache_timeout
+
+logger = logging.getLogger(__name__)
+
+TABLE = "metrics_metricrecord"
+DEFAULT_PARTITION = f"{TABLE}_default"
+ARCHIVED_BEFORE_KEY = "metrics:archived_before"
+
+
+def _next_month(d: date) -> date:
+    return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_p{month:%Y%m}"
+
+
+def _q(name: str) -> str:
+    return connection.ops.quote_name(name)
+
+
+def _bounds(start: date, end: date) -> str:
+    # DDL não aceita parâmetros de forma portátil entre drivers; datas geradas aqui
+    return f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+
+
+# ---------- PostgreSQL: tabela particionada ----------
+
+def is_partitioned(cursor) -> bool:
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = %s AND pg_table_is_visible(c.oid))",
+        [TABLE],
+    )
+    return cursor.fetchone()[0]
+
+
+def _partitions(cursor) -> set:
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = %s::regclass",
+        [TABLE],
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def _create_partition(cursor, month: date) -> None:
+    """Cria a partição do mês movendo para ela o que já estava na DEFAULT."""
+    name, start, end = partition_name(month), month, _next_month(month)
+    cursor.execute(
+        f"CREATE TABLE {_q(name)} (LIKE {_q(TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    )
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {_q(DEFAULT_PARTITION)} WHERE date >= %s AND date < %s RETURNING *) "
+        f"INSERT INTO {_q(name)} SELECT * FROM moved",
+        [start, end],
+    )
+    cursor.execute(f"ALTER TABLE {_q(TABLE)} ATTACH PARTITION {_q(name)} {_bounds(start, end)}")
+
+
+def rebuild_table(cursor, partitioned: bool, ahead: int = 3) -> None:
+    """
+    Recria metrics_metricrecord particionada (ou de volta sem partições),
+    copiando os dados e mantendo nomes de constraints e índices. Usado pela
+    migração 0009 (ida e volta).
+    """
+    tmp = f"{TABLE}_rebuild"
+    cursor.execute(
+        "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f')",
+        [TABLE],
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        "SELECT pg_get_indexdef(x.indexrelid) FROM pg_index x "
+        "WHERE x.indrelid = %s::regclass AND NOT EXISTS ("
+        "  SELECT 1 FROM pg_constraint c WHERE c.conrelid = x.indrelid AND c.conindid = x.indexrelid)",
+        [TABLE],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+
+    suffix = " PARTITION BY RANGE (date)" if partitioned else ""
+    cursor.execute(
+        f"CREATE TABLE {_q(tmp)} (LIKE {_q(TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS){suffix}"
+    )
+    if partitioned:
+        cursor.execute(f"CREATE TABLE {_q(DEFAULT_PARTITION)} PARTITION OF {_q(tmp)} DEFAULT")
+        cursor.execute(f"SELECT MIN(date), MAX(date) FROM {_q(TABLE)}")
+        first, last = cursor.fetchone()
+        today = date.today().replace(day=1)
+        month = (first or today).replace(day=1)
+        last = max((last or today).replace(day=1), today)
+        for _ in range(ahead):
+            last = _next_month(last)
+        while month <= last:
+            cursor.execute(
+                f"CREATE TABLE {_q(partition_name(month))} PARTITION OF {_q(tmp)} "
+                f"{_bounds(month, _next_month(month))}"
+            )
+            month = _next_month(month)
+    cursor.execute(f"INSERT INTO {_q(tmp)} SELECT * FROM {_q(TABLE)}")
+    # na volta, a tabela particionada some junto com as partições
+    cursor.execute(f"DROP TABLE {_q(TABLE)}")
+    cursor.execute(f"ALTER TABLE {_q(tmp)} RENAME TO {_q(TABLE)}")
+
+    # id: sequência própria (identity não vale em tabela particionada em toda versão)
+    seq = f"{TABLE}_id_seq"
+    cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {_q(seq)} OWNED BY {_q(TABLE)}.id")
+    cursor.execute(f"ALTER TABLE {_q(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{seq}'::regclass)")
+    cursor.execute(f"SELECT setval('{seq}'::regclass, COALESCE((SELECT MAX(id) FROM {_q(TABLE)}), 0) + 1, false)")
+
+    for name, kind, definition in sorted(constraints, key=lambda c: "puf".index(c[1])):
+        if kind == "p":
+            # em tabela particionada a chave primária precisa conter a coluna da partição
+            definition = "PRIMARY KEY (id, date)" if partitioned else "PRIMARY KEY (id)"
+        cursor.execute(f"ALTER TABLE {_q(TABLE)} ADD CONSTRAINT {_q(name)} {definition}")
+    for definition in indexes:
+        cursor.execute(definition)
+
+
+def maintain_partitions(ahead: int = 3) -> List[str]:
+    """Partições do mês atual + `ahead` meses e dos meses que estão na DEFAULT. Devolve as criadas."""
+    if connection.vendor != "postgresql":
+        return []
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return []
+        existing = _partitions(cursor)
+        cursor.execute(f"SELECT DISTINCT date_trunc('month', date)::date FROM {_q(DEFAULT_PARTITION)}")
+        months = {row[0] for row in cursor.fetchall()}
+        month = date.today().replace(day=1)
+        for _ in range(ahead + 1):
+            months.add(month)
+            month = _next_month(month)
+        for month in sorted(months):
+            if partition_name(month) not in existing:
+                _create_partition(cursor, month)
+                created.append(partition_name(month))
+    return created
+
+
+# ---------- compactação ----------
+
+def archived_before() -> Optional[date]:
+    """Primeiro mês ainda quente (None = nada arquivado). Meses anteriores estão congelados."""
+    cached = cache.get(ARCHIVED_BEFORE_KEY)
+    if cached is None:
+        from .models import ArchivedMonth
+
+        last = ArchivedMonth.objects.aggregate(m=Max("month"))["m"]
+        cached = _next_month(last).isoformat() if last else ""
+        # cache local: outros processos veem a compactação em até LOCAL_CACHE_SECONDS
+        cache.set(ARCHIVED_BEFORE_KEY, cached, cache_timeout(None))
+    return date.fromisoformat(cached) if cached else None
+
+
+def months_to_archive(before: date) -> List[date]:
+    from .models import MetricRecord
+
+    return list(
+        MetricRecord.objects.filter(date__lt=before)
+        .annotate(month=TruncMonth("date"))
+        .values_list("month", flat=True)
+        .distinct()
+        .order_by("month")
+    )
+
+
+def archive_month(month: date) -> int:
+    """Arquiva um mês inteiro; devolve quantos registros saíram da tabela quente."""
+    from .models import ArchivedMonth, MetricRecord, MetricRecordArchive
+    from .targets import refresh_month_stats
+    from .versions import bump_data_version
+
+    start, end = month, _next_month(month)
+    records = MetricRecord.objects.filter(date__gte=start, date__lt=end)
+    archive = MetricRecordArchive._meta.db_table
+    with transaction.atomic():
+        # contadores do mês refeitos uma última vez antes de congelar
+        for metric_id in records.values_list("metric_type_id", flat=True).distinct().order_by("metric_type_id"):
+            refresh_month_stats(metric_id, start, start)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {_q(archive)} "
+                f"(record_id, collaborator_id, metric_type_id, date, value, source_batch_id, target_status) "
+                f"SELECT id, collaborator_id, metric_type_id, date, value, source_batch_id, target_status "
+                f"FROM {_q(TABLE)} WHERE date >= %s AND date < %s",
+                [start, end],
+            )
+            moved = cursor.rowcount
+            if connection.vendor == "postgresql" and is_partitioned(cursor) \
+                    and partition_name(month) in _partitions(cursor):
+                cursor.execute(f"ALTER TABLE {_q(TABLE)} DETACH PARTITION {_q(partition_name(month))}")
+                cursor.execute(f"DROP TABLE {_q(partition_name(month))}")
+            # o que estava na DEFAULT (ou a tabela inteira, sem partições)
+            records.delete()
+        archived, created = ArchivedMonth.objects.get_or_create(month=month, defaults={"records": moved})
+        if not created:
+            archived.records += moved
+            archived.save(update_fields=["records"])
+        transaction.on_commit(lambda: cache.delete(ARCHIVED_BEFORE_KEY))
+        transaction.on_commit(bump_data_version)
+    logger.info("compactação: %s arquivado (%s registros)", f"{month:%m/%Y}", moved)
+    return moved
+
+
+def compact(before: date) -> List[Tuple[date, int]]:
+    """Arquiva, do mais antigo para o mais novo, todos os meses anteriores a `before`."""
+    return [(month, archive_month(month)) for month in months_to_archive(before)]
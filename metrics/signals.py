@@ -0,0 +1,116 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import MetricTarget, MetricType
+from .snapshots import schedule_refresh
+from .targets import HISTORY_START, schedule_recompute, targets_recomputed
+from .versions import bump_data_version
+
+# campos que aparecem nos fragmentos em cache (nome, unidade e, pelo
+# código/nome/unidade, se a métrica é de tempo) e não estão na chave
+DISPLAY_FIELDS = ("name", "code", "unit")
+
+
+@receiver(pre_save, sender=MetricType)
+def remember_target(sender, instance, **kwargs):
+    """
+    Guarda meta/direção anteriores para saber se o post_save precisa
+    registrar vigência, e os campos de exibição para versionar o cache.
+    """
+    if instance.pk is None:
+        instance._previous_target = None
+        instance._previous_display = None
+        return
+    previous = (
+        MetricType.objects.filter(pk=instance.pk)
+        .values_list("target_value", "better_when", *DISPLAY_FIELDS).first()
+    )
+    instance._previous_target = previous[:2] if previous else None
+    instance._previous_display = previous[2:] if previous else None
+
+
+@receiver(post_save, sender=MetricType)
+def version_target_change(sender, instance, created, **kwargs):
+    """
+    Meta alterada em MetricType (ex.: list_editable do admin) vale a partir
+    de hoje: vira uma MetricTarget geral com valid_from = hoje, e o histórico
+    continua avaliado pela meta anterior. Métrica nova ganha a vigência
+    "desde sempre" com a meta informada.
+    """
+    current = (instance.target_value, instance.better_when)
+    if created:
+        MetricTarget.objects.bulk_create([
+            MetricTarget(metric_type=instance, valid_from=HISTORY_START,
+                         target_value=current[0], better_when=current[1]),
+        ])
+        return
+
+    previous = getattr(instance, "_previous_target", None)
+    if previous is None or previous == current:
+        return
+
+    # bulk_create/update não disparam os sinais de MetricTarget: um recálculo só, abaixo
+    targets = MetricTarget.objects.filter(metric_type=instance, equipe="")
+    if not targets.exists():
+        MetricTarget.objects.bulk_create([
+            MetricTarget(metric_type=instance, valid_from=HISTORY_START,
+                         target_value=previous[0], better_when=previous[1]),
+        ])
+    today = timezone.localdate()
+    if not targets.filter(valid_from=today).update(target_value=current[0], better_when=current[1]):
+        MetricTarget.objects.bulk_create([
+            MetricTarget(metric_type=instance, valid_from=today,
+                         target_value=current[0], better_when=current[1]),
+        ])
+    schedule_recompute(instance.pk, today)
+
+
+@receiver(post_save, sender=MetricType)
+def version_display_change(sender, instance, created, **kwargs):
+    """Nome, código ou unidade trocados: os fragmentos em cache (ex.: seções do dashboard) saem de uso."""
+    previous = getattr(instance, "_previous_display", None)
+    if previous is not None and previous != tuple(getattr(instance, f) for f in DISPLAY_FIELDS):
+        transaction.on_commit(bump_data_version)
+
+
+@receiver(pre_save, sender=MetricTarget)
+def remember_valid_from(sender, instance, **kwargs):
+    instance._previous_valid_from = (
+        MetricTarget.objects.filter(pk=instance.pk).values_list("valid_from", flat=True).first()
+        if instance.pk else None
+    )
+
+
+def _sync_current_target(metric_type_id):
+    """MetricType.target_value/better_when espelham a meta geral vigente hoje."""
+    current = (
+        MetricTarget.objects.filter(metric_type_id=metric_type_id, equipe="", valid_from__lte=timezone.localdate())
+        .order_by("-valid_from").values_list("target_value", "better_when").first()
+    )
+    if current is not None:
+        # update() não passa pelos sinais de MetricType
+        MetricType.objects.filter(pk=metric_type_id).update(target_value=current[0], better_when=current[1])
+
+
+@receiver(post_save, sender=MetricTarget)
+def recompute_on_target_saved(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_valid_from", None)
+    start = min(previous, instance.valid_from) if previous else instance.valid_from
+    if not instance.equipe:
+        _sync_current_target(instance.metric_type_id)
+    schedule_recompute(instance.metric_type_id, start)
+
+
+@receiver(post_delete, sender=MetricTarget)
+def recompute_on_target_deleted(sender, instance, **kwargs):
+    if not instance.equipe:
+        _sync_current_target(instance.metric_type_id)
+    schedule_recompute(instance.metric_type_id, instance.valid_from)
+
+
+@receiver(targets_recomputed)
+def refresh_snapshot(sender, metric_id, start, **kwargs):
+    """target_status mudou de `start` em diante: atualiza o snapshot colunar (metrics/snapshots.py)."""
+    schedule_refresh(metric_id, start)
@@ -0,0 +1,482 @@
+"""
+Snapshot colunar de MetricRecord em disco, para análises da empresa inteira
+(todos os colaboradores x todas as métricas em períodos longos) sem passar
+pelo ORM nem pelo banco. Desligado por padrão: precisa de numpy e de
+METRICS_SNAPSHOT_DIR.
+
+Uma pasta por métrica e, dentro dela, uma por mês:
+METRICS_SNAPSHOT_DIR/<metric_id>/<AAAA-MM>/. Cada mês tem uma versão por
+subpasta e o arquivo CURRENT apontando para a vigente (troca atômica com
+os.replace; quem já abriu a versão anterior continua lendo). Cada versão
+tem colunas .npy ordenadas por (dia, colaborador):
+
+    collaborator.npy  int32    id do colaborador
+    day.npy           int32    dias desde DAY_BASE
+    value.npy         float64  valor (como MetricRecord.value)
+    status.npy        int8     target_status
+
+e manifest.json (linhas do mês). A leitura usa np.load(mmap_mode="r"): o
+sistema carrega só as páginas do intervalo pedido e os processos dividem o
+cache de páginas. O manifest.json da pasta da métrica marca que o
+snapshot foi gerado por inteiro (build); sem ele a métrica não tem snapshot.
+
+Atualização:
+- snapshot_metrics (comando, fora do processo web) gera a métrica mês a
+  mês a partir de MetricRecord + MetricRecordArchive;
+- depois de cada lote do import (uploads/services.py) e de um recálculo de
+  metas (sinal targets_recomputed) são regravados só os meses tocados, a
+  partir do banco. Um import custa memória e escrita de um mês por mês do
+  arquivo, não da métrica inteira. Métrica que ainda não tem snapshot não
+  é gerada aqui: fica para o comando. O pedido fica em PendingRecompute até
+  a atualização terminar (drain_recomputes refaz o que ficar para trás);
+- meses compactados (metrics/partitions.py) estão congelados e as
+  atualizações parciais nunca mexem neles.
+
+numpy é opcional: sem ele (ou com METRICS_SNAPSHOT_DIR vazio, o padrão)
+available() é False, as atualizações não fazem nada e open_snapshot
+levanta SnapshotUnavailable.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from array import array
+from contextlib import contextmanager
+from datetime import date, timedelta
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Max
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .partitions import archived_before
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependência opcional
+    np = None
+
+try:  # trava entre processos (não existe no Windows)
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DAY_BASE = date(2000, 1, 1)
+COLUMNS = {
+    "collaborator": "int32",
+    "day": "int32",
+    "value": "float64",
+    "status": "int8",
+}
+# linhas por ida ao banco na leitura de um mês
+READ_CHUNK_SIZE = 20_000
+
+_locks: Dict[int, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+class SnapshotUnavailable(RuntimeError):
+    """numpy ausente, snapshots desligados ou métrica ainda sem snapshot."""
+
+
+def available() -> bool:
+    return np is not None and bool(snapshot_root())
+
+
+def snapshot_root() -> str:
+    return getattr(settings, "METRICS_SNAPSHOT_DIR", "") or ""
+
+
+def day_offset(d: date) -> int:
+    return d.toordinal() - DAY_BASE.toordinal()
+
+
+def day_date(offset: int) -> date:
+    return DAY_BASE + timedelta(days=int(offset))
+
+
+def _month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def _next_month(d: date) -> date:
+    return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+
+def _metric_dir(metric_id: int) -> str:
+    return os.path.join(snapshot_root(), str(metric_id))
+
+
+def _month_dir(metric_id: int, month: date) -> str:
+    return os.path.join(_metric_dir(metric_id), f"{month:%Y-%m}")
+
+
+def _built(metric_id: int) -> bool:
+    return os.path.exists(os.path.join(_metric_dir(metric_id), "manifest.json"))
+
+
+def _months_on_disk(metric_id: int) -> List[date]:
+    try:
+        names = os.listdir(_metric_dir(metric_id))
+    except FileNotFoundError:
+        return []
+    months = []
+    for name in names:
+        try:
+            year, month = name.split("-")
+            months.append(date(int(year), int(month), 1))
+        except ValueError:
+            continue
+    return sorted(months)
+
+
+def _current_version(path: str) -> Optional[str]:
+    try:
+        with open(os.path.join(path, "CURRENT"), encoding="utf-8") as fh:
+            return fh.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def _metric_lock(metric_id: int):
+    """Uma atualização por métrica de cada vez (threads do processo e, com fcntl, outros processos)."""
+    with _locks_guard:
+        lock = _locks.setdefault(metric_id, threading.Lock())
+    with lock:
+        path = _metric_dir(metric_id)
+        os.makedirs(path, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(path, ".lock"), "w") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+# ---------- escrita ----------
+
+def _rows_to_columns(rows: Iterable[Tuple[int, date, float, int]]) -> Dict[str, "np.ndarray"]:
+    collab, day, value, status = array("i"), array("i"), array("d"), array("b")
+    base = DAY_BASE.toordinal()
+    for collaborator_id, d, v, s in rows:
+        collab.append(collaborator_id)
+        day.append(d.toordinal() - base)
+        value.append(v)
+        status.append(s)
+    return {
+        "collaborator": np.frombuffer(collab, dtype=np.int32) if collab else np.empty(0, np.int32),
+        "day": np.frombuffer(day, dtype=np.int32) if day else np.empty(0, np.int32),
+        "value": np.frombuffer(value, dtype=np.float64) if value else np.empty(0, np.float64),
+        "status": np.frombuffer(status, dtype=np.int8) if status else np.empty(0, np.int8),
+    }
+
+
+def _db_rows(metric_id: int, start: date | None, end: date | None, archive: bool = False):
+    """Registros de [start, end) (end exclusivo)."""
+    from .models import MetricRecord, MetricRecordArchive
+
+    model = MetricRecordArchive if archive else MetricRecord
+    qs = model.objects.filter(metric_type_id=metric_id)
+    if start:
+        qs = qs.filter(date__gte=start)
+    if end:
+        qs = qs.filter(date__lt=end)
+    return (
+        qs.order_by()
+        .values_list("collaborator_id", "date", "value", "target_status")
+        .iterator(chunk_size=READ_CHUNK_SIZE)
+    )
+
+
+def _write_version(path: str, columns: Dict[str, "np.ndarray"]) -> str:
+    """Grava uma versão nova das colunas em `path` e troca o CURRENT."""
+    order = np.lexsort((columns["collaborator"], columns["day"]))
+    columns = {name: np.ascontiguousarray(col[order], dtype=COLUMNS[name]) for name, col in columns.items()}
+
+    version = f"v{timezone.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+    target = os.path.join(path, version)
+    os.makedirs(target)
+    for name, col in columns.items():
+        np.save(os.path.join(target, f"{name}.npy"), col)
+    with open(os.path.join(target, "manifest.json"), "w", encoding="utf-8") as fh:
+        json.dump({"rows": int(len(columns["day"])), "built_at": timezone.now().isoformat()}, fh)
+
+    previous = _current_version(path)
+    tmp = os.path.join(path, f"CURRENT.{uuid.uuid4().hex[:8]}")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(version)
+    os.replace(tmp, os.path.join(path, "CURRENT"))
+
+    # mantém a versão anterior (a do CURRENT trocado) para quem ainda está com
+    # ela aberta; o nome não serve para ordenar duas versões do mesmo segundo
+    for old in os.listdir(path):
+        if old.startswith("v") and old not in (version, previous):
+            shutil.rmtree(os.path.join(path, old), ignore_errors=True)
+    return version
+
+
+def _write_month(metric_id: int, month: date, archive: bool) -> int:
+    """Regrava um mês a partir do banco; mês sem registros sai do snapshot. Devolve as linhas."""
+    end = _next_month(month)
+    rows = _db_rows(metric_id, month, end)
+    if archive:
+        rows = chain(_db_rows(metric_id, month, end, archive=True), rows)
+    columns = _rows_to_columns(rows)
+    path = _month_dir(metric_id, month)
+    if not len(columns["day"]):
+        shutil.rmtree(path, ignore_errors=True)
+        return 0
+    os.makedirs(path, exist_ok=True)
+    _write_version(path, columns)
+    return len(columns["day"])
+
+
+def _db_months(metric_id: int) -> List[date]:
+    from .models import MetricRecord, MetricRecordArchive
+
+    months = set()
+    for model in (MetricRecordArchive, MetricRecord):
+        months.update(
+            model.objects.filter(metric_type_id=metric_id)
+            .annotate(month=TruncMonth("date"))
+            .values_list("month", flat=True)
+            .distinct()
+            .order_by()
+        )
+    return sorted(months)
+
+
+def build(metric_id: int) -> int:
+    """Gera o snapshot da métrica mês a mês (registros quentes + arquivados). Devolve as linhas."""
+    if not available():
+        return 0
+    total = 0
+    with _metric_lock(metric_id):
+        months = _db_months(metric_id)
+        for month in months:
+            total += _write_month(metric_id, month, archive=True)
+        for month in set(_months_on_disk(metric_id)) - set(months):
+            shutil.rmtree(_month_dir(metric_id, month), ignore_errors=True)
+        manifest = os.path.join(_metric_dir(metric_id), "manifest.json")
+        with open(f"{manifest}.tmp", "w", encoding="utf-8") as fh:
+            json.dump({"metric_id": metric_id, "months": len(months), "built_at": timezone.now().isoformat()}, fh)
+        os.replace(f"{manifest}.tmp", manifest)
+    logger.info("snapshot: métrica %s gerada (%s meses, %s linhas)", metric_id, len(months), total)
+    return total
+
+
+def refresh(metric_id: int, start: date | None, end: date | None = None) -> int:
+    """
+    Regrava a partir do banco os meses de [start, end] (end None = até o
+    último mês com registros). Métrica sem snapshot fica como está (ver
+    snapshot_metrics); sem start, gera tudo de novo.
+    """
+    if not available() or not _built(metric_id):
+        return 0
+    if start is None:
+        return build(metric_id)
+    from .models import MetricRecord
+
+    # meses arquivados estão congelados e não estão mais em MetricRecord
+    hot_from = archived_before()
+    if hot_from and start < hot_from:
+        start = hot_from
+    if end and end < start:
+        return 0
+
+    total = 0
+    with _metric_lock(metric_id):
+        if end is None:
+            last = MetricRecord.objects.filter(metric_type_id=metric_id).aggregate(d=Max("date"))["d"]
+            on_disk = _months_on_disk(metric_id)
+            end = max([d for d in (last, on_disk[-1] if on_disk else None) if d] or [start])
+        month = _month_start(start)
+        months = 0
+        while month <= end:
+            total += _write_month(metric_id, month, archive=False)
+            month = _next_month(month)
+            months += 1
+    logger.info("snapshot: métrica %s atualizada de %s a %s (%s meses, %s linhas)",
+                metric_id, start, end, months, total)
+    return total
+
+
+def drain_refreshes(metric_id: int | None = None, older_than: timedelta | None = None) -> int:
+    """
+    Atualiza os snapshots pedidos em PendingRecompute (um intervalo por
+    métrica: do menor start ao maior end) e apaga os pedidos atendidos.
+    Devolve quantas métricas foram atualizadas.
+    """
+    from .models import PendingRecompute
+    from .targets import pending_requests
+
+    pending = pending_requests(PendingRecompute.KIND_SNAPSHOT, metric_id, older_than)
+    for mid, items in pending.items():
+        starts = [start for _, start, _ in items]
+        ends = [end for _, _, end in items]
+        refresh(mid, None if None in starts else min(starts), None if None in ends else max(ends))
+        PendingRecompute.objects.filter(id__in=[pk for pk, _, _ in items]).delete()
+    return len(pending)
+
+
+def _run_in_background(metric_id: int) -> None:
+    close_old_connections()
+    try:
+        drain_refreshes(metric_id)
+    except Exception:
+        logger.exception("snapshot: falha ao atualizar a métrica %s (fica para drain_recomputes)", metric_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_refresh(metric_id: int, start: date | None, end: date | None = None) -> None:
+    """
+    Registra o pedido (PendingRecompute) e atualiza os meses do snapshot
+    depois do commit, numa thread (METRICS_RECOMPUTE_SYNC: na hora).
+    """
+    if not available():
+        return
+    from .models import PendingRecompute
+
+    PendingRecompute.objects.create(
+        metric_type_id=metric_id, kind=PendingRecompute.KIND_SNAPSHOT, start=start, end=end,
+    )
+    if getattr(settings, "METRICS_RECOMPUTE_SYNC", False):
+        transaction.on_commit(lambda: drain_refreshes(metric_id))
+        return
+    transaction.on_commit(
+        lambda: threading.Thread(target=_run_in_background, args=(metric_id,), daemon=True).start()
+    )
+
+
+# ---------- leitura ----------
+
+class _Month:
+    """Colunas de um mês (memory-mapped)."""
+
+    def __init__(self, path: str, mmap: bool = True):
+        mode = "r" if mmap else None
+        for name in COLUMNS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode))
+
+    def window(self, lo: int | None, hi: int | None) -> slice:
+        a = 0 if lo is None else int(np.searchsorted(self.day, lo, side="left"))
+        b = len(self.day) if hi is None else int(np.searchsorted(self.day, hi, side="right"))
+        return slice(a, b)
+
+
+class MetricSnapshot:
+    """
+    Colunas de uma métrica, um conjunto memory-mapped por mês. Os agregados
+    recebem um período e devolvem arrays alinhados por colaborador: (ids, valores).
+    """
+
+    def __init__(self, metric_id: int, months: List[Tuple[date, str]], manifest: Dict, mmap: bool = True):
+        self.metric_id = metric_id
+        self.manifest = manifest
+        self._months = [(month, _Month(path, mmap=mmap)) for month, path in months]
+
+    def __len__(self) -> int:
+        return sum(len(m.day) for _, m in self._months)
+
+    def columns(self, start: date | None = None, end: date | None = None) -> Dict[str, "np.ndarray"]:
+        """Colunas do período (só os meses que cruzam o período; busca binária no dia dentro deles)."""
+        lo = day_offset(start) if start else None
+        hi = day_offset(end) if end else None
+        parts = []
+        for month, m in self._months:
+            if (start and _next_month(month) <= start) or (end and month > end):
+                continue
+            rows = m.window(lo, hi)
+            parts.append({name: getattr(m, name)[rows] for name in COLUMNS})
+        return {
+            name: np.concatenate([p[name] for p in parts]) if parts else np.empty(0, dtype)
+            for name, dtype in COLUMNS.items()
+        }
+
+    # a métrica inteira, coluna a coluna (cópia)
+    collaborator = property(lambda self: self.columns()["collaborator"])
+    day = property(lambda self: self.columns()["day"])
+    value = property(lambda self: self.columns()["value"])
+    status = property(lambda self: self.columns()["status"])
+
+    def _grouped(self, start, end, positive_only: bool):
+        cols = self.columns(start, end)
+        collab, value, status = cols["collaborator"], cols["value"], cols["status"]
+        if positive_only:
+            # como o dashboard: zero = sem atividade no dia
+            mask = value > 0
+            collab, value, status = collab[mask], value[mask], status[mask]
+        ids, inverse = np.unique(collab, return_inverse=True)
+        return ids, inverse, value, status
+
+    def averages(self, start: date | None = None, end: date | None = None, positive_only: bool = True):
+        """(ids, média, contagem) por colaborador no período."""
+        ids, inverse, value, _ = self._grouped(start, end, positive_only)
+        counts = np.bincount(inverse, minlength=len(ids))
+        sums = np.bincount(inverse, weights=value, minlength=len(ids))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return ids, sums / counts, counts
+
+    def attainment(self, start: date | None = None, end: date | None = None):
+        """(ids, dias na meta / dias avaliados, dias avaliados) por colaborador."""
+        from .models import MetricRecord
+
+        ids, inverse, _, status = self._grouped(start, end, positive_only=False)
+        evaluated = np.bincount(inverse, weights=status != MetricRecord.TARGET_NONE, minlength=len(ids))
+        met = np.bincount(inverse, weights=status == MetricRecord.TARGET_MET, minlength=len(ids))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return ids, met / evaluated, evaluated.astype(np.int64)
+
+    def ranking(self, start: date | None = None, end: date | None = None, better_when: str = "higher"):
+        """(ids, média, posição) com posição 1 = melhor média; empates dividem a posição (RANK)."""
+        ids, avg, _ = self.averages(start, end)
+        keyed = -avg if better_when == "higher" else avg
+        order = np.argsort(keyed, kind="stable")
+        sorted_keys = keyed[order]
+        # RANK(): posição da primeira ocorrência de cada valor
+        first = np.searchsorted(sorted_keys, sorted_keys, side="left")
+        rank = np.empty(len(ids), dtype=np.int64)
+        rank[order] = first + 1
+        return ids, avg, rank
+
+
+def open_snapshot(metric_id: int, mmap: bool = True) -> MetricSnapshot:
+    if np is None:
+        raise SnapshotUnavailable("numpy não está instalado (pip install numpy)")
+    if not snapshot_root():
+        raise SnapshotUnavailable("METRICS_SNAPSHOT_DIR não configurado")
+    try:
+        with open(os.path.join(_metric_dir(metric_id), "manifest.json"), encoding="utf-8") as fh:
+            manifest = json.load(fh)
+    except FileNotFoundError:
+        raise SnapshotUnavailable(f"métrica {metric_id} sem snapshot (manage.py snapshot_metrics)") from None
+    months = []
+    for month in _months_on_disk(metric_id):
+        path = _month_dir(metric_id, month)
+        version = _current_version(path)
+        if version:
+            months.append((month, os.path.join(path, version)))
+    return MetricSnapshot(metric_id, months, manifest, mmap=mmap)
+
+
+def metric_averages(metrics, start: date | None = None, end: date | None = None) -> Dict[str, Dict[int, float]]:
+    """{code: {collaborator_id: média}} de várias métricas, só com os snapshots (sem banco)."""
+    out: Dict[str, Dict[int, float]] = {}
+    for m in metrics:
+        ids, avg, _ = open_snapshot(m.id).averages(start, end)
+        out[m.code] = dict(zip(ids.tolist(), avg.tolist()))
+    return out
@@ -0,0 +1,390 @@
+"""
+Metas com vigência, situação dos registros e contadores mensais.
+
+A meta que vale para um registro é a última MetricTarget da métrica com
+valid_from <= data, da equipe do colaborador se houver, senão a geral
+(equipe vazia). TargetTimeline monta essas vigências uma vez por
+métrica/equipe; a avaliação em lote (evaluate_records) faz um UPDATE por
+conjunto para cada trecho de vigência, em vez de procurar a meta registro
+a registro.
+
+MetricRecord.target_status é recalculado no import (só no intervalo de
+datas do arquivo) e quando uma meta muda (signals.py -> schedule_recompute,
+a partir da data em que a mudança passa a valer). O pedido de recálculo
+fica gravado em PendingRecompute junto com a mudança e só sai de lá quando
+o recálculo termina; o que um processo derrubado deixar para trás é refeito
+pelo comando drain_recomputes (cron). MetricMonthStat guarda,
+por colaborador/métrica/mês, quantidade, soma e dias fora da meta dos
+valores > 0 — a mesma regra que o dashboard usa.
+
+Ao fim de cada recálculo por mudança de meta o sinal targets_recomputed
+avisa quem guarda resultados derivados (ex.: resultados/scorecards.py).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from bisect import bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import MetricMonthStat, MetricRecord, MetricTarget, MetricType, PendingRecompute
+from .partitions import archived_before
+from .versions import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+NONE = MetricRecord.TARGET_NONE
+MET = MetricRecord.TARGET_MET
+MISSED = MetricRecord.TARGET_MISSED
+
+# enviado depois de recompute_metric: metric_id, start (None = histórico inteiro)
+targets_recomputed = Signal()
+
+# valid_from da meta "desde sempre" (a que valia antes do histórico existir)
+HISTORY_START = date(1900, 1, 1)
+
+
+def evaluate(value, target: float | None, better_when: str) -> int:
+    """Situação de um valor (valores <= 0 não são avaliados, como no dashboard)."""
+    if target is None or value is None or value <= 0:
+        return NONE
+    if better_when == "higher":
+        return MISSED if value < target else MET
+    return MISSED if value > target else MET
+
+
+def missed_q(target: float | None, better_when: str) -> Q | None:
+    """Mesma regra de evaluate() como filtro do ORM (None = sem meta)."""
+    if target is None:
+        return None
+    if better_when == "higher":
+        return Q(value__gt=0) & Q(value__lt=target)
+    return Q(value__gt=0) & Q(value__gt=target)
+
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def next_month(d: date) -> date:
+    return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+
+# ---------- vigências ----------
+
+@dataclass(frozen=True)
+class TargetPeriod:
+    start: Optional[date]  # inclusivo; None = desde sempre
+    end: Optional[date]  # exclusivo; None = em aberto
+    target_value: Optional[float]
+    better_when: str
+
+    def overlaps(self, start: date | None, end: date | None) -> bool:
+        """Cruza o intervalo [start, end] (datas inclusivas, None = aberto)?"""
+        if end is not None and self.start is not None and self.start > end:
+            return False
+        if start is not None and self.end is not None and self.end <= start:
+            return False
+        return True
+
+    def as_json(self) -> Dict:
+        return {
+            "from": self.start.isoformat() if self.start else None,
+            "value": self.target_value,
+            "better_when": self.better_when,
+        }
+
+
+# (valid_from, target_value, better_when)
+Entry = Tuple[date, Optional[float], str]
+
+
+class TargetTimeline:
+    """Vigências de uma métrica para uma equipe, em ordem; at() por bisect."""
+
+    def __init__(self, periods: List[TargetPeriod]):
+        self.periods = periods
+        self._starts = [p.start or date.min for p in periods]
+
+    @classmethod
+    def build(cls, base: Tuple[Optional[float], str], entries: Sequence[Entry]) -> "TargetTimeline":
+        periods: List[TargetPeriod] = []
+        start, current = None, base
+        for i, (valid_from, target, better_when) in enumerate(sorted(entries, key=lambda e: e[0])):
+            if i == 0 and valid_from <= HISTORY_START:
+                # vigência "desde sempre": substitui a meta de MetricType
+                current = (target, better_when)
+                continue
+            periods.append(TargetPeriod(start, valid_from, *current))
+            start, current = valid_from, (target, better_when)
+        periods.append(TargetPeriod(start, None, *current))
+        # trechos seguidos com a mesma meta viram um só
+        merged: List[TargetPeriod] = []
+        for p in periods:
+            if merged and (merged[-1].target_value, merged[-1].better_when) == (p.target_value, p.better_when):
+                merged[-1] = TargetPeriod(merged[-1].start, p.end, p.target_value, p.better_when)
+            else:
+                merged.append(p)
+        return cls(merged)
+
+    def at(self, d: date) -> TargetPeriod:
+        return self.periods[max(bisect_right(self._starts, d) - 1, 0)]
+
+    def evaluate(self, dates: Sequence[date], values: Sequence) -> List[int]:
+        """Situação de uma série inteira numa passada (datas em qualquer ordem)."""
+        starts, periods = self._starts, self.periods
+        out = []
+        for d, v in zip(dates, values):
+            p = periods[max(bisect_right(starts, d) - 1, 0)]
+            out.append(evaluate(v, p.target_value, p.better_when))
+        return out
+
+
+def _latest(entries: Sequence[Entry], d: date) -> Optional[Entry]:
+    found = None
+    for entry in entries:
+        if entry[0] <= d:
+            found = entry
+        else:
+            break
+    return found
+
+
+def _team_entries(global_entries: List[Entry], team_entries: List[Entry]) -> List[Entry]:
+    """Vigências de uma equipe: a meta dela quando existe, senão a geral, em cada ponto de troca."""
+    points = sorted({e[0] for e in global_entries} | {e[0] for e in team_entries})
+    merged = []
+    for d in points:
+        entry = _latest(team_entries, d) or _latest(global_entries, d)
+        if entry is not None:
+            merged.append((d, entry[1], entry[2]))
+    return merged
+
+
+def timelines_for(metrics: Iterable[MetricType]) -> Dict[int, Dict[str, TargetTimeline]]:
+    """
+    {metric_id: {equipe: TargetTimeline}} com uma consulta. A chave "" é a
+    vigência geral (usada por quem não tem meta própria da equipe).
+    """
+    metrics = list(metrics)
+    by_metric: Dict[int, Dict[str, List[Entry]]] = defaultdict(lambda: defaultdict(list))
+    rows = (
+        MetricTarget.objects.filter(metric_type_id__in=[m.id for m in metrics])
+        .order_by("valid_from")
+        .values_list("metric_type_id", "equipe", "valid_from", "target_value", "better_when")
+    )
+    for metric_id, equipe, valid_from, target, better_when in rows:
+        by_metric[metric_id][equipe].append((valid_from, target, better_when))
+
+    result: Dict[int, Dict[str, TargetTimeline]] = {}
+    for m in metrics:
+        base = (m.target_value, m.better_when)
+        entries = by_metric.get(m.id, {})
+        global_entries = entries.get("", [])
+        result[m.id] = {"": TargetTimeline.build(base, global_entries)}
+        for equipe, team_entries in entries.items():
+            if equipe:
+                result[m.id][equipe] = TargetTimeline.build(base, _team_entries(global_entries, team_entries))
+    return result
+
+
+def timeline_for(timelines: Dict[str, TargetTimeline], equipe: str) -> TargetTimeline:
+    return timelines.get(equipe or "") or timelines[""]
+
+
+# ---------- avaliação em lote ----------
+
+def _apply_target(qs, target: float | None, better_when: str) -> int:
+    """Grava a situação num conjunto de registros; cada UPDATE só toca quem muda."""
+    missed = missed_q(target, better_when)
+    if missed is None:
+        return qs.exclude(target_status=NONE).update(target_status=NONE)
+    changed = qs.filter(missed).exclude(target_status=MISSED).update(target_status=MISSED)
+    changed += qs.filter(value__gt=0).exclude(missed).exclude(target_status=MET).update(target_status=MET)
+    changed += qs.filter(value__lte=0).exclude(target_status=NONE).update(target_status=NONE)
+    return changed
+
+
+def evaluate_records(metric: MetricType, start: date | None = None, end: date | None = None) -> int:
+    """
+    Recalcula target_status dos registros da métrica entre start e end
+    (inclusivos; None = sem limite): para cada equipe com meta própria e para
+    o restante, um conjunto de UPDATEs por trecho de vigência. Devolve
+    quantas linhas mudaram de situação.
+    """
+    timelines = timelines_for([metric])[metric.id]
+    teams = [equipe for equipe in timelines if equipe]
+
+    qs = MetricRecord.objects.filter(metric_type_id=metric.id)
+    if start:
+        qs = qs.filter(date__gte=start)
+    if end:
+        qs = qs.filter(date__lte=end)
+
+    groups = [(qs.filter(collaborator__equipe=team), timelines[team]) for team in teams]
+    groups.append((qs.exclude(collaborator__equipe__in=teams) if teams else qs, timelines[""]))
+
+    changed = 0
+    for group_qs, timeline in groups:
+        for p in timeline.periods:
+            if not p.overlaps(start, end):
+                continue
+            period_qs = group_qs
+            if p.start:
+                period_qs = period_qs.filter(date__gte=p.start)
+            if p.end:
+                period_qs = period_qs.filter(date__lt=p.end)
+            changed += _apply_target(period_qs, p.target_value, p.better_when)
+    return changed
+
+
+def lock_metric(metric_id: int) -> None:
+    """
+    Trava a linha da MetricType até o fim da transação (SELECT ... FOR UPDATE).
+
+    Imports e recálculos da mesma métrica passam um de cada vez: quem chega
+    depois espera o commit do outro e, em READ COMMITTED, já agrega sobre os
+    registros dele (sem isso o DELETE + INSERT de refresh_month_stats em duas
+    transações ao mesmo tempo quebra o unique_together ou grava contadores sem
+    os registros da outra). Deve ser a primeira escrita da transação, antes de
+    travar registros, para não haver deadlock. No SQLite não faz nada (a
+    transação de escrita já é exclusiva).
+    """
+    list(MetricType.objects.select_for_update().filter(pk=metric_id).values_list("pk", flat=True))
+
+
+def refresh_month_stats(metric_id: int, start: date | None = None, end: date | None = None) -> int:
+    """
+    Refaz os contadores mensais da métrica (opcionalmente só dos meses entre
+    start e end) a partir dos registros, numa consulta agregada, com a
+    métrica travada (lock_metric).
+    """
+    # meses compactados (metrics/partitions.py) ficam congelados
+    hot_from = archived_before()
+    if hot_from and (start is None or start < hot_from):
+        if end is not None and end < hot_from:
+            return 0
+        start = hot_from
+
+    records = MetricRecord.objects.filter(metric_type_id=metric_id, value__gt=0)
+    stats = MetricMonthStat.objects.filter(metric_type_id=metric_id)
+    # meses inteiros: o primeiro e o último mês do intervalo entram completos
+    if start:
+        records = records.filter(date__gte=month_start(start))
+        stats = stats.filter(month__gte=month_start(start))
+    if end:
+        records = records.filter(date__lt=next_month(end))
+        stats = stats.filter(month__lte=month_start(end))
+
+    rows = (
+        records.annotate(month=TruncMonth("date"))
+        .values("collaborator_id", "month")
+        .annotate(
+            n=Count("id"),
+            total=Sum("value"),
+            met=Count("id", filter=Q(target_status=MET)),
+            missed=Count("id", filter=Q(target_status=MISSED)),
+        )
+        .order_by()
+    )
+    with transaction.atomic():
+        lock_metric(metric_id)
+        stats.delete()
+        objs = MetricMonthStat.objects.bulk_create(
+            (
+                MetricMonthStat(
+                    collaborator_id=r["collaborator_id"],
+                    metric_type_id=metric_id,
+                    month=r["month"],
+                    count=r["n"],
+                    total=r["total"] or 0,
+                    met=r["met"],
+                    missed=r["missed"],
+                )
+                for r in rows.iterator()
+            ),
+            batch_size=1000,
+        )
+    return len(objs)
+
+
+def recompute_metric(metric_id: int, start: date | None = None) -> None:
+    """Situação dos registros + contadores da métrica a partir de `start` (None = tudo)."""
+    metric = MetricType.objects.filter(pk=metric_id).first()
+    if metric is None:
+        return
+    with transaction.atomic():
+        lock_metric(metric.id)
+        changed = evaluate_records(metric, start)
+        refresh_month_stats(metric.id, start)
+    bump_data_version()
+    targets_recomputed.send(sender=MetricType, metric_id=metric.id, start=start)
+    logger.info("metas: %s recalculada desde %s (%s registros mudaram de situação)", metric.code, start, changed)
+
+
+# ---------- pedidos pendentes ----------
+
+def pending_requests(
+    kind: str, metric_id: int | None = None, older_than: timedelta | None = None,
+) -> Dict[int, List[Tuple[int, Optional[date], Optional[date]]]]:
+    """{metric_id: [(id, start, end), ...]} dos pedidos PendingRecompute de um tipo."""
+    qs = PendingRecompute.objects.filter(kind=kind)
+    if metric_id is not None:
+        qs = qs.filter(metric_type_id=metric_id)
+    if older_than is not None:
+        qs = qs.filter(created_at__lte=timezone.now() - older_than)
+    out: Dict[int, List] = defaultdict(list)
+    for pk, mid, start, end in qs.order_by("id").values_list("id", "metric_type_id", "start", "end"):
+        out[mid].append((pk, start, end))
+    return dict(out)
+
+
+def drain_recomputes(metric_id: int | None = None, older_than: timedelta | None = None) -> int:
+    """
+    Faz os recálculos de metas pendentes, um por métrica a partir do menor
+    start pedido (vazio vence: histórico inteiro), e apaga os pedidos
+    atendidos. Pedidos gravados durante o recálculo ficam para a próxima vez.
+    Devolve quantas métricas foram recalculadas.
+    """
+    pending = pending_requests(PendingRecompute.KIND_TARGETS, metric_id, older_than)
+    for mid, items in pending.items():
+        starts = [start for _, start, _ in items]
+        recompute_metric(mid, None if None in starts else min(starts))
+        PendingRecompute.objects.filter(id__in=[pk for pk, _, _ in items]).delete()
+    return len(pending)
+
+
+def _run_in_background(metric_id: int) -> None:
+    close_old_connections()
+    try:
+        drain_recomputes(metric_id)
+    except Exception:
+        logger.exception("metas: falha ao recalcular a métrica %s (fica para drain_recomputes)", metric_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_recompute(metric_id: int, start: date | None = None) -> None:
+    """
+    Registra o pedido (PendingRecompute, na transação da mudança) e recalcula
+    depois do commit. Por padrão numa thread, para a tela do admin não
+    esperar o UPDATE em milhões de linhas; com METRICS_RECOMPUTE_SYNC = True
+    roda na hora (testes, comandos).
+    """
+    PendingRecompute.objects.create(metric_type_id=metric_id, kind=PendingRecompute.KIND_TARGETS, start=start)
+    if getattr(settings, "METRICS_RECOMPUTE_SYNC", False):
+        transaction.on_commit(lambda: drain_recomputes(metric_id))
+        return
+    transaction.on_commit(
+        lambda: threading.Thread(target=_run_in_background, args=(metric_id,), daemon=True).start()
+    )
@@ -1,3 +1,446 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db.models import Avg, Count
+from django.test import TestCase, override_settings
+
+from accounts.models import Collaborator
+from uploads.models import UploadBatch
+from uploads.services import import_xlsx
+
+from . import partitions, snapshots, targets
+from .models import (
+    ArchivedMonth, MetricMonthStat, MetricRecord, MetricRecordArchive, MetricTarget, MetricType, PendingRecompute,
+)
+from .targets import MET, MISSED, NONE, TargetTimeline, evaluate_records
+from .versions import data_version
+
+D = date
+
+
+class TargetTimelineTests(TestCase):
+    def test_base_target_until_first_entry(self):
+        timeline = TargetTimeline.build((5.0, "higher"), [(D(2025, 2, 1), 3.0, "higher")])
+        self.assertEqual(timeline.at(D(2025, 1, 31)).target_value, 5.0)
+        self.assertEqual(timeline.at(D(2025, 2, 1)).target_value, 3.0)
+        self.assertEqual(timeline.at(D(2030, 1, 1)).target_value, 3.0)
+
+    def test_history_start_entry_replaces_base(self):
+        timeline = TargetTimeline.build((5.0, "higher"), [(D(1900, 1, 1), 7.0, "lower")])
+        self.assertEqual(len(timeline.periods), 1)
+        self.assertEqual(timeline.at(D(2000, 1, 1)).target_value, 7.0)
+        self.assertEqual(timeline.at(D(2000, 1, 1)).better_when, "lower")
+
+    def test_equal_consecutive_periods_are_merged(self):
+        timeline = TargetTimeline.build((5.0, "higher"), [
+            (D(2025, 3, 1), 5.0, "higher"),
+            (D(2025, 4, 1), 2.0, "higher"),
+        ])
+        self.assertEqual([(p.start, p.end) for p in timeline.periods], [(None, D(2025, 4, 1)), (D(2025, 4, 1), None)])
+
+    def test_evaluate_series(self):
+        timeline = TargetTimeline.build((5.0, "higher"), [(D(2025, 2, 1), None, "higher")])
+        self.assertEqual(
+            timeline.evaluate([D(2025, 1, 10), D(2025, 1, 11), D(2025, 1, 12), D(2025, 2, 5)], [6, 4, 0, 1]),
+            [MET, MISSED, NONE, NONE],
+        )
+
+
+class MetricTypeVersionTests(TestCase):
+    def test_display_change_bumps_data_version(self):
+        metric = MetricType.objects.create(name="Produção", code="producao", unit="un")
+        version = data_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            metric.save()
+        self.assertEqual(data_version(), version)
+
+        for field, value in (("name", "Produtividade"), ("unit", "min"), ("code", "prod_min")):
+            with self.subTest(field=field), self.captureOnCommitCallbacks(execute=True):
+                setattr(metric, field, value)
+                metric.save()
+            self.assertGreater(data_version(), version)
+            version = data_version()
+
+
+class RecordsTestCase(TestCase):
+    """Métrica com registros de dois colaboradores (equipes A e B)."""
+
+    def setUp(self):
+        self.metric = MetricType.objects.create(name="Produção", code="producao", target_value=5, better_when="higher")
+        self.a = Collaborator.objects.create(colaborador_id="A1", nome="Ana", equipe="A")
+        self.b = Collaborator.objects.create(colaborador_id="B1", nome="Bruno", equipe="B")
+        self.batch = UploadBatch.objects.create(metric_type=self.metric, original_filename="t.csv")
+
+    def add(self, collab, d, value):
+        MetricRecord.objects.create(
+            collaborator=collab, metric_type=self.metric, date=d, value=value, source_batch=self.batch,
+        )
+
+    def status(self, collab, d):
+        return MetricRecord.objects.get(collaborator=collab, metric_type=self.metric, date=d).target_status
+
+
+class EvaluateRecordsTests(RecordsTestCase):
+    def test_effective_dating_and_team_priority(self):
+        for collab in (self.a, self.b):
+            self.add(collab, D(2025, 1, 15), 4)
+            self.add(collab, D(2025, 2, 15), 4)
+            self.add(collab, D(2025, 3, 15), 4)
+        # geral: 3 a partir de fevereiro; equipe A: 6 a partir de março
+        MetricTarget.objects.create(metric_type=self.metric, valid_from=D(2025, 2, 1), target_value=3)
+        MetricTarget.objects.create(metric_type=self.metric, equipe="A", valid_from=D(2025, 3, 1), target_value=6)
+
+        self.assertEqual(evaluate_records(self.metric), 6)
+        self.assertEqual(self.status(self.a, D(2025, 1, 15)), MISSED)
+        self.assertEqual(self.status(self.a, D(2025, 2, 15)), MET)
+        self.assertEqual(self.status(self.a, D(2025, 3, 15)), MISSED)
+        self.assertEqual(self.status(self.b, D(2025, 1, 15)), MISSED)
+        self.assertEqual(self.status(self.b, D(2025, 2, 15)), MET)
+        self.assertEqual(self.status(self.b, D(2025, 3, 15)), MET)
+        # nada muda numa segunda passada
+        self.assertEqual(evaluate_records(self.metric), 0)
+
+    def test_range_limits_the_update(self):
+        self.add(self.a, D(2025, 1, 15), 4)
+        self.add(self.a, D(2025, 2, 15), 4)
+        evaluate_records(self.metric, start=D(2025, 2, 1))
+        self.assertEqual(self.status(self.a, D(2025, 1, 15)), NONE)
+        self.assertEqual(self.status(self.a, D(2025, 2, 15)), MISSED)
+
+    def test_non_positive_values_are_not_evaluated(self):
+        self.add(self.a, D(2025, 1, 15), 0)
+        evaluate_records(self.metric)
+        self.assertEqual(self.status(self.a, D(2025, 1, 15)), NONE)
+
+
+class RefreshMonthStatsTests(RecordsTestCase):
+    def stat(self, collab, month):
+        return MetricMonthStat.objects.get(collaborator=collab, metric_type=self.metric, month=month)
+
+    def test_counters_per_month(self):
+        self.add(self.a, D(2025, 1, 2), 6)
+        self.add(self.a, D(2025, 1, 3), 2)
+        self.add(self.a, D(2025, 1, 4), 0)  # fora dos contadores
+        self.add(self.a, D(2025, 2, 1), 8)
+        self.add(self.b, D(2025, 1, 2), 1)
+        evaluate_records(self.metric)
+
+        self.assertEqual(targets.refresh_month_stats(self.metric.id), 3)
+        jan = self.stat(self.a, D(2025, 1, 1))
+        self.assertEqual((jan.count, jan.total, jan.met, jan.missed), (2, 8.0, 1, 1))
+        self.assertEqual(jan.average, 4.0)
+        feb = self.stat(self.a, D(2025, 2, 1))
+        self.assertEqual((feb.count, feb.total, feb.met, feb.missed), (1, 8.0, 1, 0))
+        self.assertEqual(self.stat(self.b, D(2025, 1, 1)).missed, 1)
+
+    def test_range_rebuilds_whole_months_only(self):
+        self.add(self.a, D(2025, 1, 2), 6)
+        self.add(self.a, D(2025, 2, 1), 8)
+        targets.refresh_month_stats(self.metric.id)
+        self.add(self.a, D(2025, 1, 20), 3)
+        self.add(self.a, D(2025, 2, 20), 3)
+
+        # meio de janeiro: janeiro inteiro é refeito, fevereiro fica como estava
+        targets.refresh_month_stats(self.metric.id, D(2025, 1, 25), D(2025, 1, 31))
+        self.assertEqual(self.stat(self.a, D(2025, 1, 1)).count, 2)
+        self.assertEqual(self.stat(self.a, D(2025, 2, 1)).count, 1)
+        # mês sem registros some
+        MetricRecord.objects.filter(date__month=1).delete()
+        targets.refresh_month_stats(self.metric.id, D(2025, 1, 1), D(2025, 1, 31))
+        self.assertFalse(MetricMonthStat.objects.filter(month=D(2025, 1, 1)).exists())
+
+    @override_settings(METRICS_RECOMPUTE_SYNC=True, METRICS_SNAPSHOT_DIR="")
+    def test_import_writes_status_and_counters(self):
+        user = get_user_model().objects.create_user("importador")
+        csv = "colaborador_id;data;valor\nA1;2025-01-02;6\nA1;2025-01-03;2\nA1;2025-01-04;0\nB1;2025-02-01;9\n"
+        import_xlsx(self.metric, SimpleUploadedFile("m.csv", csv.encode()), user)
+
+        self.assertEqual(self.status(self.a, D(2025, 1, 2)), MET)
+        self.assertEqual(self.status(self.a, D(2025, 1, 3)), MISSED)
+        self.assertEqual(self.status(self.a, D(2025, 1, 4)), NONE)
+        jan = self.stat(self.a, D(2025, 1, 1))
+        self.assertEqual((jan.count, jan.total, jan.met, jan.missed), (2, 8.0, 1, 1))
+        self.assertEqual(self.stat(self.b, D(2025, 2, 1)).met, 1)
+
+        # reimportar o mesmo dia troca o valor e refaz só o mês tocado
+        import_xlsx(self.metric, SimpleUploadedFile("m.csv", b"colaborador_id;data;valor\nA1;2025-01-03;7\n"), user)
+        self.assertEqual(self.status(self.a, D(2025, 1, 3)), MET)
+        jan = self.stat(self.a, D(2025, 1, 1))
+        self.assertEqual((jan.count, jan.total, jan.met, jan.missed), (2, 13.0, 2, 0))
+
+
+@override_settings(METRICS_RECOMPUTE_SYNC=True, METRICS_SNAPSHOT_DIR="")
+class PendingRecomputeTests(RecordsTestCase):
+    def test_target_change_is_recorded_and_drained_after_commit(self):
+        self.add(self.a, D(2025, 3, 15), 4)
+        with self.captureOnCommitCallbacks() as callbacks:
+            MetricTarget.objects.create(metric_type=self.metric, valid_from=D(2025, 3, 1), target_value=3)
+        # gravado na transação da mudança, antes de qualquer recálculo
+        self.assertEqual(
+            list(PendingRecompute.objects.values_list("kind", "start")),
+            [(PendingRecompute.KIND_TARGETS, D(2025, 3, 1))],
+        )
+        self.assertEqual(self.status(self.a, D(2025, 3, 15)), NONE)
+
+        for callback in callbacks:
+            callback()
+        self.assertFalse(PendingRecompute.objects.exists())
+        self.assertEqual(self.status(self.a, D(2025, 3, 15)), MET)
+        self.assertEqual(MetricMonthStat.objects.get(collaborator=self.a).met, 1)
+
+    def test_failed_recompute_keeps_request(self):
+        with mock.patch.object(targets, "recompute_metric", side_effect=RuntimeError("worker caiu")):
+            with self.captureOnCommitCallbacks():
+                MetricTarget.objects.create(metric_type=self.metric, valid_from=D(2025, 3, 1), target_value=3)
+            with self.assertLogs("metrics.targets", "ERROR"):
+                targets._run_in_background(self.metric.id)
+        self.assertEqual(PendingRecompute.objects.count(), 1)
+
+        out = StringIO()
+        call_command("drain_recomputes", "--older-than", "0", stdout=out)
+        self.assertIn("Metas: 1 métrica(s)", out.getvalue())
+        self.assertFalse(PendingRecompute.objects.exists())
+
+    def test_drain_merges_requests_per_metric(self):
+        other = MetricType.objects.create(name="TMA", code="tma")
+        for metric, start in ((self.metric, D(2025, 3, 1)), (self.metric, D(2025, 1, 1)), (other, D(2025, 2, 1)),
+                              (other, None)):
+            PendingRecompute.objects.create(metric_type=metric, kind=PendingRecompute.KIND_TARGETS, start=start)
+        PendingRecompute.objects.create(metric_type=other, kind=PendingRecompute.KIND_SNAPSHOT)
+
+        with mock.patch.object(targets, "recompute_metric") as recompute:
+            self.assertEqual(targets.drain_recomputes(), 2)
+        # o menor start por métrica; vazio (histórico inteiro) vence
+        self.assertEqual(
+            sorted(c.args for c in recompute.call_args_list), [(self.metric.id, D(2025, 1, 1)), (other.id, None)],
+        )
+        self.assertEqual(list(PendingRecompute.objects.values_list("kind", flat=True)), ["snapshot"])
+
+    def test_drain_skips_recent_requests(self):
+        PendingRecompute.objects.create(metric_type=self.metric, kind=PendingRecompute.KIND_TARGETS)
+        with mock.patch.object(targets, "recompute_metric") as recompute:
+            self.assertEqual(targets.drain_recomputes(older_than=timedelta(minutes=15)), 0)
+        recompute.assert_not_called()
+        self.assertEqual(PendingRecompute.objects.count(), 1)
+
+
+@override_settings(METRICS_RECOMPUTE_SYNC=True, METRICS_SNAPSHOT_DIR="")
+class CompactionTests(RecordsTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.delete(partitions.ARCHIVED_BEFORE_KEY)
+        self.addCleanup(cache.delete, partitions.ARCHIVED_BEFORE_KEY)
+        for d, value in ((D(2025, 1, 10), 6), (D(2025, 1, 20), 2), (D(2025, 2, 5), 7), (D(2025, 3, 1), 1)):
+            self.add(self.a, d, value)
+        self.add(self.b, D(2025, 2, 6), 9)
+        evaluate_records(self.metric)
+        targets.refresh_month_stats(self.metric.id)
+
+    def test_months_to_archive(self):
+        self.assertEqual(partitions.months_to_archive(D(2025, 3, 1)), [D(2025, 1, 1), D(2025, 2, 1)])
+        self.assertEqual(partitions.months_to_archive(D(2025, 1, 1)), [])
+
+    def test_compact_moves_months_and_freezes_them(self):
+        self.assertIsNone(partitions.archived_before())
+        hot_ids = set(MetricRecord.objects.filter(date__lt=D(2025, 3, 1)).values_list("id", flat=True))
+        with self.captureOnCommitCallbacks() as callbacks:
+            moved = partitions.compact(D(2025, 3, 1))
+        self.assertEqual(moved, [(D(2025, 1, 1), 2), (D(2025, 2, 1), 2)])
+
+        # saíram da tabela quente com id, valor e situação preservados
+        self.assertEqual(list(MetricRecord.objects.values_list("date", flat=True)), [D(2025, 3, 1)])
+        self.assertEqual(set(MetricRecordArchive.objects.values_list("record_id", flat=True)), hot_ids)
+        self.assertEqual(
+            sorted(MetricRecordArchive.objects.filter(collaborator=self.a).values_list("date", "value", "target_status")),
+            [(D(2025, 1, 10), 6.0, MET), (D(2025, 1, 20), 2.0, MISSED), (D(2025, 2, 5), 7.0, MET)],
+        )
+        self.assertEqual(dict(ArchivedMonth.objects.values_list("month", "records")), {D(2025, 1, 1): 2, D(2025, 2, 1): 2})
+
+        # o valor em cache só muda depois do commit
+        self.assertIsNone(partitions.archived_before())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(partitions.archived_before(), D(2025, 3, 1))
+
+        # contadores mensais ficam, e não são refeitos a partir da tabela vazia
+        targets.refresh_month_stats(self.metric.id)
+        jan = MetricMonthStat.objects.get(collaborator=self.a, metric_type=self.metric, month=D(2025, 1, 1))
+        self.assertEqual((jan.count, jan.total, jan.met, jan.missed), (2, 8.0, 1, 1))
+        self.assertEqual(MetricMonthStat.objects.filter(month__lt=D(2025, 3, 1)).count(), 3)
+
+        # nada mais a arquivar
+        self.assertEqual(partitions.compact(D(2025, 3, 1)), [])
+
+    def test_import_refuses_rows_in_frozen_months(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            partitions.compact(D(2025, 2, 1))
+        user = get_user_model().objects.create_user("importador")
+        csv = "colaborador_id;data;valor\nA1;2025-01-15;3\nA1;2025-02-15;3\n"
+        _, report = import_xlsx(self.metric, SimpleUploadedFile("m.csv", csv.encode()), user)
+        self.assertEqual(report["imported"], 1)
+        batch = UploadBatch.objects.get(pk=report["batch_id"])
+        self.assertEqual(
+            list(batch.errors.values_list("first_row", "reason")),
+            [(2, "Data em mês já arquivado (antes de 02/2025)")],
+        )
+        self.assertFalse(MetricRecord.objects.filter(date__lt=D(2025, 2, 1)).exists())
+        self.assertEqual(MetricRecordArchive.objects.get(date=D(2025, 1, 10)).value, 6.0)
+
+    def test_command_dry_run_lists_months(self):
+        out = StringIO()
+        with mock.patch("metrics.management.commands.compact_metrics.timezone.localdate", return_value=D(2025, 3, 20)):
+            call_command("compact_metrics", "--months", "2", "--dry-run", stdout=out)
+        self.assertIn("01/2025", out.getvalue())
+        self.assertIn("1 mês(es) seriam arquivados (antes de 02/2025).", out.getvalue())
+        self.assertFalse(ArchivedMonth.objects.exists())
+
+
+@skipUnless(snapshots.np is not None, "numpy não instalado")
+class SnapshotTests(RecordsTestCase):
+    def setUp(self):
+        super().setUp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        override = override_settings(METRICS_SNAPSHOT_DIR=root, METRICS_RECOMPUTE_SYNC=True)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.delete(partitions.ARCHIVED_BEFORE_KEY)
+        self.addCleanup(cache.delete, partitions.ARCHIVED_BEFORE_KEY)
+
+        self.c = Collaborator.objects.create(colaborador_id="C1", nome="Carla", equipe="A")
+        # médias: Ana 6, Bruno 6 (empate), Carla 3; zero não conta
+        for collab, values in ((self.a, (4, 8, 0)), (self.b, (6, 6, 6)), (self.c, (3, 3, 3))):
+            for d, value in zip((D(2025, 1, 10), D(2025, 2, 10), D(2025, 2, 11)), values):
+                self.add(collab, d, value)
+        evaluate_records(self.metric)
+        snapshots.build(self.metric.id)
+
+    def month_path(self, month):
+        return snapshots._month_dir(self.metric.id, month)
+
+    def versions(self, month):
+        return sorted(n for n in os.listdir(self.month_path(month)) if n.startswith("v"))
+
+    def test_build_writes_one_version_per_month(self):
+        self.assertEqual(snapshots._months_on_disk(self.metric.id), [D(2025, 1, 1), D(2025, 2, 1)])
+        for month in (D(2025, 1, 1), D(2025, 2, 1)):
+            self.assertEqual([snapshots._current_version(self.month_path(month))], self.versions(month))
+        snap = snapshots.open_snapshot(self.metric.id)
+        self.assertEqual(len(snap), 9)
+        self.assertEqual(snapshots.refresh(MetricType.objects.create(name="TMA", code="tma").id, D(2025, 1, 1)), 0)
+
+    def test_refresh_swaps_current_and_keeps_previous_version(self):
+        feb = D(2025, 2, 1)
+        before = snapshots.open_snapshot(self.metric.id)
+        first = snapshots._current_version(self.month_path(feb))
+
+        MetricRecord.objects.filter(collaborator=self.c, date=D(2025, 2, 10)).update(value=9)
+        self.assertEqual(snapshots.refresh(self.metric.id, D(2025, 2, 15), D(2025, 2, 20)), 6)
+        second = snapshots._current_version(self.month_path(feb))
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.versions(feb), sorted([first, second]))
+        # janeiro não foi tocado
+        self.assertEqual(len(self.versions(D(2025, 1, 1))), 1)
+        # quem abriu antes continua lendo a versão anterior
+        self.assertEqual(float(before.columns(feb)["value"].max()), 8.0)
+        self.assertEqual(float(snapshots.open_snapshot(self.metric.id).columns(feb)["value"].max()), 9.0)
+
+        # só a anterior fica em disco
+        snapshots.refresh(self.metric.id, feb, feb)
+        self.assertEqual(len(self.versions(feb)), 2)
+        self.assertNotIn(first, self.versions(feb))
+
+        # mês que ficou sem registros sai do snapshot
+        MetricRecord.objects.filter(date__gte=feb).delete()
+        snapshots.refresh(self.metric.id, feb)
+        self.assertEqual(snapshots._months_on_disk(self.metric.id), [D(2025, 1, 1)])
+
+    def test_refresh_is_clamped_to_hot_months(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            partitions.compact(D(2025, 2, 1))
+        jan = D(2025, 1, 1)
+        version = snapshots._current_version(self.month_path(jan))
+
+        # janeiro arquivado: nada a regravar (e não some por estar fora de MetricRecord)
+        self.assertEqual(snapshots.refresh(self.metric.id, jan, D(2025, 1, 31)), 0)
+        self.assertEqual(snapshots.refresh(self.metric.id, jan), 6)
+        self.assertEqual(snapshots._current_version(self.month_path(jan)), version)
+        self.assertEqual(len(snapshots.open_snapshot(self.metric.id).columns(jan, D(2025, 1, 31))["day"]), 3)
+        # a geração completa lê os arquivados
+        self.assertEqual(snapshots.build(self.metric.id), 9)
+
+    def test_drain_merges_ranges_per_metric(self):
+        for start, end in ((D(2025, 2, 1), D(2025, 2, 28)), (D(2025, 1, 5), D(2025, 1, 31)), (D(2025, 3, 1), None)):
+            PendingRecompute.objects.create(
+                metric_type=self.metric, kind=PendingRecompute.KIND_SNAPSHOT, start=start, end=end,
+            )
+        PendingRecompute.objects.create(metric_type=self.metric, kind=PendingRecompute.KIND_TARGETS)
+        with mock.patch.object(snapshots, "refresh") as refresh:
+            self.assertEqual(snapshots.drain_refreshes(), 1)
+        # do menor start ao maior end; end vazio (até o fim) vence
+        refresh.assert_called_once_with(self.metric.id, D(2025, 1, 5), None)
+        self.assertEqual(list(PendingRecompute.objects.values_list("kind", flat=True)), ["targets"])
+
+    def test_import_refreshes_touched_months(self):
+        user = get_user_model().objects.create_user("importador")
+        feb = snapshots._current_version(self.month_path(D(2025, 2, 1)))
+        csv = "colaborador_id;data;valor\nA1;2025-03-03;7\n"
+        with self.captureOnCommitCallbacks(execute=True):
+            import_xlsx(self.metric, SimpleUploadedFile("m.csv", csv.encode()), user)
+        self.assertFalse(PendingRecompute.objects.exists())
+        self.assertEqual(snapshots._months_on_disk(self.metric.id)[-1], D(2025, 3, 1))
+        self.assertEqual(snapshots._current_version(self.month_path(D(2025, 2, 1))), feb)
+
+    def orm_averages(self, start, end):
+        return dict(
+            MetricRecord.objects.filter(metric_type=self.metric, date__range=(start, end), value__gt=0)
+            .values("collaborator").annotate(avg=Avg("value")).values_list("collaborator", "avg")
+        )
+
+    def test_aggregates_match_orm(self):
+        snap = snapshots.open_snapshot(self.metric.id)
+        for start, end in ((D(2025, 1, 1), D(2025, 2, 28)), (D(2025, 2, 1), D(2025, 2, 10)), (D(2025, 1, 10), D(2025, 1, 10))):
+            with self.subTest(start=start, end=end):
+                ids, avg, counts = snap.averages(start, end)
+                self.assertEqual(dict(zip(ids.tolist(), avg.tolist())), self.orm_averages(start, end))
+                expected_counts = dict(
+                    MetricRecord.objects.filter(metric_type=self.metric, date__range=(start, end), value__gt=0)
+                    .values("collaborator").annotate(n=Count("id")).values_list("collaborator", "n")
+                )
+                self.assertEqual(dict(zip(ids.tolist(), counts.tolist())), expected_counts)
+
+                ids, ratio, evaluated = snap.attainment(start, end)
+                qs = MetricRecord.objects.filter(metric_type=self.metric, date__range=(start, end))
+                expected = {}
+                for collab_id in qs.values_list("collaborator", flat=True).distinct():
+                    mine = qs.filter(collaborator=collab_id).exclude(target_status=NONE)
+                    expected[collab_id] = (mine.filter(target_status=MET).count(), mine.count())
+                got = dict(zip(ids.tolist(), zip(ratio.tolist(), evaluated.tolist())))
+                self.assertEqual(got.keys(), expected.keys())
+                for collab_id, (met, total) in expected.items():
+                    self.assertEqual(got[collab_id][1], total)
+                    if total:
+                        self.assertAlmostEqual(got[collab_id][0], met / total)
+
+    def test_ranking_ties_share_position(self):
+        snap = snapshots.open_snapshot(self.metric.id)
+        ids, avg, rank = snap.ranking(D(2025, 1, 1), D(2025, 2, 28))
+        got = dict(zip(ids.tolist(), rank.tolist()))
+        self.assertEqual(got, {self.a.id: 1, self.b.id: 1, self.c.id: 3})
+
+        ids, avg, rank = snap.ranking(D(2025, 1, 1), D(2025, 2, 28), better_when="lower")
+        self.assertEqual(dict(zip(ids.tolist(), rank.tolist())), {self.c.id: 1, self.a.id: 2, self.b.id: 2})
+
+        # mesma regra do RANK() do SQL: 1 + quantos têm média melhor
+        averages = self.orm_averages(D(2025, 1, 1), D(2025, 2, 28))
+        self.assertEqual(got, {
+            cid: 1 + sum(1 for other in averages.values() if other > mine) for cid, mine in averages.items()
+        })
@@ -0,0 +1,63 @@
+"""
+Versões para compor chaves de cache.
+
+Todo import e todo recálculo de metas chamam bump_data_version() depois do
+commit. Quem guarda resultado derivado em cache põe data_version() na chave
+e nunca precisa apagar nada: com a versão nova as entradas antigas deixam
+de ser encontradas e expiram sozinhas. O mesmo esquema serve para outras
+versões (ex.: accounts/access.py).
+
+Com mais de um processo, CACHES precisa ser compartilhado: num cache local
+(LocMemCache) a troca de versão só vale no processo que a fez. Nesse caso
+o check metrics.W001 avisa e cache_timeout() encurta a validade das
+entradas para LOCAL_CACHE_SECONDS, o atraso máximo entre os processos.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+DATA_VERSION_KEY = "metrics:data_version"
+
+# backends que não dividem entradas entre processos
+LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def shared_cache() -> bool:
+    return settings.CACHES["default"]["BACKEND"] not in LOCAL_BACKENDS
+
+
+def cache_timeout(seconds: int | None) -> int | None:
+    """Validade de uma entrada versionada; no cache local, no máximo LOCAL_CACHE_SECONDS."""
+    if shared_cache():
+        return seconds
+    local = getattr(settings, "LOCAL_CACHE_SECONDS", 60)
+    return local if seconds is None else min(seconds, local)
+
+
+def cache_version(key: str) -> int:
+    version = cache.get(key)
+    if version is None:
+        # sem versão (cache novo ou chave expulsa): parte do relógio para não
+        # reaproveitar chaves de uma numeração anterior
+        cache.add(key, int(time.time()), timeout=None)
+        version = cache.get(key, int(time.time()))
+    return version
+
+
+def bump_cache_version(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache_version(key)
+
+
+def data_version() -> int:
+    return cache_version(DATA_VERSION_KEY)
+
+
+def bump_data_version() -> None:
+    bump_cache_version(DATA_VERSION_KEY)
@@ -1,3 +1,27 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Scorecard, ScorecardRun
+
+
+@admin.register(Scorecard)
+class ScorecardAdmin(admin.ModelAdmin):
+    list_display = ("collaborator", "month", "group", "metrics_met", "metrics_evaluated",
+                    "days_missed", "days_evaluated", "attainment", "computed_at")
+    list_filter = ("group", "month", "collaborator__equipe")
+    list_select_related = ("collaborator",)
+    search_fields = ("collaborator__colaborador_id", "collaborator__nome")
+    date_hierarchy = "month"
+    readonly_fields = [f.name for f in Scorecard._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(ScorecardRun)
+class ScorecardRunAdmin(admin.ModelAdmin):
+    list_display = ("id", "mode", "started_at", "finished_at", "last_batch_id", "collaborators", "rows")
+    list_filter = ("mode",)
+    readonly_fields = [f.name for f in ScorecardRun._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ResultadosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'resultados'
+
+    def ready(self):
+        from . import signals  # registra sinais
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from resultados.scorecards import run
+
+
+class Command(BaseCommand):
+    """
+    Agendar no cron do servidor, ex. a cada 15 minutos:
+
+        */15 * * * * cd /srv/visibilidade && python manage.py compute_scorecards
+    """
+
+    help = (
+        "Calcula os resultados mensais (bônus, RV, ICS e IVS) de todos os colaboradores. "
+        "Por padrão incremental: só o que os lotes importados e as metas alteradas desde a "
+        "última execução tocaram."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="refaz todos os colaboradores")
+        parser.add_argument("--from", dest="month_from", default=None,
+                            help="com --full, só a partir do mês AAAA-MM")
+
+    def handle(self, *args, full, month_from, **options):
+        if month_from:
+            if not full:
+                raise CommandError("--from só vale junto com --full.")
+            try:
+                month_from = datetime.strptime(month_from, "%Y-%m").date()
+            except ValueError:
+                raise CommandError("Mês inválido (use AAAA-MM).")
+        record = run(full=full, months_from=month_from)
+        self.stdout.write(self.style.SUCCESS(
+            f"{record.get_mode_display()}: {record.collaborators} colaborador(es), {record.rows} linha(s)."
+        ))
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScorecardInvalidation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month_from', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScorecardRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('full', 'Completo'), ('incremental', 'Incremental')], max_length=16)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_batch_id', models.PositiveIntegerField(default=0)),
+                ('collaborators', models.PositiveIntegerField(default=0)),
+                ('rows', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Scorecard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('group', models.CharField(choices=[('bonus', 'Bônus'), ('rv', 'Remuneração Variável'), ('ics_ivs', 'ICS e IVS')], max_length=16)),
+                ('metrics_evaluated', models.PositiveSmallIntegerField(default=0)),
+                ('metrics_met', models.PositiveSmallIntegerField(default=0)),
+                ('days_evaluated', models.PositiveIntegerField(default=0)),
+                ('days_missed', models.PositiveIntegerField(default=0)),
+                ('attainment', models.FloatField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField()),
+                ('collaborator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scorecards', to='accounts.collaborator')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month', 'group'], name='resultados__month_f379f5_idx')],
+                'unique_together': {('collaborator', 'month', 'group')},
+            },
+        ),
+    ]
@@ -1,3 +1,59 @@
 from django.db import models
 
-# Create your models here.
+from accounts.models import Collaborator
+from dashboards.data import SECTIONS
+
+
+class Scorecard(models.Model):
+    """
+    Resultado mensal de um colaborador em um grupo de métricas (Bônus, RV,
+    ICS e IVS). É uma fotografia calculada em lote por compute_scorecards a
+    partir dos contadores mensais (ver resultados/scorecards.py); dashboards
+    e exportações só leem daqui.
+    """
+    GROUP_CHOICES = SECTIONS
+
+    collaborator = models.ForeignKey(Collaborator, on_delete=models.CASCADE, related_name="scorecards")
+    month = models.DateField()  # primeiro dia do mês
+    group = models.CharField(max_length=16, choices=GROUP_CHOICES)
+    metrics_evaluated = models.PositiveSmallIntegerField(default=0)  # métricas com dias avaliados no mês
+    metrics_met = models.PositiveSmallIntegerField(default=0)  # média do mês dentro da meta vigente no fim do mês
+    days_evaluated = models.PositiveIntegerField(default=0)
+    days_missed = models.PositiveIntegerField(default=0)
+    attainment = models.FloatField(null=True, blank=True)  # 0..1: média, por métrica, da fração de dias na meta
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("collaborator", "month", "group")
+        indexes = [models.Index(fields=["month", "group"])]
+
+    def __str__(self):
+        return f"{self.collaborator} · {self.get_group_display()} · {self.month:%m/%Y}"
+
+
+class ScorecardRun(models.Model):
+    """Execução de compute_scorecards; last_batch_id é a marca d'água do modo incremental."""
+    MODE_CHOICES = [
+        ("full", "Completo"),
+        ("incremental", "Incremental"),
+    ]
+
+    mode = models.CharField(max_length=16, choices=MODE_CHOICES)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_batch_id = models.PositiveIntegerField(default=0)
+    collaborators = models.PositiveIntegerField(default=0)
+    rows = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-started_at"]
+
+
+class ScorecardInvalidation(models.Model):
+    """
+    Meses que precisam ser refeitos para todos os colaboradores porque uma
+    meta mudou (gravado pelo sinal targets_recomputed; consumido pelo
+    próximo compute_scorecards). month_from vazio = histórico inteiro.
+    """
+    month_from = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
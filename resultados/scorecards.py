@@ -0,0 +1,240 @@
+"""
+Cálculo em lote dos resultados mensais (Scorecard) de todos os colaboradores.
+
+Tudo sai dos contadores mensais (MetricMonthStat: dias dentro/fora da meta
+e soma/quantidade por colaborador/métrica/mês), numa leitura por execução,
+em vez de recalcular registro a registro por colaborador. Por grupo
+(Bônus, RV, ICS e IVS) e mês:
+
+- days_evaluated / days_missed: soma dos dias avaliados / fora da meta;
+- attainment: média, entre as métricas avaliadas, da fração de dias dentro
+  da meta;
+- metrics_met: métricas cuja média do mês está dentro da meta vigente no
+  último dia do mês para a equipe do colaborador (metrics.targets).
+
+O modo incremental só refaz os pares colaborador/mês tocados por lotes
+importados desde a execução anterior (marca d'água em ScorecardRun), mais
+os meses invalidados por mudança de meta (ScorecardInvalidation).
+"""
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from dashboards.data import group_key_for_metric
+from metrics.models import MetricMonthStat, MetricRecord, MetricType
+from metrics.targets import evaluate, month_start, next_month, timeline_for, timelines_for
+from uploads.models import UploadBatch
+
+from .models import Scorecard, ScorecardInvalidation, ScorecardRun
+
+logger = logging.getLogger(__name__)
+
+# lote pendente ou em "processing" há mais que isso é tratado como abandonado (não segura a marca d'água)
+STALE_BATCH_AGE = timedelta(hours=6)
+
+# (collaborator_id, month)
+Pair = Tuple[int, date]
+
+
+def _scope_q(months_from: date | None, pairs: Iterable[Pair] | None) -> Q:
+    """Filtro de MetricMonthStat/Scorecard: meses a partir de months_from ou pares colaborador/mês."""
+    if pairs is None:
+        return Q(month__gte=months_from) if months_from else Q()
+    by_month: Dict[date, Set[int]] = defaultdict(set)
+    for collaborator_id, month in pairs:
+        by_month[month].add(collaborator_id)
+    q = Q(pk__in=[])
+    for month, ids in by_month.items():
+        q |= Q(month=month, collaborator_id__in=sorted(ids))
+    return q
+
+
+def compute(months_from: date | None = None, pairs: Iterable[Pair] | None = None) -> Tuple[Set[int], int]:
+    """
+    Refaz os Scorecards do escopo (pares colaborador/mês, ou todos os meses a
+    partir de months_from; nenhum dos dois = tudo). Devolve (ids dos
+    colaboradores, linhas gravadas).
+    """
+    if pairs is not None:
+        pairs = set(pairs)
+        if not pairs:
+            return set(), 0
+    scope = _scope_q(months_from, pairs)
+
+    metrics = list(MetricType.objects.all())
+    timelines = timelines_for(metrics)
+    group_of = {m.id: group_key_for_metric(m) for m in metrics}
+
+    stats = (
+        MetricMonthStat.objects.filter(scope)
+        .values_list("collaborator_id", "collaborator__equipe", "metric_type_id", "month",
+                     "count", "total", "met", "missed")
+        .order_by()
+    )
+    # (collaborator_id, month, group) -> [métricas avaliadas, métricas na meta, dias, dias fora, soma das frações]
+    acc: Dict[Tuple[int, date, str], List] = defaultdict(lambda: [0, 0, 0, 0, 0.0])
+    for collaborator_id, equipe, metric_id, month, count, total, met, missed in stats.iterator(chunk_size=5000):
+        evaluated = met + missed
+        if not evaluated or metric_id not in group_of:
+            continue
+        row = acc[(collaborator_id, month, group_of[metric_id])]
+        row[0] += 1
+        row[2] += evaluated
+        row[3] += missed
+        row[4] += met / evaluated
+        target = timeline_for(timelines[metric_id], equipe).at(next_month(month) - timedelta(days=1))
+        if count and evaluate(total / count, target.target_value, target.better_when) == MetricRecord.TARGET_MET:
+            row[1] += 1
+
+    now = timezone.now()
+    objs = [
+        Scorecard(
+            collaborator_id=collaborator_id,
+            month=month,
+            group=group,
+            metrics_evaluated=n_metrics,
+            metrics_met=n_met,
+            days_evaluated=days,
+            days_missed=days_missed,
+            attainment=fractions / n_metrics,
+            computed_at=now,
+        )
+        for (collaborator_id, month, group), (n_metrics, n_met, days, days_missed, fractions) in acc.items()
+    ]
+    with transaction.atomic():
+        Scorecard.objects.filter(scope).delete()
+        Scorecard.objects.bulk_create(objs, batch_size=1000)
+    return {key[0] for key in acc}, len(objs)
+
+
+def _batch_watermark() -> int:
+    """
+    Maior id de lote cujos registros já estão todos visíveis: lotes na fila
+    ou ainda em processamento seguram a marca d'água logo antes deles.
+    """
+    batches = UploadBatch.objects.all()
+    in_flight = batches.filter(
+        status__in=("pending", "processing"), created_at__gte=timezone.now() - STALE_BATCH_AGE,
+    ).aggregate(m=Min("id"))["m"]
+    if in_flight is not None:
+        return in_flight - 1
+    return batches.aggregate(m=Max("id"))["m"] or 0
+
+
+def touched_pairs(after_batch_id: int, upto_batch_id: int) -> Set[Pair]:
+    """Pares colaborador/mês com registros gravados pelos lotes (after, upto]."""
+    rows = (
+        MetricRecord.objects.filter(source_batch_id__gt=after_batch_id, source_batch_id__lte=upto_batch_id)
+        .annotate(month=TruncMonth("date"))
+        .values_list("collaborator_id", "month")
+        .distinct()
+        .order_by()
+    )
+    return set(rows)
+
+
+def run(full: bool = False, months_from: date | None = None) -> ScorecardRun:
+    """
+    Uma execução de compute_scorecards. Completa (ou sem execução anterior):
+    refaz tudo a partir de months_from. Incremental: só o que os lotes novos
+    e as metas alteradas tocaram.
+    """
+    previous = ScorecardRun.objects.filter(finished_at__isnull=False).order_by("-id").first()
+    full = full or previous is None
+    watermark = _batch_watermark()
+    invalidations = list(ScorecardInvalidation.objects.values_list("id", "month_from"))
+    record = ScorecardRun.objects.create(mode="full" if full else "incremental", last_batch_id=watermark)
+
+    collaborators, rows = set(), 0
+    if full:
+        collaborators, rows = compute(months_from=months_from)
+    else:
+        if invalidations:
+            # uma invalidação sem mês (histórico inteiro) vence as demais
+            froms = [m for _, m in invalidations]
+            start = None if None in froms else min(froms)
+            collaborators, rows = compute(months_from=start)
+        # quando a invalidação começa depois, os meses anteriores dos lotes novos ainda faltam
+        pairs = touched_pairs(previous.last_batch_id, watermark)
+        if invalidations:
+            pairs = {p for p in pairs if start is not None and p[1] < start}
+        c, r = compute(pairs=pairs)
+        collaborators, rows = collaborators | c, rows + r
+
+    ScorecardInvalidation.objects.filter(id__in=[i for i, _ in invalidations]).delete()
+    record.collaborators = len(collaborators)
+    record.rows = rows
+    record.finished_at = timezone.now()
+    record.save(update_fields=["collaborators", "rows", "finished_at"])
+    logger.info("scorecards: execução %s (%s) — %s colaboradores, %s linhas",
+                record.id, record.mode, record.collaborators, rows)
+    return record
+
+
+def invalidate(start: date | None) -> None:
+    """Marca os meses a partir de `start` para o próximo compute_scorecards."""
+    ScorecardInvalidation.objects.create(month_from=month_start(start) if start else None)
+
+
+# ---------- leitura (dashboard / exportação) ----------
+
+def load_scorecards(collaborator_id: int, start: date | None, end: date | None) -> List[Dict]:
+    """
+    Resultados dos meses que cruzam o período, do mais recente ao mais antigo:
+    [{"month": date, "groups": {group: Scorecard}}, ...].
+    """
+    qs = Scorecard.objects.filter(collaborator_id=collaborator_id)
+    if start:
+        qs = qs.filter(month__gte=month_start(start))
+    if end:
+        qs = qs.filter(month__lte=end)
+    months: Dict[date, Dict[str, Scorecard]] = {}
+    for sc in qs.order_by("-month", "group"):
+        months.setdefault(sc.month, {})[sc.group] = sc
+    return [{"month": month, "groups": groups} for month, groups in months.items()]
+
+
+EXPORT_HEADER = [
+    "colaborador_id", "nome", "equipe", "mes", "grupo",
+    "metricas_avaliadas", "metricas_na_meta", "dias_avaliados", "dias_fora_da_meta", "atingimento",
+]
+EXPORT_FIELDS = (
+    "collaborator__colaborador_id",
+    "collaborator__nome",
+    "collaborator__equipe",
+    "month",
+    "group",
+    "metrics_evaluated",
+    "metrics_met",
+    "days_evaluated",
+    "days_missed",
+    "attainment",
+)
+
+
+def export_queryset(
+    *,
+    collaborator_ids=None,
+    equipe: str | None = None,
+    start: date | None = None,
+    end: date | None = None,
+):
+    qs = Scorecard.objects.all()
+    if collaborator_ids is not None:
+        qs = qs.filter(collaborator_id__in=collaborator_ids)
+    if equipe:
+        qs = qs.filter(collaborator__equipe=equipe)
+    if start:
+        qs = qs.filter(month__gte=month_start(start))
+    if end:
+        qs = qs.filter(month__lte=end)
+    return qs.order_by("month", "collaborator_id", "group").values_list(*EXPORT_FIELDS)
+
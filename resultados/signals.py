@@ -0,0 +1,11 @@
+from django.dispatch import receiver
+
+from metrics.targets import targets_recomputed
+
+from .scorecards import invalidate
+
+
+@receiver(targets_recomputed)
+def invalidate_on_target_change(sender, metric_id, start, **kwargs):
+    """Meta mudou: os meses a partir da mudança entram no próximo compute_scorecards."""
+    invalidate(start)
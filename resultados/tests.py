@@ -1,3 +1,98 @@
-from django.test import TestCase
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from accounts.models import Collaborator
+from metrics.models import MetricTarget, MetricType
+from uploads.models import UploadBatch
+from uploads.services import import_xlsx
+
+from . import scorecards
+from .models import Scorecard, ScorecardInvalidation, ScorecardRun
+
+D = date
+
+
+@override_settings(METRICS_RECOMPUTE_SYNC=True, METRICS_SNAPSHOT_DIR="")
+class IncrementalScorecardTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("importador")
+        self.metric = MetricType.objects.create(name="Produção", code="producao", target_value=5)
+        Collaborator.objects.bulk_create([
+            Collaborator(colaborador_id=f"C{i}", nome=f"Colaborador {i}", equipe="A" if i < 3 else "B")
+            for i in range(6)
+        ])
+        self.upload(range(6), D(2025, 1, 1), 60)
+
+    def upload(self, cids, start, days, value=lambda c, d: (c + d) % 9):
+        lines = ["colaborador_id;data;valor"] + [
+            f"C{c};{start + timedelta(days=d)};{value(c, d)}" for d in range(days) for c in cids
+        ]
+        _, report = import_xlsx(self.metric, SimpleUploadedFile("m.csv", "\n".join(lines).encode()), self.user)
+        return report["batch_id"]
+
+    def snapshot(self):
+        return {
+            (s.collaborator_id, s.month, s.group): (
+                s.metrics_evaluated, s.metrics_met, s.days_evaluated, s.days_missed, round(s.attainment, 9),
+            )
+            for s in Scorecard.objects.all()
+        }
+
+    def assert_matches_full_run(self):
+        incremental = self.snapshot()
+        scorecards.run(full=True)
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_first_run_is_full_and_records_watermark(self):
+        run = scorecards.run()
+        self.assertEqual(run.mode, "full")
+        self.assertEqual(run.last_batch_id, UploadBatch.objects.latest("id").id)
+        self.assertEqual(run.collaborators, 6)
+        self.assertTrue(run.finished_at)
+
+    def test_incremental_only_touches_new_batches(self):
+        scorecards.run()
+        batch_id = self.upload([4], D(2025, 2, 10), 5, value=lambda c, d: 9)
+        run = scorecards.run()
+        self.assertEqual(run.mode, "incremental")
+        self.assertEqual(run.last_batch_id, batch_id)
+        self.assertEqual(run.collaborators, 1)
+        self.assertEqual(run.rows, 1)
+        self.assert_matches_full_run()
+
+        # sem lotes novos não há nada a refazer
+        run = scorecards.run()
+        self.assertEqual((run.collaborators, run.rows, run.last_batch_id), (0, 0, batch_id))
+
+    def test_batch_in_progress_holds_watermark(self):
+        first = scorecards.run()
+        pending = UploadBatch.objects.create(metric_type=self.metric, original_filename="x.csv", status="processing")
+        self.upload([1], D(2025, 1, 20), 3, value=lambda c, d: 1)
+        run = scorecards.run()
+        self.assertEqual(run.last_batch_id, pending.id - 1)
+        self.assertEqual(run.last_batch_id, first.last_batch_id)
+
+        # o lote preso há mais de STALE_BATCH_AGE deixa de segurar
+        UploadBatch.objects.filter(pk=pending.pk).update(
+            created_at=pending.created_at - scorecards.STALE_BATCH_AGE - timedelta(minutes=1),
+        )
+        run = scorecards.run()
+        self.assertEqual(run.last_batch_id, UploadBatch.objects.latest("id").id)
+        self.assertEqual(run.collaborators, 1)
+        self.assert_matches_full_run()
+
+    def test_target_change_invalidates_months(self):
+        scorecards.run()
+        with self.captureOnCommitCallbacks(execute=True):
+            MetricTarget.objects.create(metric_type=self.metric, equipe="A", valid_from=D(2025, 2, 1), target_value=2)
+        self.assertEqual(
+            list(ScorecardInvalidation.objects.values_list("month_from", flat=True)), [D(2025, 2, 1)],
+        )
+        run = scorecards.run()
+        self.assertEqual(run.mode, "incremental")
+        self.assertFalse(ScorecardInvalidation.objects.exists())
+        self.assertFalse(ScorecardRun.objects.filter(finished_at__isnull=True).exists())
+        self.assert_matches_full_run()
@@ -0,0 +1,9 @@
+# resultados/urls.py
+from django.urls import path
+from . import views
+
+app_name = "resultados"
+
+urlpatterns = [
+    path("export/", views.export_scorecards, name="export"),
+]
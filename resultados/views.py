@@ -1,3 +1,53 @@
-from django.shortcuts import render
+from datetime import datetime
 
-# Create your views here.
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest
+from django.utils.text import slugify
+
+from accounts.access import scope_collaborators
+from accounts.models import Collaborator
+from dashboards.exports import EXPORT_CHUNK_SIZE, csv_rows_response, xlsx_rows_response
+from visibilidade.db_router import pin_read, use_replica
+from .scorecards import EXPORT_HEADER, export_queryset
+
+
+def _parse_month_param(s):
+    if not s:
+        return None
+    try:
+        return datetime.strptime(s[:7], "%Y-%m").date()
+    except ValueError:
+        return None
+
+
+@login_required
+@use_replica
+def export_scorecards(request):
+    """
+    Exporta os resultados mensais (CSV ou XLSX) filtrando por colaborador,
+    equipe e meses (start/end em AAAA-MM). Quem não é staff só exporta os
+    colaboradores que pode ver (accounts/access.py).
+    """
+    fmt = (request.GET.get("format") or "csv").lower()
+    if fmt not in ("csv", "xlsx"):
+        return HttpResponseBadRequest("Formato inválido (use csv ou xlsx).")
+
+    start = _parse_month_param(request.GET.get("start"))
+    end = _parse_month_param(request.GET.get("end"))
+    if start and end and start > end:
+        start, end = end, start
+
+    equipe = request.GET.get("equipe") or None
+    cid = request.GET.get("colaborador_id") or None
+    collaborator_ids = Collaborator.objects.filter(colaborador_id=cid).values("id") if cid else None
+
+    qs = export_queryset(collaborator_ids=collaborator_ids, equipe=equipe, start=start, end=end)
+    qs = pin_read(scope_collaborators(qs, request.user))
+    rows = qs.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    filename = slugify("-".join(
+        p for p in ("resultados", cid, equipe,
+                    f"{start:%Y-%m}" if start else "", f"{end:%Y-%m}" if end else "") if p
+    ))
+    if fmt == "xlsx":
+        return xlsx_rows_response(EXPORT_HEADER, rows, filename, sheet="resultados")
+    return csv_rows_response(EXPORT_HEADER, rows, filename)
@@ -0,0 +1,89 @@
+"""
+Benchmark dos perfis de banco (DB_PROFILE) com escrita e leitura concorrentes.
+
+Roda contra um banco de teste criado do zero (nunca o banco configurado):
+
+    DB_PROFILE=basic python scripts/bench_db.py
+    DB_PROFILE=tuned python scripts/bench_db.py --threads 8 --writes 200
+
+Para SQLite o banco de teste é um arquivo temporário (o padrão do Django em
+testes é memória, o que esconderia o problema de "database is locked").
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "visibilidade.settings")
+
+import django  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=100, help="transações de escrita por thread")
+    parser.add_argument("--reads", type=int, default=500, help="consultas de leitura por thread")
+    args = parser.parse_args()
+
+    django.setup()
+    from django.conf import settings
+    from django.db import OperationalError, connection, connections
+    from django.test.utils import setup_test_environment
+
+    db = settings.DATABASES["default"]
+    if db["ENGINE"].endswith("sqlite3"):
+        db.setdefault("TEST", {})["NAME"] = os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    from accounts.models import Collaborator
+
+    errors = []
+    lock = threading.Lock()
+
+    def writer(tid):
+        try:
+            for i in range(args.writes):
+                try:
+                    Collaborator.objects.create(colaborador_id=f"B{tid}-{i}", nome="bench")
+                except OperationalError as exc:
+                    with lock:
+                        errors.append(str(exc))
+        finally:
+            connections.close_all()
+
+    def reader(tid):
+        try:
+            for i in range(args.reads):
+                Collaborator.objects.filter(colaborador_id=f"B{tid}-{i % max(args.writes, 1)}").exists()
+        finally:
+            connections.close_all()
+
+    def run(target, label, ops):
+        threads = [threading.Thread(target=target, args=(t,)) for t in range(args.threads)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        print(f"{label:<8} {ops:>7} ops  {elapsed:8.3f}s  {ops / elapsed:10.1f} ops/s")
+
+    profile = os.getenv("DB_PROFILE", "tuned")
+    print(f"perfil={profile} engine={db['ENGINE']} threads={args.threads}")
+    try:
+        run(writer, "escrita", args.threads * args.writes)
+        run(reader, "leitura", args.threads * args.reads)
+        print(f"erros de lock: {len(errors)}")
+    finally:
+        connection.creation.destroy_test_db(db["NAME"], verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark da leitura de planilhas no import: leitor rápido (XlsxSheetReader)
+contra o caminho com openpyxl (load_workbook read_only).
+
+    python scripts/bench_xlsx_reader.py --rows 200000
+    python scripts/bench_xlsx_reader.py --file planilha.xlsx --time-metric
+    python scripts/bench_xlsx_reader.py --rows 500000 --workers 4
+
+Com --workers, compara também a leitura paralela (uploads/parallel.py) com
+a sequencial do leitor rápido. Além do tempo de relógio, mostra o caminho
+crítico: a parte serial (extração da aba, cortes, junção, subida do pool)
+mais a tarefa mais longa. É o tempo esperado com um núcleo livre por
+processo, e é o número que vale numa máquina com menos núcleos que
+--workers, onde as tarefas rodam uma depois da outra.
+
+Não toca no banco: só mede a etapa de leitura/conversão das linhas.
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "visibilidade.settings")
+
+import django  # noqa: E402
+
+
+def make_workbook(path: str, n_rows: int, extra_cols: int) -> None:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("dados")
+    ws.append(["colaborador_id", "nome", "data", "valor"] + [f"extra_{i}" for i in range(extra_cols)])
+    start = date(2024, 1, 1)
+    for i in range(n_rows):
+        ws.append(
+            [f"C{i % 5000:05d}", f"Colaborador {i % 5000}", start + timedelta(days=i % 365), (i % 1000) / 7.0]
+            + [i] * extra_cols
+        )
+    wb.save(path)
+
+
+def bench(label, fn, path, metric, repeat):
+    best = None
+    for _ in range(repeat):
+        with open(path, "rb") as fh:
+            t0 = time.perf_counter()
+            rows, err = fn(fh, metric)
+            elapsed = time.perf_counter() - t0
+        if err:
+            raise SystemExit(f"{label}: {err}")
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<10} {len(rows):>9} linhas  {best:8.3f}s  {len(rows) / best:12.0f} linhas/s")
+    return best, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--extra-cols", type=int, default=4, help="colunas não mapeadas (são ignoradas)")
+    parser.add_argument("--file", help="usar uma planilha existente")
+    parser.add_argument("--time-metric", action="store_true", help="simular métrica de tempo")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=0, help="medir também a leitura paralela com N processos")
+    args = parser.parse_args()
+
+    django.setup()
+    from metrics.models import MetricType
+    from uploads.services import _read_rows_fast, _read_rows_openpyxl
+
+    metric = MetricType(name="Tempo médio" if args.time_metric else "Produção", code="bench", unit="")
+    path = args.file
+    if not path:
+        path = os.path.join(tempfile.mkdtemp(), "bench.xlsx")
+        t0 = time.perf_counter()
+        make_workbook(path, args.rows, args.extra_cols)
+        print(f"planilha gerada em {time.perf_counter() - t0:.1f}s ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+    t_fast, rows_fast = bench("rápido", _read_rows_fast, path, metric, args.repeat)
+    if args.workers > 1:
+        bench_parallel(path, metric, args.workers, args.repeat, t_fast, rows_fast)
+        return
+    t_slow, rows_slow = bench("openpyxl", _read_rows_openpyxl, path, metric, args.repeat)
+    if rows_fast != rows_slow:
+        raise SystemExit("ERRO: os dois leitores produziram linhas diferentes")
+    print(f"ganho: {t_slow / t_fast:.1f}x (resultados idênticos)")
+
+
+def bench_parallel(path, metric, n_workers, repeat, t_seq, rows_seq):
+    from django.test import override_settings
+
+    from uploads import parallel
+    from uploads.services import _looks_like_time_metric
+
+    best = None
+    with override_settings(UPLOAD_PARALLEL_WORKERS=n_workers):
+        for _ in range(repeat):
+            children = resource.getrusage(resource.RUSAGE_CHILDREN)
+            t0, cpu0 = time.perf_counter(), time.process_time()
+            parsed, err = parallel.read_rows(path, "xlsx", _looks_like_time_metric(metric))
+            wall, parent = time.perf_counter() - t0, time.process_time() - cpu0
+            if err:
+                raise SystemExit(f"paralelo: {err}")
+            after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            children_cpu = (after.ru_utime + after.ru_stime) - (children.ru_utime + children.ru_stime)
+            tasks = [t for t in parsed.task_seconds if t]
+            procs = min(n_workers, len(tasks))
+            # subida de cada processo (django.setup) = CPU dos filhos fora das tarefas, em paralelo
+            startup = max(children_cpu - sum(tasks), 0) / procs
+            critical = parent + startup + max(tasks)
+            if best is None or critical < best[1]:
+                best = (wall, critical, tasks, parsed, parent, startup)
+    wall, critical, tasks, parsed, parent, startup = best
+    rows = list(parsed)
+    if rows != rows_seq:
+        raise SystemExit("ERRO: leitura paralela diferente da sequencial")
+    print(f"paralelo   {len(rows):>9} linhas  {wall:8.3f}s de relógio ({os.cpu_count()} núcleo(s) na máquina)")
+    print(f"  tarefas: {len(tasks)}, mais longa {max(tasks):.3f}s, soma {sum(tasks):.3f}s")
+    print(f"  processo principal {parent:.3f}s (extração, cortes, junção), subida de um processo {startup:.3f}s")
+    print(f"  caminho crítico: {critical:.3f}s -> ganho esperado {t_seq / critical:.1f}x com {n_workers} núcleos livres")
+
+
+if __name__ == "__main__":
+    main()
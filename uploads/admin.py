@@ -1,10 +1,194 @@
 # uploads/admin.py
+import csv
+from datetime import timedelta
+
 from django.contrib import admin
-from .models import UploadBatch
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html, format_html_join
+
+from .models import UploadBatch, UploadSession
+from .profiling import STAGE_LABELS, aggregate, size_bucket
+
+# quantas faixas de erro mostrar direto na tela do lote (o resto fica na página de erros)
+REPORT_PREVIEW_ERRORS = 20
+ERRORS_PER_PAGE = 200
+# janela e limite de lotes do histórico de desempenho do import
+PROFILE_HISTORY_DAYS = 90
+PROFILE_HISTORY_MAX_BATCHES = 5000
+
+
+class _Echo:
+    """Buffer mínimo para o csv.writer devolver a linha em vez de gravar."""
+
+    def write(self, value):
+        return value
+
+
+def _memory_label(profile: dict) -> str:
+    """Crescimento do RSS durante o import (pico amostrado) e pico dos processos de leitura."""
+    growth = profile.get("rss_growth_mb")
+    if growth is None:
+        return "—"
+    label = f"+{growth} MB (pico {profile['rss_peak_mb']} MB)"
+    if profile.get("workers_peak_rss_mb"):
+        label += f", leitura paralela: {profile['workers_peak_rss_mb']} MB por processo"
+    return label
+
 
 @admin.register(UploadBatch)
 class UploadBatchAdmin(admin.ModelAdmin):
-    list_display = ("id", "metric_type", "original_filename", "user", "created_at")
+    list_display = ("id", "metric_type", "original_filename", "user", "created_at", "error_count", "duration")
     list_filter = ("metric_type", "created_at")
+    list_select_related = ("metric_type", "user")
     search_fields = ("original_filename", "user__username")
-    readonly_fields = ("created_at", "report")
+    readonly_fields = ("created_at", "error_count", "report_summary", "profile_summary")
+    exclude = ("report", "profile")
+
+    @admin.display(description="Duração")
+    def duration(self, obj):
+        total = (obj.profile or {}).get("total_seconds")
+        return "—" if total is None else f"{total:.1f} s"
+
+    @admin.display(description="Desempenho")
+    def profile_summary(self, obj):
+        profile = obj.profile or {}
+        if not profile.get("stages"):
+            return "—"
+        header = format_html(
+            "Total: {} s · {} linhas/s · {} consultas · transação: {} s · memória: {} · leitor: {}",
+            profile["total_seconds"], profile.get("rows_per_sec") or "—", profile.get("queries", 0),
+            profile.get("transaction_seconds", 0), _memory_label(profile), profile.get("reader") or "—",
+        )
+        rows = format_html_join(
+            "", "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>",
+            (
+                (STAGE_LABELS.get(s["name"], s["name"]), s["seconds"], s["rows"], s["rows_per_sec"] or "—", s["queries"])
+                for s in profile["stages"]
+            ),
+        )
+        return format_html(
+            "{}<table><thead><tr><th>Etapa</th><th>Segundos</th><th>Linhas</th><th>Linhas/s</th>"
+            '<th>Consultas</th></tr></thead><tbody>{}</tbody></table><a href="{}">Histórico de desempenho</a>',
+            header, rows, reverse("admin:uploads_uploadbatch_profile_history"),
+        )
+
+    @admin.display(description="Relatório")
+    def report_summary(self, obj):
+        report = obj.report or {}
+        counts = format_html(
+            "Importadas: {} · Criadas: {} · Atualizadas: {} · Erros: {}",
+            report.get("imported", 0), report.get("created", 0),
+            report.get("updated", 0), obj.error_count,
+        )
+        if report.get("error"):
+            return format_html("{}<br>{}", counts, report["error"])
+        if not obj.error_count:
+            return counts
+        runs = obj.errors.all()[:REPORT_PREVIEW_ERRORS]
+        preview = format_html_join("", "<li>Linha(s) {}: {}</li>", ((e.rows_label, e.reason) for e in runs))
+        return format_html(
+            '{}<ul>{}</ul><a href="{}">Ver todos os erros</a> · <a href="{}">Baixar CSV</a>',
+            counts, preview,
+            reverse("admin:uploads_uploadbatch_errors", args=[obj.pk]),
+            reverse("admin:uploads_uploadbatch_errors_csv", args=[obj.pk]),
+        )
+
+    def get_urls(self):
+        urls = [
+            path(
+                "profile-history/",
+                self.admin_site.admin_view(self.profile_history_view),
+                name="uploads_uploadbatch_profile_history",
+            ),
+            path(
+                "<int:object_id>/errors/",
+                self.admin_site.admin_view(self.errors_view),
+                name="uploads_uploadbatch_errors",
+            ),
+            path(
+                "<int:object_id>/errors.csv",
+                self.admin_site.admin_view(self.errors_csv_view),
+                name="uploads_uploadbatch_errors_csv",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def _get_batch_or_403(self, request, object_id):
+        batch = get_object_or_404(UploadBatch, pk=object_id)
+        if not self.has_view_permission(request, batch):
+            raise PermissionDenied
+        return batch
+
+    def errors_view(self, request, object_id):
+        batch = self._get_batch_or_403(request, object_id)
+        page = Paginator(batch.errors.all(), ERRORS_PER_PAGE).get_page(request.GET.get("page"))
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": f"Erros do lote #{batch.pk}",
+            "object": batch,
+            "page": page,
+        }
+        return TemplateResponse(request, "admin/uploads/uploadbatch/errors.html", context)
+
+    def profile_history_view(self, request):
+        """Perfis dos lotes recentes agregados por semana, por formato/tamanho de arquivo e por métrica."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        since = timezone.now() - timedelta(days=PROFILE_HISTORY_DAYS)
+        batches = list(
+            UploadBatch.objects.filter(created_at__gte=since, status="imported")
+            .exclude(profile={})
+            .values("created_at", "rows_total", "metric_type__name", "profile")
+            .order_by("-created_at")[:PROFILE_HISTORY_MAX_BATCHES]
+        )
+        for b in batches:
+            week = timezone.localtime(b["created_at"]).date()
+            b["week"] = week - timedelta(days=week.weekday())
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Desempenho do import",
+            "days": PROFILE_HISTORY_DAYS,
+            "batch_count": len(batches),
+            "groupings": [
+                ("Semana", aggregate(batches, lambda b: f"{b['week']:%d/%m/%Y}")),
+                ("Leitor · linhas", aggregate(
+                    batches, lambda b: f"{b['profile'].get('reader') or '—'} · {size_bucket(b['rows_total'])}",
+                )),
+                ("Métrica", aggregate(batches, lambda b: b["metric_type__name"])),
+            ],
+        }
+        return TemplateResponse(request, "admin/uploads/uploadbatch/profile_history.html", context)
+
+    def errors_csv_view(self, request, object_id):
+        batch = self._get_batch_or_403(request, object_id)
+        writer = csv.writer(_Echo())
+        rows = batch.errors.values_list("first_row", "last_row", "reason").iterator(chunk_size=2000)
+
+        def stream():
+            yield writer.writerow(["linha_inicial", "linha_final", "linhas", "motivo"])
+            for first, last, reason in rows:
+                yield writer.writerow([first, last, last - first + 1, reason])
+
+        response = StreamingHttpResponse(stream(), content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = f'attachment; filename="lote-{batch.pk}-erros.csv"'
+        return response
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ("original_filename", "metric_type", "user", "status", "received", "total_size", "updated_at")
+    list_filter = ("status", "metric_type")
+    list_select_related = ("metric_type", "user")
+    search_fields = ("original_filename", "user__username")
+    readonly_fields = [f.name for f in UploadSession._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from uploads.staging import purge_stale
+
+
+class Command(BaseCommand):
+    help = "Remove uploads em partes abandonados e arquivos órfãos do diretório de staging."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-age-hours", type=int, default=None,
+            help="idade mínima da sessão parada (padrão: UPLOAD_STAGING_MAX_AGE_HOURS)",
+        )
+
+    def handle(self, *args, **options):
+        removed = purge_stale(options["max_age_hours"])
+        self.stdout.write(self.style.SUCCESS(f"{removed} sessão(ões) removida(s)."))
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from uploads.services import drain_imports
+
+
+class Command(BaseCommand):
+    """
+    Importa os lotes que ficaram na fila (a thread do worker não chegou a
+    rodar) e fecha os que morreram no meio. Agendar no cron do servidor:
+
+        */5 * * * * cd /srv/visibilidade && python manage.py run_pending_imports
+    """
+
+    help = (
+        "Importa os lotes pendentes com mais de --older-than minutos (para não disputar com a "
+        "thread do worker) e marca como falhos os lotes interrompidos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, default=5, metavar="MINUTOS",
+                            help="só lotes na fila há mais que isso (padrão: 5; 0 = todos)")
+
+    def handle(self, *args, older_than, **options):
+        imported, interrupted = drain_imports(timedelta(minutes=older_than) if older_than else None)
+        self.stdout.write(self.style.SUCCESS(
+            f"{imported} lote(s) importado(s). {interrupted} lote(s) interrompido(s) marcado(s) como falho(s)."
+        ))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadbatch',
+            name='error_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='UploadError',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(max_length=255)),
+                ('first_row', models.PositiveIntegerField()),
+                ('last_row', models.PositiveIntegerField()),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='errors', to='uploads.uploadbatch')),
+            ],
+            options={
+                'ordering': ['batch', 'first_row'],
+                'indexes': [models.Index(fields=['batch', 'first_row'], name='uploads_upl_batch_i_a27903_idx')],
+            },
+        ),
+    ]
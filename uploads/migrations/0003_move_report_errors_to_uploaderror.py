@@ -0,0 +1,54 @@
+from django.db import migrations
+
+
+def forwards(apps, schema_editor):
+    """Move os erros do JSON report["errors"] para UploadError (faixas de linhas)."""
+    UploadBatch = apps.get_model("uploads", "UploadBatch")
+    UploadError = apps.get_model("uploads", "UploadError")
+
+    for batch in UploadBatch.objects.filter(report__has_key="errors").iterator(chunk_size=50):
+        report = dict(batch.report or {})
+        errors = report.pop("errors", None) or []
+        runs = []
+        for e in errors:
+            row, reason = e.get("row") or 0, (e.get("reason") or "")[:255]
+            if runs and runs[-1][2] == reason and runs[-1][1] + 1 == row:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row, reason])
+        UploadError.objects.bulk_create(
+            [UploadError(batch=batch, first_row=a, last_row=b, reason=r) for a, b, r in runs],
+            batch_size=1000,
+        )
+        report["error_count"] = len(errors)
+        batch.report = report
+        batch.error_count = len(errors)
+        batch.save(update_fields=["report", "error_count"])
+
+
+def backwards(apps, schema_editor):
+    UploadBatch = apps.get_model("uploads", "UploadBatch")
+    UploadError = apps.get_model("uploads", "UploadError")
+
+    for batch in UploadBatch.objects.filter(error_count__gt=0).iterator(chunk_size=50):
+        errors = [
+            {"row": row, "reason": e.reason}
+            for e in UploadError.objects.filter(batch=batch).order_by("first_row")
+            for row in range(e.first_row, e.last_row + 1)
+        ]
+        report = dict(batch.report or {})
+        report.pop("error_count", None)
+        report["errors"] = errors
+        batch.report = report
+        batch.save(update_fields=["report"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("uploads", "0002_uploaderror"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
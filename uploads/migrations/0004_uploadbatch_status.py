@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("uploads", "0003_move_report_errors_to_uploaderror"),
+    ]
+
+    operations = [
+        # lotes já existentes foram importados de forma síncrona
+        migrations.AddField(
+            model_name="uploadbatch",
+            name="status",
+            field=models.CharField(
+                choices=[("pending", "Pendente"), ("processing", "Processando"), ("imported", "Importado"), ("failed", "Falhou")],
+                default="imported",
+                max_length=16,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="uploadbatch",
+            name="status",
+            field=models.CharField(
+                choices=[("pending", "Pendente"), ("processing", "Processando"), ("imported", "Importado"), ("failed", "Falhou")],
+                default="pending",
+                max_length=16,
+            ),
+        ),
+        migrations.AddField(
+            model_name="uploadbatch",
+            name="rows_total",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0005_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadbatch',
+            name='profile',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
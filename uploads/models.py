@@ -1,4 +1,8 @@
 # uploads/models.py
+import os
+import uuid
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -7,6 +11,13 @@ from metrics.models import MetricType
 User = get_user_model()
 
 class UploadBatch(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Pendente"),
+        ("processing", "Processando"),
+        ("imported", "Importado"),
+        ("failed", "Falhou"),
+    ]
+
     user = models.ForeignKey(
         User, on_delete=models.SET_NULL, null=True, blank=True,
         related_name="upload_batches"
@@ -16,8 +27,15 @@ class UploadBatch(models.Model):
     )
     original_filename = models.CharField(max_length=255)
     created_at = models.DateTimeField(default=timezone.now)
-    # relatório do import: {"imported": n, "created": n, "updated": n, "errors":[...]}
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="pending")
+    rows_total = models.PositiveIntegerField(default=0)
+    # relatório do import: {"imported": n, "created": n, "updated": n, "error_count": n}
+    # os erros por linha ficam em UploadError (agrupados em faixas de linhas)
     report = models.JSONField(default=dict, blank=True)
+    error_count = models.PositiveIntegerField(default=0)
+    # perfil do import: tempo/linhas/consultas por etapa, transação, pico de memória
+    # (uploads/profiling.py)
+    profile = models.JSONField(default=dict, blank=True)
 
     class Meta:
         ordering = ["-created_at"]
@@ -25,6 +43,82 @@ class UploadBatch(models.Model):
             ("can_upload_metrics", "Can upload metrics XLS/XLSX files"),
         ]
 
+    @property
+    def staging_path(self) -> str:
+        """Arquivo do lote enquanto espera o import em segundo plano (services.queue_import)."""
+        ext = os.path.splitext(self.original_filename)[1].lower()
+        return os.path.join(settings.UPLOAD_STAGING_DIR, f"batch-{self.pk}{ext}")
+
     def __str__(self) -> str:
         who = self.user.get_username() if self.user else "system"
         return f"{self.metric_type} · {self.original_filename} · {who} · {self.created_at:%Y-%m-%d %H:%M}"
+
+
+class UploadError(models.Model):
+    """
+    Erros de import agrupados por motivo em faixas contíguas de linhas
+    (ex.: "colaborador_id '123' não encontrado", linhas 10–250).
+    """
+    batch = models.ForeignKey(UploadBatch, on_delete=models.CASCADE, related_name="errors")
+    reason = models.CharField(max_length=255)
+    first_row = models.PositiveIntegerField()
+    last_row = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ["batch", "first_row"]
+        indexes = [models.Index(fields=["batch", "first_row"])]
+
+    @property
+    def row_count(self) -> int:
+        return self.last_row - self.first_row + 1
+
+    @property
+    def rows_label(self) -> str:
+        if self.first_row == self.last_row:
+            return str(self.first_row)
+        return f"{self.first_row}–{self.last_row}"
+
+    def __str__(self) -> str:
+        return f"Linhas {self.rows_label}: {self.reason}"
+
+
+class UploadSession(models.Model):
+    """
+    Upload em partes (retomável) de um arquivo grande para o diretório de
+    staging (UPLOAD_STAGING_DIR). Cada parte é anexada no offset atual;
+    quando o arquivo está completo o import lê direto do disco.
+    """
+    STATUS_CHOICES = [
+        ("receiving", "Recebendo"),
+        ("imported", "Importado"),
+        ("failed", "Falhou"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="upload_sessions")
+    metric_type = models.ForeignKey(MetricType, on_delete=models.CASCADE, related_name="upload_sessions")
+    original_filename = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    # SHA-256 do arquivo inteiro: informado pelo cliente (opcional) e conferido no fim
+    sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="receiving")
+    batch = models.ForeignKey(
+        UploadBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    @property
+    def staging_path(self) -> str:
+        return os.path.join(settings.UPLOAD_STAGING_DIR, f"{self.pk}.part")
+
+    @property
+    def is_complete(self) -> bool:
+        return self.received >= self.total_size
+
+    def __str__(self) -> str:
+        return f"{self.original_filename} · {self.received}/{self.total_size} · {self.get_status_display()}"
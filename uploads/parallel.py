@@ -0,0 +1,338 @@
+"""
+Leitura paralela (opcional) de arquivos grandes do import.
+
+Ligada com UPLOAD_PARALLEL_WORKERS > 1. O trabalho é dividido em tarefas
+independentes e distribuído num pool de processos:
+
+- .xlsx: só a aba ativa, como no modo sequencial e na pré-visualização.
+  O processo principal descompacta o XML da aba uma vez para um arquivo
+  temporário e corta em faixas de bytes alinhadas em fim de linha
+  (xlsx_reader.row_boundaries); cada processo varre só a sua faixa. As
+  linhas vazias entre uma faixa e a seguinte são preenchidas na junção;
+- .csv: faixas de bytes alinhadas em quebra de linha (o arquivo precisa
+  ter um registro por linha; aspas com quebra de linha caem no modo
+  sequencial).
+
+Cada processo devolve colunas compactas (array de linhas, datas como
+ordinal, valores em double) e o processo principal junta tudo para o
+gravador em lote de services._upsert_rows. UPLOAD_PARALLEL_MAX_MEMORY_MB
+limita quantas tarefas rodam ao mesmo tempo, pela estimativa de memória
+de cada uma (tamanho da faixa). Medição: scripts/bench_xlsx_reader.py
+--workers N.
+"""
+from __future__ import annotations
+
+import csv
+import math
+import mmap
+import multiprocessing
+import os
+import tempfile
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from itertools import chain
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from .xlsx_reader import XlsxReaderError, XlsxSheetReader, row_boundaries
+
+
+def enabled() -> bool:
+    return workers() > 1
+
+
+def workers() -> int:
+    return int(getattr(settings, "UPLOAD_PARALLEL_WORKERS", 0) or 0)
+
+
+def min_bytes() -> int:
+    return int(getattr(settings, "UPLOAD_PARALLEL_MIN_BYTES", 5 * 1024 * 1024))
+
+
+def max_memory_bytes() -> int:
+    return int(getattr(settings, "UPLOAD_PARALLEL_MAX_MEMORY_MB", 1024)) * 1024 * 1024
+
+
+class ParsedColumns:
+    """Linhas já convertidas, em colunas compactas (serializa barato entre processos)."""
+
+    def __init__(self):
+        self.rows = array("L")
+        self.cids: List[str] = []
+        self.dates = array("l")  # date.toordinal(); 0 = sem data
+        self.values = array("d")  # nan = sem valor
+        # segundos gastos em _build_row neste processo e pico de RSS dele (perfil do import)
+        self.convert_seconds = 0.0
+        # CPU da tarefa inteira no processo (scripts/bench_xlsx_reader.py)
+        self.task_seconds = 0.0
+        self.peak_rss_mb: Optional[float] = None
+
+    def append(self, row: Dict) -> None:
+        d = row["date"]
+        v = row["value"]
+        self.rows.append(row["excel_row"])
+        self.cids.append(row["colaborador_id"])
+        self.dates.append(d.toordinal() if d else 0)
+        self.values.append(math.nan if v is None else v)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for excel_row, cid, d, v in zip(self.rows, self.cids, self.dates, self.values):
+            yield {
+                "excel_row": excel_row,
+                "colaborador_id": cid,
+                "date": date.fromordinal(d) if d else None,
+                "value": None if v != v else v,
+            }
+
+
+class ParsedRows:
+    """Junta as partes na ordem das tarefas; len()/iter como a lista de linhas."""
+
+    def __init__(self, parts: List[ParsedColumns]):
+        self.parts = parts
+
+    def __len__(self) -> int:
+        return sum(len(p) for p in self.parts)
+
+    @property
+    def convert_seconds(self) -> float:
+        return sum(p.convert_seconds for p in self.parts)
+
+    @property
+    def task_seconds(self) -> List[float]:
+        return [p.task_seconds for p in self.parts]
+
+    @property
+    def peak_rss_mb(self) -> Optional[float]:
+        return max((p.peak_rss_mb for p in self.parts if p.peak_rss_mb is not None), default=None)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return chain.from_iterable(self.parts)
+
+
+# ---------- tarefas (rodam nos processos do pool) ----------
+
+def _init_worker() -> None:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "visibilidade.settings")
+    import django
+    django.setup()
+
+
+def _parse_xlsx_range(
+    path: str, xml_path: str, start: int, end: int, first: bool,
+    idx_map: Dict[str, int], is_time: bool,
+):
+    from .profiling import convert_clock, process_peak_rss_mb
+    from .services import _build_row
+
+    started = time.process_time()
+    ci, di, vi = idx_map["colaborador_id"], idx_map["data"], idx_map["valor"]
+    out = ParsedColumns()
+    clock = [0.0]
+    token = convert_clock.set(clock)
+    try:
+        # o zip só é aberto pelos estilos e strings compartilhadas; as linhas vêm do XML extraído
+        with XlsxSheetReader(path) as reader:
+            rows = reader.iter_rows_in_range(
+                xml_path, start, end, {ci, di, vi}, min_row=2, fill_from_min_row=first,
+            )
+            for r_idx, values in rows:
+                get = values.get
+                out.append(_build_row(r_idx, get(ci), get(di), get(vi), None, is_time))
+    finally:
+        convert_clock.reset(token)
+    out.convert_seconds = clock[0]
+    out.task_seconds = time.process_time() - started
+    # o pool é criado para um import só: o pico do processo é deste import
+    out.peak_rss_mb = process_peak_rss_mb()
+    return out
+
+
+def _gap_rows(first: int, last: int, is_time: bool) -> ParsedColumns:
+    """Linhas vazias entre duas faixas (o leitor sequencial também as entrega)."""
+    from .services import _build_row
+
+    out = ParsedColumns()
+    for r_idx in range(first, last):
+        out.append(_build_row(r_idx, None, None, None, None, is_time))
+    return out
+
+
+def _parse_csv_range(
+    path: str, start: int, end: int, first_row: int,
+    encoding: str, delimiter: str, idx_map: Dict[str, int], is_time: bool,
+):
+    import io
+
+    from .profiling import convert_clock, process_peak_rss_mb
+    from .services import _build_row
+
+    started = time.process_time()
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        data = fh.read(end - start)
+    text = io.StringIO(data.decode(encoding.replace("-sig", ""), errors="replace"), newline="")
+    ci, di, vi = idx_map["colaborador_id"], idx_map["data"], idx_map["valor"]
+    out = ParsedColumns()
+    clock = [0.0]
+    token = convert_clock.set(clock)
+    try:
+        for r_idx, row in enumerate(csv.reader(text, delimiter=delimiter), start=first_row):
+            n = len(row)
+            out.append(_build_row(
+                r_idx,
+                row[ci] if n > ci else None,
+                row[di] if n > di else None,
+                row[vi] if n > vi else None,
+                None,
+                is_time,
+            ))
+    finally:
+        convert_clock.reset(token)
+    out.convert_seconds = clock[0]
+    out.task_seconds = time.process_time() - started
+    # o pool é criado para um import só: o pico do processo é deste import
+    out.peak_rss_mb = process_peak_rss_mb()
+    return out
+
+
+# ---------- orquestração ----------
+
+def _count(mm, sub: bytes, start: int, end: int, block: int = 8 * 1024 * 1024) -> int:
+    """mmap não tem count(): conta em blocos para não copiar a faixa inteira."""
+    total = 0
+    for a in range(start, end, block):
+        total += mm[a:min(a + block, end)].count(sub)
+    return total
+
+
+def _pool_size(n_tasks: int, largest_task_bytes: int) -> int:
+    by_memory = max(1, max_memory_bytes() // max(largest_task_bytes, 1))
+    return max(1, min(workers(), n_tasks, by_memory))
+
+
+def _executor(size: int) -> ProcessPoolExecutor:
+    method = getattr(settings, "UPLOAD_PARALLEL_START_METHOD", "spawn")
+    return ProcessPoolExecutor(
+        max_workers=size,
+        mp_context=multiprocessing.get_context(method),
+        initializer=_init_worker,
+    )
+
+
+def read_rows(path: str, kind: str, is_time: bool) -> Optional[Tuple[object, Dict]]:
+    """
+    Lê o arquivo em paralelo. Devolve (linhas, erro_de_cabeçalho) como os
+    leitores sequenciais, ou None quando não há o que dividir (o chamador
+    segue no modo sequencial).
+    """
+    if kind == "csv":
+        return _read_csv(path, is_time)
+    return _read_xlsx(path, is_time)
+
+
+def _read_xlsx(path: str, is_time: bool):
+    from .services import _map_header_indices
+
+    tmp = None
+    try:
+        with XlsxSheetReader(path) as reader:
+            sheet = reader.active_sheet()
+            idx_map, header_err = _map_header_indices(reader.header(sheet))
+            if header_err:
+                return [], header_err
+            tmp = tempfile.NamedTemporaryFile(
+                prefix="xlsx-", suffix=".xml", dir=getattr(settings, "FILE_UPLOAD_TEMP_DIR", None) or None,
+                delete=False,
+            )
+            with tmp:
+                size = reader.extract_sheet(sheet, tmp)
+    except (XlsxReaderError, KeyError):
+        if tmp is not None:
+            os.unlink(tmp.name)
+        return None
+
+    try:
+        # faixas do tamanho que cabe no limite de memória, ao menos uma por processo
+        n_ranges = max(workers(), math.ceil(size / max(max_memory_bytes() // workers(), 1)))
+        with open(tmp.name, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            cuts = row_boundaries(mm, n_ranges)
+        ranges = list(zip(cuts, cuts[1:]))
+        if len(ranges) < 2:
+            return None
+
+        with _executor(_pool_size(len(ranges), max(b - a for a, b in ranges))) as pool:
+            futures = [
+                pool.submit(_parse_xlsx_range, path, tmp.name, a, b, i == 0, idx_map, is_time)
+                for i, (a, b) in enumerate(ranges)
+            ]
+            try:
+                parsed = [f.result() for f in futures]
+            except XlsxReaderError:
+                # o leitor sequencial cai no openpyxl
+                return None
+    finally:
+        os.unlink(tmp.name)
+
+    # linhas ausentes do XML entre uma faixa e a próxima
+    parts: List[ParsedColumns] = []
+    last = 1  # cabeçalho
+    for part in parsed:
+        if not len(part):
+            continue
+        if part.rows[0] > last + 1:
+            parts.append(_gap_rows(last + 1, part.rows[0], is_time))
+        parts.append(part)
+        last = part.rows[-1]
+    return ParsedRows(parts), {}
+
+
+def _read_csv(path: str, is_time: bool):
+    from .services import _map_header_indices, _sniff_csv
+
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        encoding, delimiter = _sniff_csv(mm[: 64 * 1024])
+        header_end = mm.find(b"\n") + 1
+        if header_end <= 0:
+            return None
+        header = next(csv.reader([mm[:header_end].decode(encoding, errors="replace")], delimiter=delimiter), [])
+        idx_map, header_err = _map_header_indices(header)
+        if header_err:
+            return [], header_err
+
+        # faixas do tamanho que cabe no limite de memória, ao menos uma por processo
+        n_ranges = max(workers(), math.ceil(file_size / max(max_memory_bytes() // workers(), 1)))
+        step = max((file_size - header_end) // n_ranges, 1)
+        bounds = [header_end]
+        while bounds[-1] < file_size:
+            nxt = mm.find(b"\n", min(bounds[-1] + step, file_size - 1))
+            bounds.append(file_size if nxt < 0 else nxt + 1)
+        ranges = list(zip(bounds, bounds[1:]))
+        if len(ranges) < 2:
+            return None
+
+        # número da linha inicial de cada faixa; aspas desbalanceadas = registro
+        # quebrado entre faixas, então não dá para dividir
+        first_rows = []
+        row = 2
+        for start, end in ranges:
+            if _count(mm, b'"', start, end) % 2:
+                return None
+            first_rows.append(row)
+            row += _count(mm, b"\n", start, end)
+
+    size = _pool_size(len(ranges), max(e - s for s, e in ranges))
+    with _executor(size) as pool:
+        futures = [
+            pool.submit(_parse_csv_range, path, s, e, first, encoding, delimiter, idx_map, is_time)
+            for (s, e), first in zip(ranges, first_rows)
+        ]
+        parts = [f.result() for f in futures]
+    return ParsedRows(parts), {}
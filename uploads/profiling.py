@@ -0,0 +1,245 @@
+"""
+Perfil do import por etapa, gravado em UploadBatch.profile.
+
+Cada import mede, sem profiler externo:
+
+- tempo, linhas e consultas SQL de cada etapa (STAGES), e linhas/s;
+- total de consultas (execute_wrapper na conexão default);
+- duração da transação de gravação (do BEGIN ao COMMIT);
+- memória do import: RSS do processo (/proc/self/statm) amostrado no início
+  e no fim de cada etapa; grava o valor no início, o maior amostrado e o
+  crescimento entre os dois. Não é o ru_maxrss do worker, que guarda o pico
+  da vida inteira do processo e repetiria o de um import grande antigo em
+  todos os lotes seguintes. Memória que o processo já tinha e reaproveita
+  não conta como crescimento;
+- na leitura paralela, o maior pico entre os processos do pool (criado para
+  o import, então o pico deles é deste import).
+
+"convert" é a conversão de data/valor (_build_row), medida dentro da
+leitura; "parse" é o resto da leitura (openpyxl / leitor rápido / csv).
+Na leitura paralela o tempo de conversão é a soma dos processos, não o
+tempo de relógio. O histórico agregado fica no admin de lotes
+(UploadBatchAdmin.profile_history_view).
+"""
+from __future__ import annotations
+
+import os
+import sys
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional
+
+from django.db import connections
+
+try:  # não existe no Windows
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+STAGES = [
+    ("parse", "Leitura do arquivo"),
+    ("convert", "Conversão de data/valor"),
+    ("lookup", "Busca de colaboradores"),
+    ("upsert", "Gravação (upsert)"),
+    ("evaluate", "Avaliação de metas"),
+    ("month_stats", "Contadores mensais"),
+    ("errors", "Gravação de erros"),
+]
+STAGE_LABELS = dict(STAGES)
+
+# segundos de conversão acumulados por _build_row enquanto há uma leitura medida
+convert_clock: ContextVar[Optional[List[float]]] = ContextVar("import_convert_clock", default=None)
+
+
+try:
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):  # pragma: no cover
+    PAGE_SIZE = 4096
+MB = 1024 * 1024
+
+
+def rss_mb() -> Optional[float]:
+    """RSS atual do processo em MB (None fora do Linux)."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as fh:
+            pages = int(fh.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * PAGE_SIZE / MB
+
+
+def process_peak_rss_mb() -> Optional[float]:
+    """Pico de RSS da vida inteira do processo (só faz sentido nos processos do pool de leitura)."""
+    if resource is None:
+        return None
+    # Linux: KB; macOS: bytes
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / MB
+
+
+class ImportProfile:
+    def __init__(self):
+        self._started = perf_counter()
+        self._current: Optional[str] = None
+        # etapa -> [segundos, linhas, consultas]
+        self.stages: Dict[str, List] = {}
+        self.queries = 0
+        self.transaction_seconds = 0.0
+        self.reader = ""
+        self.file_bytes: Optional[int] = None
+        self.rss_start = rss_mb()
+        self.rss_peak = self.rss_start
+        # maior pico entre os processos da leitura paralela
+        self.workers_peak_rss: Optional[float] = None
+
+    def sample_memory(self) -> None:
+        rss = rss_mb()
+        if rss is not None and (self.rss_peak is None or rss > self.rss_peak):
+            self.rss_peak = rss
+
+    def _entry(self, name: str) -> List:
+        return self.stages.setdefault(name, [0.0, 0, 0])
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0):
+        """Mede um trecho; chamadas repetidas (um lote de linhas por vez) acumulam."""
+        entry = self._entry(name)
+        previous, self._current = self._current, name
+        self.sample_memory()
+        t0 = perf_counter()
+        try:
+            yield entry
+        finally:
+            entry[0] += perf_counter() - t0
+            entry[1] += rows
+            self._current = previous
+            self.sample_memory()
+
+    def add(self, name: str, seconds: float, rows: int = 0) -> None:
+        entry = self._entry(name)
+        entry[0] += seconds
+        entry[1] += rows
+
+    @contextmanager
+    def reading(self):
+        """Etapa de leitura: separa a conversão (convert_clock) do parse."""
+        clock = [0.0]
+        token = convert_clock.set(clock)
+        try:
+            with self.stage("parse") as entry:
+                yield
+        finally:
+            convert_clock.reset(token)
+        # a conversão roda dentro da leitura: sai do tempo de parse
+        entry[0] -= clock[0]
+        self.add("convert", clock[0])
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        if self._current:
+            self.stages[self._current][2] += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def track_queries(self, using: str = "default"):
+        with connections[using].execute_wrapper(self._count_query):
+            yield
+
+    def as_dict(self, rows_total: int) -> Dict:
+        # leitura e conversão passam por todas as linhas do arquivo
+        for name in ("parse", "convert"):
+            if name in self.stages and not self.stages[name][1]:
+                self.stages[name][1] = rows_total
+        stages = []
+        for name, _ in STAGES:
+            if name not in self.stages:
+                continue
+            seconds, rows, queries = self.stages[name]
+            seconds = max(seconds, 0.0)
+            stages.append({
+                "name": name,
+                "seconds": round(seconds, 4),
+                "rows": rows,
+                "rows_per_sec": round(rows / seconds) if seconds > 0 and rows else None,
+                "queries": queries,
+            })
+        total = perf_counter() - self._started
+        return {
+            "total_seconds": round(total, 4),
+            "rows_per_sec": round(rows_total / total) if total > 0 and rows_total else None,
+            "queries": self.queries,
+            "transaction_seconds": round(self.transaction_seconds, 4),
+            "rss_start_mb": _mb(self.rss_start),
+            "rss_peak_mb": _mb(self.rss_peak),
+            "rss_growth_mb": _mb(self.rss_peak - self.rss_start) if self.rss_start is not None else None,
+            "workers_peak_rss_mb": _mb(self.workers_peak_rss),
+            "reader": self.reader,
+            "file_bytes": self.file_bytes,
+            "stages": stages,
+        }
+
+
+def _mb(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 1)
+
+
+# ---------- histórico agregado ----------
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def size_bucket(rows: int) -> str:
+    for limit, label in ((1_000, "< 1 mil"), (10_000, "1–10 mil"), (100_000, "10–100 mil"), (1_000_000, "100 mil–1 mi")):
+        if rows < limit:
+            return label
+    return "≥ 1 mi"
+
+
+def aggregate(profiles: Iterable[Dict], key) -> List[Dict]:
+    """
+    Agrupa perfis (dicts com "profile" e os campos usados por `key`) e
+    devolve por grupo: lotes, mediana/p95 do tempo total, linhas/s
+    medianas e, por etapa, a mediana de segundos e de linhas/s.
+    """
+    groups: Dict = defaultdict(list)
+    for item in profiles:
+        if item.get("profile", {}).get("stages"):
+            groups[key(item)].append(item["profile"])
+
+    out = []
+    # grupos na ordem em que aparecem (lotes do mais recente para o mais antigo)
+    for group, items in groups.items():
+        stage_seconds: Dict[str, List[float]] = defaultdict(list)
+        stage_rate: Dict[str, List[float]] = defaultdict(list)
+        for p in items:
+            for s in p["stages"]:
+                stage_seconds[s["name"]].append(s["seconds"])
+                if s["rows_per_sec"]:
+                    stage_rate[s["name"]].append(s["rows_per_sec"])
+        totals = [p["total_seconds"] for p in items]
+        out.append({
+            "group": group,
+            "batches": len(items),
+            "total_p50": _percentile(totals, 0.5),
+            "total_p95": _percentile(totals, 0.95),
+            "rows_per_sec_p50": _percentile([p["rows_per_sec"] for p in items if p.get("rows_per_sec")], 0.5),
+            "queries_p50": _percentile([p["queries"] for p in items], 0.5),
+            "transaction_p50": _percentile([p["transaction_seconds"] for p in items], 0.5),
+            "rss_growth_max": max((p["rss_growth_mb"] for p in items if p.get("rss_growth_mb") is not None), default=None),
+            "stages": [
+                {
+                    "name": name,
+                    "label": label,
+                    "seconds_p50": _percentile(stage_seconds[name], 0.5),
+                    "rows_per_sec_p50": _percentile(stage_rate[name], 0.5),
+                }
+                for name, label in STAGES
+            ],
+        })
+    return out
@@ -1,16 +1,40 @@
 from __future__ import annotations
 
+import csv
+import io
+import logging
+import math
+import os
+import threading
+from collections import Counter
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
-from datetime import datetime, date, time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from datetime import datetime, date, time, timedelta
+from time import perf_counter
 
-from django.db import transaction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
 
 from openpyxl import load_workbook
 
 from accounts.models import Collaborator
 from metrics.models import MetricType, MetricRecord
-from .models import UploadBatch
+from metrics.partitions import archived_before
+from metrics.snapshots import schedule_refresh
+from metrics.targets import evaluate_records, lock_metric, refresh_month_stats
+from metrics.versions import bump_data_version
+from visibilidade.db_router import stick_to_primary
+from . import parallel
+from .models import UploadBatch, UploadError
+from .profiling import ImportProfile, convert_clock
+from .xlsx_reader import XlsxReaderError, XlsxSheetReader
+
+logger = logging.getLogger(__name__)
+
+# callback de progresso da leitura: recebe as linhas lidas até agora
+Progress = Optional[Callable[[int], None]]
 
 
 @dataclass
@@ -19,6 +43,33 @@ class RowResult:
     reason: str = ""
 
 
+class ErrorCollector:
+    """
+    Acumula erros por linha agrupando linhas contíguas com o mesmo motivo
+    em uma única faixa (run-length). Gravado em lote com bulk_create.
+    """
+
+    def __init__(self):
+        self.runs: List[List] = []  # [first_row, last_row, reason]
+        self.count = 0
+
+    def add(self, row: int, reason: str) -> None:
+        self.count += 1
+        reason = reason[:255]
+        if self.runs:
+            last = self.runs[-1]
+            if last[2] == reason and last[1] + 1 == row:
+                last[1] = row
+                return
+        self.runs.append([row, row, reason])
+
+    def save(self, batch: UploadBatch) -> None:
+        UploadError.objects.bulk_create(
+            (UploadError(batch=batch, first_row=a, last_row=b, reason=r) for a, b, r in self.runs),
+            batch_size=1000,
+        )
+
+
 # ---------- utilidades seguras ----------
 
 def _norm(s) -> str:
@@ -81,7 +132,11 @@ def _looks_like_time_metric(metric: MetricType) -> bool:
     return any(h in code for h in hints) or any(h in name for h in hints) or any(u in unit for u in unit_hints)
 
 
-def _parse_value(metric: MetricType, value) -> float | None:
+def _finite(x: float) -> float | None:
+    return x if math.isfinite(x) else None
+
+
+def _parse_value(metric: MetricType, value, is_time: bool | None = None) -> float | None:
     """
     Converte o 'valor' para float.
     - Para métricas de tempo, converte para MINUTOS:
@@ -91,11 +146,15 @@ def _parse_value(metric: MetricType, value) -> float | None:
     - Para demais métricas:
       * número -> float
       * string com vírgula -> float
+    NaN e infinito (célula numérica ou texto 'nan'/'inf') viram None: não
+    são medições e o Excel recusa esses valores na exportação.
     """
     if value is None or value == "":
         return None
 
-    if _looks_like_time_metric(metric):
+    if is_time is None:
+        is_time = _looks_like_time_metric(metric)
+    if is_time:
         # datetime.time
         if isinstance(value, time):
             return value.hour * 60 + value.minute + value.second / 60.0
@@ -109,7 +168,7 @@ def _parse_value(metric: MetricType, value) -> float | None:
             if 0.0 <= x < 1.0:
                 return _excel_fraction_day_to_minutes(x)
             # se já veio em minutos (número grande), mantém
-            return x
+            return _finite(x)
         # string 'HH:MM' / 'HH:MM:SS'
         if isinstance(value, str):
             s = value.strip()
@@ -119,19 +178,19 @@ def _parse_value(metric: MetricType, value) -> float | None:
             # tenta número com vírgula/pontos
             s2 = s.replace(" ", "").replace(".", "").replace(",", ".")
             try:
-                return float(s2)
+                return _finite(float(s2))
             except ValueError:
                 return None
         return None
 
     # Métrica comum (não-tempo)
     if isinstance(value, (int, float)):
-        return float(value)
+        return _finite(float(value))
     if isinstance(value, str):
         s = value.strip().replace(" ", "")
         s = s.replace(".", "").replace(",", ".")
         try:
-            return float(s)
+            return _finite(float(s))
         except ValueError:
             return None
     return None
@@ -169,7 +228,54 @@ def _map_header_indices(header_cells) -> Tuple[Dict[str, int], Dict]:
     return idx_map, {}
 
 
-def _read_rows_from_workbook(uploaded_file, metric: MetricType) -> Tuple[List[Dict], Dict]:
+def _build_row(r_idx: int, cid_raw, d_raw, v_raw, metric: MetricType, is_time: bool) -> Dict:
+    clock = convert_clock.get()
+    if clock is None:
+        return _convert_row(r_idx, cid_raw, d_raw, v_raw, metric, is_time)
+    t0 = perf_counter()
+    row = _convert_row(r_idx, cid_raw, d_raw, v_raw, metric, is_time)
+    clock[0] += perf_counter() - t0
+    return row
+
+
+def _convert_row(r_idx: int, cid_raw, d_raw, v_raw, metric: MetricType, is_time: bool) -> Dict:
+    try:
+        return {
+            "excel_row": r_idx,
+            "colaborador_id": (str(cid_raw).strip() if cid_raw is not None else ""),
+            "date": _parse_date(d_raw),
+            "value": _parse_value(metric, v_raw, is_time),
+        }
+    except Exception:
+        return {
+            "excel_row": r_idx,
+            "colaborador_id": "",
+            "date": None,
+            "value": None,
+        }
+
+
+def _read_rows_fast(uploaded_file, metric: MetricType, progress: Progress = None) -> Tuple[List[Dict], Dict]:
+    """Leitura via XlsxSheetReader (só as 3 colunas mapeadas). Levanta XlsxReaderError."""
+    uploaded_file.seek(0)
+    with XlsxSheetReader(uploaded_file) as reader:
+        sheet = reader.active_sheet()
+        idx_map, header_err = _map_header_indices(reader.header(sheet))
+        if header_err:
+            return [], header_err
+
+        ci, di, vi = idx_map["colaborador_id"], idx_map["data"], idx_map["valor"]
+        is_time = _looks_like_time_metric(metric)
+        rows: List[Dict] = []
+        for r_idx, values in reader.iter_rows(sheet, {ci, di, vi}, min_row=2):
+            get = values.get
+            rows.append(_build_row(r_idx, get(ci), get(di), get(vi), metric, is_time))
+            if progress and not len(rows) % READ_PROGRESS_ROWS:
+                progress(len(rows))
+    return rows, {}
+
+
+def _read_rows_openpyxl(uploaded_file, metric: MetricType, progress: Progress = None) -> Tuple[List[Dict], Dict]:
     uploaded_file.seek(0)
     wb = load_workbook(uploaded_file, data_only=True, read_only=True)
     ws = wb.active  # primeira aba
@@ -179,95 +285,643 @@ def _read_rows_from_workbook(uploaded_file, metric: MetricType) -> Tuple[List[Di
     if header_err:
         return [], header_err
 
+    ci, di, vi = idx_map["colaborador_id"], idx_map["data"], idx_map["valor"]
+    is_time = _looks_like_time_metric(metric)
     rows: List[Dict] = []
     for r_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        try:
-            cid_raw = row[idx_map["colaborador_id"]] if len(row) > idx_map["colaborador_id"] else None
-            d_raw = row[idx_map["data"]] if len(row) > idx_map["data"] else None
-            v_raw = row[idx_map["valor"]] if len(row) > idx_map["valor"] else None
-
-            d = _parse_date(d_raw)
-            v = _parse_value(metric, v_raw)
-
-            rows.append({
-                "excel_row": r_idx,
-                "colaborador_id": (str(cid_raw).strip() if cid_raw is not None else ""),
-                "date": d,
-                "value": v,
-            })
-        except Exception:
-            rows.append({
-                "excel_row": r_idx,
-                "colaborador_id": "",
-                "date": None,
-                "value": None,
-            })
+        n = len(row)
+        rows.append(_build_row(
+            r_idx,
+            row[ci] if n > ci else None,
+            row[di] if n > di else None,
+            row[vi] if n > vi else None,
+            metric,
+            is_time,
+        ))
+        if progress and not len(rows) % READ_PROGRESS_ROWS:
+            progress(len(rows))
 
     return rows, {}
-# ---------- import principal ----------
 
-def import_xlsx(metric: MetricType, uploaded_file, user) -> Tuple[bool, Dict]:
+
+def _read_rows_from_workbook(
+    uploaded_file, metric: MetricType, profile: ImportProfile | None = None, progress: Progress = None,
+) -> Tuple[List[Dict], Dict]:
+    """Leitor rápido primeiro; arquivos que ele não entende vão para o openpyxl."""
+    try:
+        result = _read_rows_fast(uploaded_file, metric, progress)
+        reader = "xlsx"
+    except XlsxReaderError:
+        result = _read_rows_openpyxl(uploaded_file, metric, progress)
+        reader = "openpyxl"
+    if profile:
+        profile.reader = reader
+    return result
+
+
+def _sniff_csv(sample: bytes) -> Tuple[str, str]:
+    """(encoding, delimitador) a partir do início do arquivo."""
+    try:
+        sample.decode("utf-8")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as exc:
+        # corte no meio de um caractere multibyte no fim da amostra ainda é UTF-8
+        encoding = "utf-8-sig" if exc.start >= len(sample) - 3 else "latin-1"
+    first_line = sample.split(b"\n", 1)[0]
+    delimiter = max((";", ",", "\t"), key=lambda d: first_line.count(d.encode()))
+    return encoding, delimiter
+
+
+def _read_rows_from_csv(uploaded_file, metric: MetricType, progress: Progress = None) -> Tuple[List[Dict], Dict]:
+    """CSV com cabeçalho (separador ; , ou TAB). Linha 1 = cabeçalho, como no Excel."""
+    uploaded_file.seek(0)
+    encoding, delimiter = _sniff_csv(uploaded_file.read(64 * 1024))
+    uploaded_file.seek(0)
+    text = io.TextIOWrapper(uploaded_file, encoding=encoding, newline="", errors="replace")
+    try:
+        reader = csv.reader(text, delimiter=delimiter)
+        header_cells = next(reader, [])
+        idx_map, header_err = _map_header_indices(header_cells)
+        if header_err:
+            return [], header_err
+
+        ci, di, vi = idx_map["colaborador_id"], idx_map["data"], idx_map["valor"]
+        is_time = _looks_like_time_metric(metric)
+        rows: List[Dict] = []
+        for r_idx, row in enumerate(reader, start=2):
+            n = len(row)
+            rows.append(_build_row(
+                r_idx,
+                row[ci] if n > ci else None,
+                row[di] if n > di else None,
+                row[vi] if n > vi else None,
+                metric,
+                is_time,
+            ))
+            if progress and not len(rows) % READ_PROGRESS_ROWS:
+                progress(len(rows))
+    finally:
+        # não fecha o arquivo do upload junto com o wrapper
+        text.detach()
+    return rows, {}
+
+
+def _local_path(uploaded_file) -> str | None:
+    """Caminho em disco do upload, quando existe (TemporaryUploadedFile, staging)."""
+    getter = getattr(uploaded_file, "temporary_file_path", None)
+    if getter:
+        return getter()
+    return None
+
+
+def _read_rows(uploaded_file, metric: MetricType, profile: ImportProfile | None = None, progress: Progress = None):
     """
-    Importa uma planilha Excel (.xlsx ou .xls) criando/atualizando registros.
-    Upsert por (colaborador, métrica, data). Salva FK do lote em source_batch_id.
+    Escolhe o leitor pelo tipo do arquivo. Com UPLOAD_PARALLEL_WORKERS > 1,
+    arquivos grandes em disco são lidos pelo pool de processos (ver parallel.py).
+    Os leitores sequenciais chamam progress(linhas) a cada READ_PROGRESS_ROWS.
     """
-    rows, header_err = _read_rows_from_workbook(uploaded_file, metric)
+    name = (getattr(uploaded_file, "name", "") or "").lower()
+    kind = "csv" if name.endswith(".csv") else "xlsx"
+
+    path = _local_path(uploaded_file)
+    if profile:
+        profile.reader = kind
+        profile.file_bytes = os.path.getsize(path) if path else getattr(uploaded_file, "size", None)
+    if path and parallel.enabled() and os.path.getsize(path) >= parallel.min_bytes():
+        result = parallel.read_rows(path, kind, _looks_like_time_metric(metric))
+        if result is not None:
+            if profile:
+                profile.reader = f"{kind}-paralelo"
+                # conversão medida nos processos do pool (soma, não tempo de relógio)
+                profile.add("convert", getattr(result[0], "convert_seconds", 0.0))
+                profile.workers_peak_rss = getattr(result[0], "peak_rss_mb", None)
+            return result
+
+    if kind == "csv":
+        return _read_rows_from_csv(uploaded_file, metric, progress)
+    return _read_rows_from_workbook(uploaded_file, metric, profile, progress)
+
+
+# ---------- pré-visualização (dry-run) ----------
+
+# linhas avaliadas na pré-visualização / bytes lidos do início de um CSV
+PREVIEW_SAMPLE_ROWS = 1000
+PREVIEW_SAMPLE_BYTES = 1024 * 1024
+
+# (linhas, erro_de_cabeçalho, cabeçalho, total de linhas, total exato?)
+Sample = Tuple[List[Dict], Dict, List, Optional[int], bool]
+
+
+def _sample_csv(uploaded_file, metric: MetricType, limit: int) -> Sample:
+    """Lê só o primeiro MB; o total de linhas é estimado pela média de bytes por linha."""
+    uploaded_file.seek(0)
+    raw = uploaded_file.read(PREVIEW_SAMPLE_BYTES)
+    size = getattr(uploaded_file, "size", None) or len(raw)
+    complete = len(raw) >= size
+    if not complete:
+        # corta na última quebra de linha (nem linha nem caractere pela metade)
+        raw = raw[: raw.rfind(b"\n") + 1] or raw
+
+    encoding, delimiter = _sniff_csv(raw[: 64 * 1024])
+    reader = csv.reader(io.StringIO(raw.decode(encoding, errors="replace"), newline=""), delimiter=delimiter)
+    header = next(reader, [])
+    idx_map, header_err = _map_header_indices(header)
     if header_err:
-        return False, header_err
+        return [], header_err, header, None, False
 
-    created = 0
-    updated = 0
-    errors: List[Dict] = []
+    ci, di, vi = idx_map["colaborador_id"], idx_map["data"], idx_map["valor"]
+    is_time = _looks_like_time_metric(metric)
+    rows: List[Dict] = []
+    n_lines = 0
+    for r_idx, row in enumerate(reader, start=2):
+        n_lines += 1
+        if len(rows) < limit:
+            n = len(row)
+            rows.append(_build_row(
+                r_idx,
+                row[ci] if n > ci else None,
+                row[di] if n > di else None,
+                row[vi] if n > vi else None,
+                metric,
+                is_time,
+            ))
+    if complete or not n_lines:
+        return rows, {}, header, n_lines, complete
+
+    header_bytes = raw.find(b"\n") + 1
+    per_line = (len(raw) - header_bytes) / n_lines
+    return rows, {}, header, round((size - header_bytes) / per_line), False
+
+
+def _sample_workbook(uploaded_file, metric: MetricType, limit: int) -> Sample:
+    """Primeiras linhas da aba ativa; o total vem do <dimension> da aba."""
+    uploaded_file.seek(0)
+    is_time = _looks_like_time_metric(metric)
+    try:
+        with XlsxSheetReader(uploaded_file) as reader:
+            sheet = reader.active_sheet()
+            header = reader.header(sheet)
+            idx_map, header_err = _map_header_indices(header)
+            if header_err:
+                return [], header_err, header, None, False
+            ci, di, vi = idx_map["colaborador_id"], idx_map["data"], idx_map["valor"]
+            rows = [
+                _build_row(r_idx, values.get(ci), values.get(di), values.get(vi), metric, is_time)
+                for r_idx, values in reader.iter_rows(sheet, {ci, di, vi}, min_row=2, max_row=limit + 1)
+            ]
+            last_row = reader.dimension_rows(sheet)
+    except XlsxReaderError:
+        uploaded_file.seek(0)
+        wb = load_workbook(uploaded_file, data_only=True, read_only=True)
+        ws = wb.active
+        header = list(next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ()))
+        idx_map, header_err = _map_header_indices(header)
+        if header_err:
+            return [], header_err, header, None, False
+        ci, di, vi = idx_map["colaborador_id"], idx_map["data"], idx_map["valor"]
+        rows = []
+        for r_idx, row in enumerate(ws.iter_rows(min_row=2, max_row=limit + 1, values_only=True), start=2):
+            n = len(row)
+            rows.append(_build_row(
+                r_idx,
+                row[ci] if n > ci else None,
+                row[di] if n > di else None,
+                row[vi] if n > vi else None,
+                metric,
+                is_time,
+            ))
+        last_row = ws.max_row
+
+    if len(rows) < limit:
+        return rows, {}, header, len(rows), True
+    return rows, {}, header, (last_row - 1 if last_row else None), False
+
+
+def preview_import(metric: MetricType, uploaded_file, limit: int = PREVIEW_SAMPLE_ROWS) -> Dict:
+    """
+    Dry-run do import: valida o cabeçalho e avalia só as primeiras `limit`
+    linhas (colaboradores resolvidos em uma consulta), sem criar lote nem
+    gravar nada. Os totais projetados extrapolam a amostra para o número
+    de linhas do arquivo — é uma estimativa, o início do arquivo pode não
+    representar o resto.
+    """
+    name = (getattr(uploaded_file, "name", "") or "").lower()
+    sample = _sample_csv if name.endswith(".csv") else _sample_workbook
+    rows, header_err, header, total, exact = sample(uploaded_file, metric, limit)
+    if header_err:
+        return {"ok": False, **header_err}
+
+    errors = ErrorCollector()
+    collab_ids: Dict[str, int | None] = {}
+    records, repeated, existing = _classify_chunk(metric, rows, errors, collab_ids)
+    created = sum(1 for key in records if key not in existing)
+    counts = {
+        "created": created,
+        "updated": len(records) - created + repeated,
+        "error_count": errors.count,
+    }
 
+    n = len(rows)
+    scale = total / n if (n and total and not exact) else 1.0
+    reasons: Counter = Counter()
+    for first, last, reason in errors.runs:
+        reasons[reason] += last - first + 1
+
+    return {
+        "ok": True,
+        "header": ["" if h is None else str(h) for h in header],
+        "rows_total": total,
+        "rows_total_exact": exact,
+        "sample_rows": n,
+        "sample": counts,
+        "projected": {k: round(v * scale) for k, v in counts.items()},
+        "error_reasons": [{"reason": r, "count": c} for r, c in reasons.most_common(10)],
+        "unknown_collaborators": sorted(cid for cid, pk in collab_ids.items() if pk is None)[:20],
+    }
+
+
+# ---------- import principal ----------
+
+def import_xlsx(metric: MetricType, uploaded_file, user) -> Tuple[bool, Dict]:
+    """
+    Importa uma planilha Excel (.xlsx ou .xls) ou CSV criando/atualizando registros.
+    Upsert por (colaborador, métrica, data). Salva FK do lote em source_batch_id.
+    O tempo de cada etapa fica em batch.profile (ver profiling.py).
+    Roda na hora; a tela de upload usa queue_import.
+    """
     batch = UploadBatch.objects.create(
         user=user,
         metric_type=metric,
         original_filename=getattr(uploaded_file, "name", "upload.xlsx"),
-        report={}
+        report={},
+        status="processing",
     )
+    return _run_batch(batch, uploaded_file)
 
-    with transaction.atomic():
-        for r in rows:
-            cid = (r.get("colaborador_id") or "").strip()
-            d: date | None = r.get("date")
-            v = r.get("value")
 
-            if not cid or not d or v is None:
-                errors.append({
-                    "row": r.get("excel_row"),
-                    "reason": "Linha incompleta (colaborador_id/data/valor)"
-                })
-                continue
+def _run_batch(batch: UploadBatch, uploaded_file) -> Tuple[bool, Dict]:
+    profile = ImportProfile()
+    with profile.track_queries():
+        return _import(batch, uploaded_file, profile)
 
-            try:
-                collab = Collaborator.objects.get(colaborador_id=cid)
-            except Collaborator.DoesNotExist:
-                errors.append({
-                    "row": r.get("excel_row"),
-                    "reason": f"colaborador_id '{cid}' não encontrado"
-                })
-                continue
-
-            # Upsert + FK do batch via _id
-            obj, was_created = MetricRecord.objects.update_or_create(
-                collaborator=collab,
-                metric_type=metric,
-                date=d,
-                defaults={
-                    "value": v,
-                    "source_batch_id": batch.id,  # <-- chave da correção de FK
-                },
+
+def _finish_failed(batch: UploadBatch, report: Dict, profile: ImportProfile) -> None:
+    batch.status = "failed"
+    batch.report = report
+    batch.profile = profile.as_dict(batch.rows_total)
+    batch.save(update_fields=["status", "report", "profile"])
+    cache.delete(progress_key(batch.id))
+
+
+def _import(batch: UploadBatch, uploaded_file, profile: ImportProfile) -> Tuple[bool, Dict]:
+    """Lê e grava o arquivo no lote já criado (status "processing"), com progresso no cache."""
+    metric = batch.metric_type
+    _set_progress(batch, 0, "read")
+    try:
+        with profile.reading():
+            rows, header_err = _read_rows(
+                uploaded_file, metric, profile, progress=lambda n: _set_progress(batch, n, "read"),
             )
-            created += int(was_created)
-            updated += int(not was_created)
+    except Exception as exc:
+        _finish_failed(batch, {"error": f"Erro ao ler o arquivo: {exc}"}, profile)
+        raise
+    if header_err:
+        _finish_failed(batch, {"error": header_err["error"], "found": header_err["found"]}, profile)
+        return False, {**header_err, "batch_id": batch.id}
+
+    # fora da transação da gravação: o total aparece para quem acompanha o lote
+    batch.rows_total = len(rows)
+    batch.save(update_fields=["rows_total"])
+    errors = ErrorCollector()
+
+    try:
+        created, updated = _upsert_rows(batch, metric, rows, errors, profile)
+    except Exception as exc:
+        _finish_failed(batch, {"error": f"Erro inesperado no import: {exc}"}, profile)
+        raise
 
+    batch.status = "imported"
+    batch.error_count = errors.count
     batch.report = {
         "imported": created + updated,
         "created": created,
         "updated": updated,
-        "errors": errors,
+        "error_count": errors.count,
     }
-    batch.save(update_fields=["report"])
+    batch.profile = profile.as_dict(batch.rows_total)
+    batch.save(update_fields=["status", "report", "error_count", "profile"])
+    cache.delete(progress_key(batch.id))
+    # a réplica ainda não tem o lote: leituras do dashboard no principal por um tempo
+    stick_to_primary()
+
+    ok = errors.count == 0
+    return ok, {**batch.report, "batch_id": batch.id}
+
+
+# ---------- import em segundo plano ----------
+
+def queue_import(metric: MetricType, user, filename: str, source) -> UploadBatch:
+    """
+    Cria o lote como pendente, guarda o arquivo no staging (UploadBatch.staging_path)
+    e importa depois do commit, numa thread (UPLOAD_IMPORT_SYNC: na hora).
+    `source` é o upload do formulário (copiado) ou o caminho de um arquivo
+    que já está no staging (movido, sem cópia). O lote volta na hora: a tela
+    acompanha por views.upload_status e run_pending_imports pega o que a
+    thread não chegou a importar.
+    """
+    os.makedirs(settings.UPLOAD_STAGING_DIR, exist_ok=True)
+    with transaction.atomic():
+        batch = UploadBatch.objects.create(
+            user=user,
+            metric_type=metric,
+            original_filename=(filename or "upload.xlsx")[:255],
+            report={},
+            status="pending",
+        )
+        path = batch.staging_path
+        try:
+            if isinstance(source, str):
+                os.replace(source, path)
+            else:
+                with open(path, "wb") as fh:
+                    for chunk in source.chunks():
+                        fh.write(chunk)
+        except BaseException:
+            _remove_staged(path)
+            raise
+        batch_id = batch.id
+        if getattr(settings, "UPLOAD_IMPORT_SYNC", False):
+            transaction.on_commit(lambda: run_import(batch_id))
+        else:
+            transaction.on_commit(
+                lambda: threading.Thread(target=_run_in_background, args=(batch_id,), daemon=True).start()
+            )
+    return batch
+
+
+def _remove_staged(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def run_import(batch_id: int) -> bool:
+    """
+    Importa um lote pendente a partir do arquivo no staging, que é apagado
+    no fim. Devolve False se o lote já não estava pendente (outro worker ou
+    o comando pegou antes).
+    """
+    from .staging import StagedFile
+
+    if not UploadBatch.objects.filter(pk=batch_id, status="pending").update(status="processing"):
+        return False
+    batch = UploadBatch.objects.select_related("metric_type").get(pk=batch_id)
+    path = batch.staging_path
+    try:
+        staged = StagedFile(path, batch.original_filename)
+    except FileNotFoundError:
+        _finish_failed(batch, {"error": "Arquivo do lote não encontrado no servidor; envie de novo."}, ImportProfile())
+        return True
+    try:
+        _run_batch(batch, staged)
+    finally:
+        staged.close()
+        _remove_staged(path)
+    return True
 
-    ok = len(errors) == 0
-    return ok, batch.report
+
+def _run_in_background(batch_id: int) -> None:
+    close_old_connections()
+    try:
+        run_import(batch_id)
+    except Exception:
+        # o lote já ficou como "failed" com o erro no relatório
+        logger.exception("import: falha no lote %s", batch_id)
+    finally:
+        close_old_connections()
+
+
+def drain_imports(older_than: timedelta | None = None) -> Tuple[int, int]:
+    """
+    Importa os lotes ainda pendentes (a thread não chegou a rodar, ex. o
+    worker reiniciou) e marca como falhos os que estão em processamento há
+    mais de PROGRESS_TIMEOUT sem progresso no cache: o processo morreu no
+    meio e a transação da gravação foi desfeita. Devolve (importados,
+    interrompidos).
+    """
+    now = timezone.now()
+    stale = UploadBatch.objects.filter(
+        status="processing", created_at__lt=now - timedelta(seconds=PROGRESS_TIMEOUT),
+    )
+    interrupted = 0
+    for batch in stale.iterator():
+        if cache.get(progress_key(batch.id)) is not None:
+            continue
+        _finish_failed(batch, {"error": "Import interrompido; envie o arquivo de novo."}, ImportProfile())
+        _remove_staged(batch.staging_path)
+        interrupted += 1
+
+    pending = UploadBatch.objects.filter(status="pending")
+    if older_than:
+        pending = pending.filter(created_at__lt=now - older_than)
+    imported = 0
+    for batch_id in list(pending.order_by("id").values_list("id", flat=True)):
+        try:
+            imported += run_import(batch_id)
+        except Exception:
+            logger.exception("import: falha no lote %s", batch_id)
+    return imported, interrupted
+
+
+# linhas por lote de escrita (uma consulta de colaboradores + um upsert por lote)
+WRITE_CHUNK_SIZE = 2000
+
+# progresso do lote em andamento, lido por views.upload_status. Fica no cache
+# e não no UploadBatch porque a gravação roda numa transação só: um UPDATE do
+# lote não apareceria para quem consulta até o COMMIT (e no SQLite uma segunda
+# conexão nem consegue gravar). Entre workers precisa de cache compartilhado
+# (ver metrics.W001).
+PROGRESS_TIMEOUT = 6 * 60 * 60
+
+
+# na leitura, progresso a cada tantas linhas lidas
+READ_PROGRESS_ROWS = 10_000
+
+
+def progress_key(batch_id: int) -> str:
+    return f"upload-progress:{batch_id}"
+
+
+def _set_progress(batch: UploadBatch, rows: int, stage: str) -> None:
+    cache.set(progress_key(batch.id), {"rows": rows, "stage": stage}, PROGRESS_TIMEOUT)
+
+
+def _upsert_rows(
+    batch: UploadBatch,
+    metric: MetricType,
+    rows: Iterable[Dict],
+    errors: ErrorCollector,
+    profile: ImportProfile | None = None,
+) -> Tuple[int, int]:
+    """
+    Grava as linhas válidas e os erros numa única transação.
+
+    As linhas são processadas em lotes: os colaborador_id do lote são
+    resolvidos numa consulta só e os registros vão num único
+    INSERT ... ON CONFLICT (colaborador, métrica, data) DO UPDATE. No fim, a
+    situação em relação à meta (target_status) e os contadores mensais
+    (MetricMonthStat) do intervalo de datas do arquivo são refeitos em lote.
+    O progresso (linhas lidas e etapa) vai para o cache a cada lote.
+    """
+    profile = profile or ImportProfile()
+    created = 0
+    updated = 0
+    collab_ids: Dict[str, int | None] = {}
+    first_date: date | None = None
+    last_date: date | None = None
+    processed = 0
+    started = perf_counter()
+    with transaction.atomic():
+        # imports e recálculos de metas da mesma métrica em fila (ver lock_metric)
+        lock_metric(metric.id)
+        chunk: List[Dict] = []
+        for r in rows:
+            chunk.append(r)
+            d = r.get("date")
+            if d:
+                if first_date is None or d < first_date:
+                    first_date = d
+                if last_date is None or d > last_date:
+                    last_date = d
+            if len(chunk) >= WRITE_CHUNK_SIZE:
+                c, u = _write_chunk(batch, metric, chunk, errors, collab_ids, profile)
+                created += c
+                updated += u
+                processed += len(chunk)
+                _set_progress(batch, processed, "upsert")
+                chunk = []
+        if chunk:
+            c, u = _write_chunk(batch, metric, chunk, errors, collab_ids, profile)
+            created += c
+            updated += u
+            processed += len(chunk)
+
+        # situação em relação à meta (vigente na data de cada registro) e
+        # contadores mensais, só no intervalo que o arquivo tocou
+        _set_progress(batch, processed, "evaluate")
+        if first_date:
+            with profile.stage("evaluate", created + updated):
+                evaluate_records(metric, first_date, last_date)
+            with profile.stage("month_stats", created + updated):
+                refresh_month_stats(metric.id, first_date, last_date)
+        with profile.stage("errors", len(errors.runs)):
+            errors.save(batch)
+        transaction.on_commit(bump_data_version)
+        if first_date:
+            # snapshot colunar: só o intervalo do lote (metrics/snapshots.py)
+            schedule_refresh(metric.id, first_date, last_date)
+    # do BEGIN ao COMMIT (inclui os on_commit)
+    profile.transaction_seconds += perf_counter() - started
+
+    return created, updated
+
+
+def _classify_chunk(
+    metric: MetricType,
+    chunk: List[Dict],
+    errors: ErrorCollector,
+    collab_ids: Dict[str, int | None],
+) -> Tuple[Dict[Tuple[int, date], float], int, set]:
+    """
+    Valida as linhas do lote e resolve os colaborador_id (uma consulta).
+    Devolve ({(colaborador, data): valor}, repetições no arquivo, chaves já no banco).
+    Usado pelo import e pela pré-visualização.
+    """
+    missing = {
+        (r.get("colaborador_id") or "").strip() for r in chunk
+    } - collab_ids.keys() - {""}
+    if missing:
+        for cid in missing:
+            collab_ids[cid] = None
+        collab_ids.update(
+            Collaborator.objects.filter(colaborador_id__in=missing).values_list("colaborador_id", "id")
+        )
+
+    # (colaborador, data) -> valor; repetições no arquivo: vale a última linha
+    records: Dict[Tuple[int, date], float] = {}
+    repeated = 0
+    hot_from = archived_before()
+    for r in chunk:
+        cid = (r.get("colaborador_id") or "").strip()
+        d: date | None = r.get("date")
+        v = r.get("value")
+
+        if not cid or not d or v is None:
+            errors.add(r.get("excel_row"), "Linha incompleta (colaborador_id/data/valor)")
+            continue
+
+        collab_id = collab_ids.get(cid)
+        if collab_id is None:
+            errors.add(r.get("excel_row"), f"colaborador_id '{cid}' não encontrado")
+            continue
+
+        if hot_from and d < hot_from:
+            errors.add(r.get("excel_row"), f"Data em mês já arquivado (antes de {hot_from:%m/%Y})")
+            continue
+
+        key = (collab_id, d)
+        if key in records:
+            repeated += 1
+        records[key] = v
+
+    if not records:
+        return records, repeated, set()
+
+    dates = [d for _, d in records]
+    existing = set(
+        MetricRecord.objects.filter(
+            metric_type=metric,
+            collaborator_id__in={cid for cid, _ in records},
+            date__gte=min(dates),
+            date__lte=max(dates),
+        ).values_list("collaborator_id", "date")
+    )
+    return records, repeated, existing
+
+
+def _write_chunk(
+    batch: UploadBatch,
+    metric: MetricType,
+    chunk: List[Dict],
+    errors: ErrorCollector,
+    collab_ids: Dict[str, int | None],
+    profile: ImportProfile,
+) -> Tuple[int, int]:
+    with profile.stage("lookup", len(chunk)):
+        records, repeated, existing = _classify_chunk(metric, chunk, errors, collab_ids)
+    if not records:
+        return 0, 0
+
+    with profile.stage("upsert", len(records)):
+        _bulk_upsert(batch, metric, records)
+    created = sum(1 for key in records if key not in existing)
+    return created, len(records) - created + repeated
+
+
+def _bulk_upsert(batch: UploadBatch, metric: MetricType, records: Dict[Tuple[int, date], float]) -> None:
+    MetricRecord.objects.bulk_create(
+        [
+            MetricRecord(
+                collaborator_id=collab_id,
+                metric_type=metric,
+                date=d,
+                value=v,
+                source_batch_id=batch.id,
+            )
+            for (collab_id, d), v in records.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["collaborator", "metric_type", "date"],
+        update_fields=["value", "source_batch"],
+    )
@@ -0,0 +1,238 @@
+"""
+Upload em partes (retomável) para o diretório de staging.
+
+O cliente abre uma UploadSession informando nome, tamanho e (opcional) o
+SHA-256 do arquivo, e envia as partes em sequência, cada uma no offset que
+o servidor já recebeu. A parte é gravada direto no arquivo .part enquanto
+chega (nada do arquivo fica na memória do worker) e, se vier com o
+SHA-256 da parte, só é aceita se bater. Caiu a conexão: o cliente pergunta
+o offset e continua dali.
+
+Com tudo recebido, finish() confere o tamanho e o SHA-256 do arquivo
+(lido via mmap) e passa o arquivo para a fila de import
+(services.queue_import), movendo-o sem cópia: o import roda fora da
+requisição e a tela acompanha o lote. O import lê por um StagedFile, que
+expõe o caminho em disco — o leitor rápido de .xlsx e o modo paralelo
+trabalham a partir do caminho.
+"""
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+from datetime import timedelta
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from .models import UploadBatch, UploadSession
+from .services import preview_import, queue_import
+
+ALLOWED_EXTENSIONS = (".xlsx", ".xls", ".csv")
+COPY_BLOCK = 64 * 1024
+
+
+class StagingError(Exception):
+    """Erro no upload em partes; status é o código HTTP sugerido."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class StagedFile(File):
+    """Arquivo montado no staging, com a mesma cara de um TemporaryUploadedFile."""
+
+    def __init__(self, path: str, name: str):
+        super().__init__(open(path, "rb"), name=name)
+        self._path = path
+
+    def temporary_file_path(self) -> str:
+        return self._path
+
+
+def max_bytes() -> int:
+    return settings.UPLOAD_MAX_BYTES
+
+
+def chunk_bytes() -> int:
+    return settings.UPLOAD_CHUNK_BYTES
+
+
+def check_upload_size(size: int) -> None:
+    if size > max_bytes():
+        raise StagingError(
+            f"Arquivo maior que o limite de {max_bytes() // (1024 * 1024)} MB.", status=413,
+        )
+
+
+def start_session(user, metric_type, filename: str, total_size: int, sha256: str = "") -> UploadSession:
+    filename = os.path.basename(filename or "").strip()
+    if not filename.lower().endswith(ALLOWED_EXTENSIONS):
+        raise StagingError("Envie um arquivo Excel (.xlsx ou .xls) ou CSV.")
+    if total_size <= 0:
+        raise StagingError("Arquivo vazio.")
+    check_upload_size(total_size)
+    sha256 = (sha256 or "").strip().lower()
+    if sha256 and len(sha256) != 64:
+        raise StagingError("SHA-256 inválido.")
+
+    os.makedirs(settings.UPLOAD_STAGING_DIR, exist_ok=True)
+    session = UploadSession.objects.create(
+        user=user,
+        metric_type=metric_type,
+        original_filename=filename[:255],
+        total_size=total_size,
+        sha256=sha256,
+    )
+    open(session.staging_path, "wb").close()
+    return session
+
+
+def append_chunk(
+    session: UploadSession, offset: int, stream, length: int, chunk_sha256: str = "",
+) -> int:
+    """
+    Grava `length` bytes de `stream` no offset informado e devolve o novo
+    total recebido. O offset precisa ser exatamente o que o servidor já tem
+    (409 caso contrário, com o cliente retomando de session.received).
+    """
+    if session.status != "receiving":
+        raise StagingError("Upload já finalizado.", status=409)
+    if offset != session.received:
+        raise StagingError("Offset fora de sequência.", status=409)
+    if length <= 0 or length > chunk_bytes():
+        raise StagingError(f"Parte deve ter entre 1 e {chunk_bytes()} bytes.", status=413)
+    if offset + length > session.total_size:
+        raise StagingError("Parte passa do tamanho informado do arquivo.", status=413)
+
+    digest = hashlib.sha256()
+    written = 0
+    path = session.staging_path
+    with open(path, "r+b") as fh:
+        # descarta o que sobrou de uma parte interrompida antes de gravar
+        fh.truncate(offset)
+        fh.seek(offset)
+        while written < length:
+            block = stream.read(min(COPY_BLOCK, length - written))
+            if not block:
+                break
+            fh.write(block)
+            digest.update(block)
+            written += len(block)
+
+        if written != length:
+            fh.truncate(offset)
+            raise StagingError("Parte incompleta; envie novamente.")
+        if chunk_sha256 and digest.hexdigest() != chunk_sha256.strip().lower():
+            fh.truncate(offset)
+            raise StagingError("Checksum da parte não confere; envie novamente.")
+
+    # só avança se ninguém avançou antes (duas abas enviando a mesma sessão)
+    moved = UploadSession.objects.filter(
+        pk=session.pk, received=offset, status="receiving",
+    ).update(received=offset + length, updated_at=timezone.now())
+    if not moved:
+        session.refresh_from_db(fields=["received", "status"])
+        raise StagingError("Offset fora de sequência.", status=409)
+    session.received = offset + length
+    return session.received
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 do arquivo via mmap (as páginas vêm do cache do SO, sem cópia na heap)."""
+    digest = hashlib.sha256()
+    if os.path.getsize(path) == 0:
+        return digest.hexdigest()
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        digest.update(mm)
+    return digest.hexdigest()
+
+
+def _discard(session: UploadSession) -> None:
+    try:
+        os.remove(session.staging_path)
+    except FileNotFoundError:
+        pass
+
+
+def preview(session: UploadSession) -> Dict:
+    """Dry-run (services.preview_import) do arquivo já montado, sem importar."""
+    if not session.is_complete:
+        raise StagingError(f"Upload incompleto: {session.received} de {session.total_size} bytes.", status=409)
+    staged = StagedFile(session.staging_path, session.original_filename)
+    try:
+        return preview_import(session.metric_type, staged)
+    finally:
+        staged.close()
+
+
+def finish(session: UploadSession) -> UploadBatch:
+    """
+    Confere o arquivo montado e o põe na fila de import. Devolve o lote
+    (pendente); a sessão fica "imported" apontando para ele, e o resultado
+    do import fica no lote.
+    """
+    if session.status != "receiving":
+        raise StagingError("Upload já finalizado.", status=409)
+    if not session.is_complete:
+        raise StagingError(f"Upload incompleto: {session.received} de {session.total_size} bytes.", status=409)
+
+    path = session.staging_path
+    if not os.path.exists(path) or os.path.getsize(path) != session.total_size:
+        session.status = "failed"
+        session.save(update_fields=["status", "updated_at"])
+        _discard(session)
+        raise StagingError("Arquivo no servidor não confere com o tamanho enviado.")
+
+    checksum = file_sha256(path)
+    if session.sha256 and checksum != session.sha256:
+        session.status = "failed"
+        session.save(update_fields=["status", "updated_at"])
+        _discard(session)
+        raise StagingError("Checksum do arquivo não confere; envie novamente.")
+    session.sha256 = checksum
+
+    try:
+        # o .part vira o arquivo do lote (mesmo diretório: só um rename)
+        batch = queue_import(session.metric_type, session.user, session.original_filename, path)
+    except Exception:
+        session.status = "failed"
+        session.save(update_fields=["status", "sha256", "updated_at"])
+        _discard(session)
+        raise
+
+    session.status = "imported"
+    session.batch = batch
+    session.save(update_fields=["status", "sha256", "batch", "updated_at"])
+    return batch
+
+
+def purge_stale(max_age_hours: Optional[int] = None) -> int:
+    """Remove sessões paradas há mais que max_age_hours e os arquivos .part órfãos."""
+    hours = settings.UPLOAD_STAGING_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+    cutoff = timezone.now() - timedelta(hours=hours)
+    stale = UploadSession.objects.filter(status="receiving", updated_at__lt=cutoff)
+    removed = 0
+    for session in stale.iterator():
+        _discard(session)
+        removed += 1
+    stale.delete()
+
+    staging_dir = settings.UPLOAD_STAGING_DIR
+    if os.path.isdir(staging_dir):
+        # lista os arquivos antes das sessões: uma sessão aberta no meio não perde o .part
+        names = [n for n in os.listdir(staging_dir) if n.endswith(".part")]
+        live = {
+            f"{pk}.part"
+            for pk in UploadSession.objects.filter(status="receiving").values_list("pk", flat=True)
+        }
+        for name in names:
+            if name not in live:
+                try:
+                    os.remove(os.path.join(staging_dir, name))
+                except FileNotFoundError:
+                    pass
+    return removed
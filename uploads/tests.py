@@ -1,3 +1,643 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import date, datetime, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import Workbook
+
+from accounts.models import Collaborator
+from metrics.models import MetricRecord, MetricType
+
+from . import services, staging
+from .models import UploadBatch, UploadError, UploadSession
+from .services import ErrorCollector, _parse_value, import_xlsx
+from .xlsx_reader import XlsxReaderError, XlsxSheetReader, row_boundaries
+
+START = date(2025, 1, 1)
+ROWS = 1200
+
+
+def _rows():
+    """Linhas com colaborador desconhecido, valor inválido e buracos (linhas vazias)."""
+    for i in range(ROWS):
+        if i % 7 == 3:
+            yield None
+            continue
+        value = "abc" if i % 11 == 5 else i % 9
+        yield (f"C{i % 45}", START + timedelta(days=i // 45), value)
+
+
+def _xlsx_write_only() -> bytes:
+    """Saída do modo write-only do openpyxl: sem <dimension> e sem as linhas vazias no XML."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("dados")
+    ws.append(["colaborador_id", "data", "valor"])
+    for row in _rows():
+        if row is not None:
+            ws.append(list(row))
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _xlsx() -> bytes:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "dados"
+    ws.append(["colaborador_id", "data", "valor"])
+    for n, row in enumerate(_rows(), start=2):
+        if row is not None:
+            for col, value in enumerate(row, start=1):
+                ws.cell(row=n, column=col, value=value)
+    # outra aba não entra no import
+    other = wb.create_sheet("outra")
+    other.append(["colaborador_id", "data", "valor"])
+    other.append(["C1", START - timedelta(days=400), 9])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _csv() -> bytes:
+    lines = ["colaborador_id;data;valor"]
+    for row in _rows():
+        lines.append("" if row is None else f"{row[0]};{row[1]:%d/%m/%Y};{row[2]}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+@override_settings(METRICS_RECOMPUTE_SYNC=True, METRICS_SNAPSHOT_DIR="")
+class ParallelReaderParityTests(TestCase):
+    """O pool de processos (parallel.py) tem de importar exatamente o que o leitor sequencial importa."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("importador")
+        self.metric = MetricType.objects.create(name="Produção", code="producao", target_value=4)
+        Collaborator.objects.bulk_create(
+            [Collaborator(colaborador_id=f"C{i}", nome=f"Colaborador {i}") for i in range(40)]
+        )
+
+    def _import(self, name: str, data: bytes):
+        upload = TemporaryUploadedFile(name, "application/octet-stream", len(data), None)
+        upload.write(data)
+        upload.seek(0)
+        try:
+            _, report = import_xlsx(self.metric, upload, self.user)
+        finally:
+            upload.close()
+        batch = UploadBatch.objects.get(pk=report["batch_id"])
+        records = sorted(
+            MetricRecord.objects.filter(source_batch=batch)
+            .values_list("collaborator__colaborador_id", "date", "value", "target_status")
+        )
+        errors = list(batch.errors.values_list("reason", "first_row", "last_row"))
+        MetricRecord.objects.all().delete()
+        return batch.profile["reader"], report, records, errors
+
+    def _assert_parity(self, name: str, data: bytes, kind: str):
+        reader, *sequential = self._import(name, data)
+        self.assertEqual(reader, kind)
+        self.assertTrue(sequential[1])
+        self.assertTrue(sequential[2])
+        for workers in (2, 3):
+            with self.subTest(workers=workers), override_settings(
+                UPLOAD_PARALLEL_WORKERS=workers, UPLOAD_PARALLEL_MIN_BYTES=0,
+            ):
+                reader, *parallel = self._import(name, data)
+                self.assertEqual(reader, f"{kind}-paralelo")
+                for seq, par in zip(sequential, parallel):
+                    if isinstance(seq, dict):
+                        seq = {k: v for k, v in seq.items() if k != "batch_id"}
+                        par = {k: v for k, v in par.items() if k != "batch_id"}
+                    self.assertEqual(seq, par)
+
+    def test_xlsx(self):
+        self._assert_parity("metricas.xlsx", _xlsx(), "xlsx")
+
+    def test_xlsx_gaps_at_range_boundaries(self):
+        # só linhas pares: todo corte entre faixas cai num buraco
+        wb = Workbook()
+        ws = wb.active
+        ws.append(["colaborador_id", "data", "valor"])
+        for n in range(4, 400, 2):
+            ws.cell(row=n, column=1, value=f"C{n % 40}")
+            ws.cell(row=n, column=2, value=START + timedelta(days=n))
+            ws.cell(row=n, column=3, value=n % 9)
+        buf = io.BytesIO()
+        wb.save(buf)
+        self._assert_parity("metricas.xlsx", buf.getvalue(), "xlsx")
+
+    def test_xlsx_without_dimension(self):
+        self._assert_parity("metricas.xlsx", _xlsx_write_only(), "xlsx")
+
+    def test_csv(self):
+        self._assert_parity("metricas.csv", _csv(), "csv")
+
+
+class ParseValueTests(SimpleTestCase):
+    def setUp(self):
+        self.metric = MetricType(name="Produção", code="producao")
+
+    def test_numbers_and_decimal_comma(self):
+        self.assertEqual(_parse_value(self.metric, 3, False), 3.0)
+        self.assertEqual(_parse_value(self.metric, "1.234,5", False), 1234.5)
+        self.assertIsNone(_parse_value(self.metric, "abc", False))
+
+    def test_non_finite_values_are_rejected(self):
+        for is_time in (False, True):
+            for raw in (float("nan"), float("inf"), -float("inf"), "nan", "NaN", "inf", "-Infinity"):
+                with self.subTest(raw=raw, is_time=is_time):
+                    self.assertIsNone(_parse_value(self.metric, raw, is_time))
+
+
+class ErrorCollectorTests(TestCase):
+    def test_consecutive_rows_with_same_reason_are_merged(self):
+        errors = ErrorCollector()
+        for row in (2, 3, 4, 6, 7):
+            errors.add(row, "colaborador_id 'X' não encontrado")
+        errors.add(8, "Linha incompleta (colaborador_id/data/valor)")
+        errors.add(9, "Linha incompleta (colaborador_id/data/valor)")
+        errors.add(10, "colaborador_id 'X' não encontrado")
+        self.assertEqual(errors.count, 8)
+        self.assertEqual(errors.runs, [
+            [2, 4, "colaborador_id 'X' não encontrado"],
+            # buraco na numeração abre outra faixa
+            [6, 7, "colaborador_id 'X' não encontrado"],
+            [8, 9, "Linha incompleta (colaborador_id/data/valor)"],
+            [10, 10, "colaborador_id 'X' não encontrado"],
+        ])
+
+    def test_reason_is_cut_to_field_length(self):
+        errors = ErrorCollector()
+        errors.add(2, "x" * 300)
+        errors.add(3, "x" * 300 + "y")
+        self.assertEqual(errors.runs, [[2, 3, "x" * 255]])
+
+    def test_rows_label(self):
+        self.assertEqual(UploadError(first_row=5, last_row=5, reason="r").rows_label, "5")
+        self.assertEqual(UploadError(first_row=5, last_row=9, reason="r").rows_label, "5–9")
+        self.assertEqual(UploadError(first_row=5, last_row=9, reason="r").row_count, 5)
+        self.assertEqual(str(UploadError(first_row=5, last_row=9, reason="r")), "Linhas 5–9: r")
+
+    @override_settings(METRICS_RECOMPUTE_SYNC=True, METRICS_SNAPSHOT_DIR="")
+    def test_import_saves_runs_and_admin_csv_lists_them(self):
+        admin = get_user_model().objects.create_superuser("admin", password="x")
+        metric = MetricType.objects.create(name="Produção", code="producao")
+        Collaborator.objects.create(colaborador_id="C1", nome="Ana")
+        csv = "\n".join([
+            "colaborador_id;data;valor",
+            "C1;2025-01-01;1",
+            "X1;2025-01-02;1",
+            "X1;2025-01-03;1",
+            "C1;;1",
+            "X1;2025-01-05;1",
+        ])
+        _, report = import_xlsx(metric, SimpleUploadedFile("m.csv", csv.encode()), admin)
+        batch = UploadBatch.objects.get(pk=report["batch_id"])
+        self.assertEqual(batch.error_count, 4)
+        self.assertEqual(
+            [(e.rows_label, e.reason) for e in batch.errors.all()],
+            [
+                ("3–4", "colaborador_id 'X1' não encontrado"),
+                ("5", "Linha incompleta (colaborador_id/data/valor)"),
+                ("6", "colaborador_id 'X1' não encontrado"),
+            ],
+        )
+
+        self.client.force_login(admin)
+        response = self.client.get(reverse("admin:uploads_uploadbatch_errors_csv", args=[batch.pk]))
+        self.assertEqual(response["Content-Disposition"], f'attachment; filename="lote-{batch.pk}-erros.csv"')
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, [
+            "linha_inicial,linha_final,linhas,motivo",
+            "3,4,2,colaborador_id 'X1' não encontrado",
+            "5,5,1,Linha incompleta (colaborador_id/data/valor)",
+            "6,6,1,colaborador_id 'X1' não encontrado",
+        ])
+
+
+_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+# estilos: 0 = geral, 1 = data (14), 2 = duração ([h]:mm:ss, 46), 3 = data personalizada (164)
+_STYLES_XML = (
+    f'<styleSheet xmlns="{_MAIN}"><numFmts count="1"><numFmt numFmtId="164" formatCode="dd/mm/yyyy"/></numFmts>'
+    '<cellXfs count="4"><xf numFmtId="0"/><xf numFmtId="14"/><xf numFmtId="46"/><xf numFmtId="164"/></cellXfs>'
+    "</styleSheet>"
+)
+
+
+def _package(rows_xml: str, shared=(), dimension: str | None = "A1:C5", date1904: bool = False) -> io.BytesIO:
+    """.xlsx mínimo montado à mão, para exercitar o XML que o openpyxl não gera."""
+    sst = "".join(f"<si>{si}</si>" for si in shared)
+    dim = f'<dimension ref="{dimension}"/>' if dimension else ""
+    pr = '<workbookPr date1904="1"/>' if date1904 else ""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("xl/workbook.xml", (
+            f'<workbook xmlns="{_MAIN}" xmlns:r="{_REL}">{pr}'
+            '<sheets><sheet name="dados" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        zf.writestr("xl/_rels/workbook.xml.rels", (
+            f'<Relationships xmlns="{_PKG_REL}">'
+            f'<Relationship Id="rId1" Type="{_REL}/worksheet" Target="worksheets/sheet1.xml"/>'
+            f'<Relationship Id="rId2" Type="{_REL}/sharedStrings" Target="sharedStrings.xml"/>'
+            f'<Relationship Id="rId3" Type="{_REL}/styles" Target="styles.xml"/>'
+            "</Relationships>"
+        ))
+        zf.writestr("xl/worksheets/sheet1.xml", f'<worksheet xmlns="{_MAIN}">{dim}<sheetData>{rows_xml}</sheetData></worksheet>')
+        zf.writestr("xl/sharedStrings.xml", f'<sst xmlns="{_MAIN}">{sst}</sst>')
+        zf.writestr("xl/styles.xml", _STYLES_XML)
+    buf.seek(0)
+    return buf
+
+
+class XlsxSheetReaderTests(SimpleTestCase):
+    def rows(self, rows_xml: str, columns=None, **kwargs):
+        reader_kwargs = {k: kwargs.pop(k) for k in ("shared", "dimension", "date1904") if k in kwargs}
+        with XlsxSheetReader(_package(rows_xml, **reader_kwargs)) as reader:
+            return list(reader.iter_rows(reader.active_sheet(), columns, **kwargs))
+
+    def test_shared_and_inline_strings(self):
+        shared = ["<t>colaborador_id</t>", "<r><t>An</t></r><r><t>a</t></r>", "<t>Jo&amp;ão</t><rPh><t>ジョ</t></rPh>"]
+        got = self.rows(
+            '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="inlineStr"><is><t>data</t></is></c></row>'
+            '<row r="2"><c r="A2" t="s"><v>1</v></c><c r="B2" t="inlineStr"><is><r><t>Bi</t></r><r><t>a &lt;x&gt;</t></r></is></c>'
+            '<c r="C2" t="str"><v>fórmula</v></c></row>'
+            '<row r="3"><c r="A3" t="s"><v>2</v></c><c r="B3" t="b"><v>1</v></c><c r="C3"><v>7</v></c></row>',
+            shared=shared,
+        )
+        self.assertEqual(got, [
+            (1, {0: "colaborador_id", 1: "data"}),
+            (2, {0: "Ana", 1: "Bia <x>", 2: "fórmula"}),
+            # o texto fonético (rPh) não entra
+            (3, {0: "Jo&ão", 1: True, 2: 7}),
+        ])
+
+    def test_shared_string_out_of_range(self):
+        with self.assertRaises(XlsxReaderError):
+            self.rows('<row r="1"><c r="A1" t="s"><v>3</v></c></row>')
+
+    def test_sparse_rows_and_columns(self):
+        got = self.rows(
+            '<row r="2"><c r="A2"><v>1</v></c><c r="C2"><v>1.5</v></c></row>'
+            '<row r="5"><c r="B5"><v>2</v></c><c r="AB5"><v>3</v></c></row>',
+        )
+        self.assertEqual(got, [(1, {}), (2, {0: 1, 2: 1.5}), (3, {}), (4, {}), (5, {1: 2, 27: 3})])
+        # só as colunas pedidas
+        got = self.rows(
+            '<row r="2"><c r="A2"><v>1</v></c><c r="C2"><v>1.5</v></c></row>'
+            '<row r="5"><c r="B5"><v>2</v></c><c r="AB5"><v>3</v></c></row>',
+            columns={2, 27},
+        )
+        self.assertEqual(got, [(1, {}), (2, {2: 1.5}), (3, {}), (4, {}), (5, {27: 3})])
+
+    def test_rows_and_cells_without_ref(self):
+        # <row> sem r segue a anterior
+        got = self.rows('<row r="2"><c r="A2"><v>1</v></c></row><row><c r="A3"><v>2</v></c></row>')
+        self.assertEqual(got, [(1, {}), (2, {0: 1}), (3, {0: 2})])
+        for cell in ("<c><v>1</v></c>", '<c t="s"><v>0</v></c>', "<c/>"):
+            with self.subTest(cell=cell), self.assertRaises(XlsxReaderError):
+                self.rows(f'<row r="1">{cell}</row>')
+
+    def test_dates_times_and_styles(self):
+        got = self.rows(
+            '<row r="1"><c r="A1" s="1"><v>45658</v></c><c r="B1" s="2"><v>0.5</v></c>'
+            '<c r="C1" s="3"><v>45658.25</v></c><c r="D1" s="0"><v>45658</v></c>'
+            '<c r="E1" t="d"><v>2025-01-02T08:30:00</v></c><c r="F1" s="1"/></row>',
+        )
+        self.assertEqual(got, [(1, {
+            0: datetime(2025, 1, 1),
+            1: timedelta(hours=12),
+            2: datetime(2025, 1, 1, 6),
+            3: 45658,
+            4: datetime(2025, 1, 2, 8, 30),
+            5: None,
+        })])
+        got = self.rows('<row r="1"><c r="A1" s="1"><v>1</v></c></row>', date1904=True)
+        self.assertEqual(got, [(1, {0: datetime(1904, 1, 2)})])
+
+    def test_min_and_max_row(self):
+        xml = "".join(f'<row r="{n}"><c r="A{n}"><v>{n}</v></c></row>' for n in (1, 2, 4, 7))
+        self.assertEqual(self.rows(xml, min_row=2, max_row=4), [(2, {0: 2}), (3, {}), (4, {0: 4})])
+        # max_row num buraco: as linhas vazias até ele ainda saem
+        self.assertEqual(self.rows(xml, min_row=4, max_row=6), [(4, {0: 4}), (5, {}), (6, {})])
+        # min_row antes da primeira linha do XML: vazias desde min_row
+        self.assertEqual(self.rows(xml[xml.index('<row r="4"'):], min_row=2, max_row=4), [(2, {}), (3, {}), (4, {0: 4})])
+
+    def test_header_and_dimension(self):
+        xml = '<row r="1"><c r="A1" t="inlineStr"><is><t>id</t></is></c><c r="C1" t="inlineStr"><is><t>valor</t></is></c></row>'
+        with XlsxSheetReader(_package(xml, dimension="A1:C250")) as reader:
+            self.assertEqual(reader.header(reader.active_sheet()), ["id", None, "valor"])
+            self.assertEqual(reader.dimension_rows(reader.active_sheet()), 250)
+        with XlsxSheetReader(_package(xml, dimension=None)) as reader:
+            self.assertIsNone(reader.dimension_rows(reader.active_sheet()))
+            self.assertEqual(reader.header(reader.active_sheet()), ["id", None, "valor"])
+
+    def test_not_a_workbook(self):
+        with self.assertRaises(XlsxReaderError):
+            XlsxSheetReader(io.BytesIO(b"colaborador_id;data;valor"))
+
+    def test_ranges_cover_the_sheet(self):
+        xml = "".join(
+            f'<row r="{n}"><c r="A{n}" t="inlineStr"><is><t>C{n}</t></is></c><c r="B{n}"><v>{n}</v></c></row>'
+            for n in range(1, 400) if n % 5
+        )
+        with XlsxSheetReader(_package(xml)) as reader:
+            sheet = reader.active_sheet()
+            expected = [r for r in reader.iter_rows(sheet, {0, 1}) if r[1]]
+            with tempfile.NamedTemporaryFile(delete=False) as tmp:
+                size = reader.extract_sheet(sheet, tmp)
+            try:
+                self.assertEqual(size, os.path.getsize(tmp.name))
+                with open(tmp.name, "rb") as fh:
+                    cuts = row_boundaries(fh.read(), 4)
+                self.assertEqual((cuts[0], cuts[-1], len(cuts)), (0, size, 5))
+                got = []
+                for start, end in zip(cuts, cuts[1:]):
+                    part = list(reader.iter_rows_in_range(tmp.name, start, end, {0, 1}))
+                    # fora da primeira faixa, nada de linhas vazias antes da primeira
+                    if start:
+                        self.assertTrue(part[0][1])
+                    got.extend(r for r in part if r[1])
+            finally:
+                os.unlink(tmp.name)
+        self.assertEqual(got, expected)
+
+
+class StagingDirMixin:
+    """UPLOAD_STAGING_DIR numa pasta temporária."""
+
+    def setUp(self):
+        super().setUp()
+        self.staging_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.staging_dir, True)
+        override = override_settings(UPLOAD_STAGING_DIR=self.staging_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+@override_settings(METRICS_RECOMPUTE_SYNC=True, METRICS_SNAPSHOT_DIR="")
+class BackgroundImportTests(StagingDirMixin, TestCase):
+    CSV = b"colaborador_id;data;valor\nC1;2025-01-01;3\nC2;2025-01-01;4\nX9;2025-01-01;5\n"
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user("importador", is_staff=True)
+        self.metric = MetricType.objects.create(name="Produção", code="producao")
+        Collaborator.objects.bulk_create([Collaborator(colaborador_id=f"C{i}", nome=f"Colaborador {i}") for i in range(3)])
+        self.client.force_login(self.user)
+
+    def post_upload(self):
+        return self.client.post(reverse("uploads:upload"), {
+            "metric_type": self.metric.id, "file": SimpleUploadedFile("m.csv", self.CSV),
+        })
+
+    def status(self, batch):
+        return self.client.get(reverse("uploads:status", args=[batch.id])).json()
+
+    @override_settings(UPLOAD_IMPORT_SYNC=True)
+    def test_form_upload_returns_batch_and_imports_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post_upload()
+        batch = UploadBatch.objects.get()
+        self.assertRedirects(response, f"{reverse('uploads:upload')}?batch={batch.id}")
+        self.assertEqual(batch.status, "imported")
+        self.assertFalse(os.path.exists(batch.staging_path))
+
+        data = self.status(batch)
+        self.assertEqual((data["status"], data["rows_total"], data["rows_processed"]), ("imported", 3, 3))
+        self.assertEqual((data["imported"], data["error_count"]), (2, 1))
+        # a página acompanha o lote
+        page = self.client.get(response["Location"])
+        self.assertContains(page, reverse("uploads:status", args=[batch.id]))
+
+    def test_queued_batch_is_picked_up_by_command(self):
+        with self.captureOnCommitCallbacks():  # a thread não roda
+            self.post_upload()
+        batch = UploadBatch.objects.get()
+        self.assertEqual(batch.status, "pending")
+        with open(batch.staging_path, "rb") as fh:
+            self.assertEqual(fh.read(), self.CSV)
+        data = self.status(batch)
+        self.assertEqual((data["status"], data["stage"]), ("pending", "queued"))
+
+        out = StringIO()
+        call_command("run_pending_imports", "--older-than", "0", stdout=out)
+        self.assertIn("1 lote(s) importado(s)", out.getvalue())
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.report["imported"]), ("imported", 2))
+        self.assertFalse(os.path.exists(batch.staging_path))
+        # já importado: ninguém pega de novo
+        self.assertFalse(services.run_import(batch.id))
+
+    def test_read_progress_is_reported(self):
+        stages = []
+
+        def record(batch, rows, stage):
+            stages.append((stage, rows))
+
+        csv = b"colaborador_id;data;valor\n" + b"".join(b"C1;2025-01-%02d;1\n" % d for d in range(1, 8))
+        with mock.patch.object(services, "READ_PROGRESS_ROWS", 3), \
+                mock.patch.object(services, "_set_progress", side_effect=record):
+            import_xlsx(self.metric, SimpleUploadedFile("m.csv", csv), self.user)
+        self.assertEqual(stages, [("read", 0), ("read", 3), ("read", 6), ("evaluate", 7)])
+
+    def test_batch_exists_before_parsing_and_records_header_error(self):
+        ok, report = import_xlsx(self.metric, SimpleUploadedFile("m.csv", b"id;dia;total\n1;2;3\n"), self.user)
+        self.assertFalse(ok)
+        batch = UploadBatch.objects.get(pk=report["batch_id"])
+        self.assertEqual(batch.status, "failed")
+        self.assertEqual(batch.report, {"error": "Cabeçalho inválido", "found": ["id", "dia", "total"]})
+
+    def test_missing_file_fails_batch(self):
+        batch = UploadBatch.objects.create(metric_type=self.metric, original_filename="m.csv", status="pending")
+        self.assertTrue(services.run_import(batch.id))
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, "failed")
+        self.assertIn("não encontrado", batch.report["error"])
+
+    def test_interrupted_batches_are_failed(self):
+        old = timezone.now() - timedelta(seconds=services.PROGRESS_TIMEOUT + 60)
+        dead = UploadBatch.objects.create(metric_type=self.metric, original_filename="m.csv", status="processing", created_at=old)
+        alive = UploadBatch.objects.create(metric_type=self.metric, original_filename="m.csv", status="processing", created_at=old)
+        cache.set(services.progress_key(alive.id), {"rows": 10, "stage": "upsert"})
+        self.addCleanup(cache.delete, services.progress_key(alive.id))
+
+        self.assertEqual(services.drain_imports(), (0, 1))
+        dead.refresh_from_db()
+        alive.refresh_from_db()
+        self.assertEqual((dead.status, alive.status), ("failed", "processing"))
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@override_settings(METRICS_RECOMPUTE_SYNC=True, METRICS_SNAPSHOT_DIR="", UPLOAD_CHUNK_BYTES=16, UPLOAD_IMPORT_SYNC=True)
+class StagingTests(StagingDirMixin, TestCase):
+    DATA = b"colaborador_id;data;valor\n" + b"".join(b"C%d;2025-01-%02d;%d\n" % (d % 3, d, d) for d in range(1, 11))
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user("importador", is_staff=True)
+        self.metric = MetricType.objects.create(name="Produção", code="producao")
+        Collaborator.objects.bulk_create([Collaborator(colaborador_id=f"C{i}", nome=f"Colaborador {i}") for i in range(3)])
+
+    def start(self, sha256: str = ""):
+        return staging.start_session(self.user, self.metric, "m.csv", len(self.DATA), sha256)
+
+    def put(self, session, offset: int, data: bytes | None = None, sha256: str = "") -> int:
+        data = self.DATA[offset:offset + 16] if data is None else data
+        return staging.append_chunk(session, offset, io.BytesIO(data), len(data), sha256)
+
+    def upload_all(self, session):
+        while session.received < session.total_size:
+            self.put(session, session.received, sha256=_sha(self.DATA[session.received:session.received + 16]))
+
+    def staged(self, session) -> bytes:
+        with open(session.staging_path, "rb") as fh:
+            return fh.read()
+
+    def test_out_of_order_and_duplicate_offsets(self):
+        session = self.start()
+        self.assertEqual(self.put(session, 0), 16)
+        for offset in (32, 0, 8):
+            with self.subTest(offset=offset), self.assertRaises(staging.StagingError) as ctx:
+                self.put(session, offset)
+            self.assertEqual(ctx.exception.status, 409)
+        self.assertEqual(UploadSession.objects.get(pk=session.pk).received, 16)
+        self.assertEqual(self.staged(session), self.DATA[:16])
+
+        # outra cópia da sessão (segunda aba) com o offset antigo não avança nada
+        stale = UploadSession.objects.get(pk=session.pk)
+        self.put(session, 16)
+        with self.assertRaises(staging.StagingError):
+            self.put(stale, 16)
+        self.assertEqual(stale.received, 32)
+
+    def test_chunk_size_limits(self):
+        session = self.start()
+        for data in (b"", b"x" * 17):
+            with self.subTest(size=len(data)), self.assertRaises(staging.StagingError) as ctx:
+                self.put(session, 0, data)
+            self.assertEqual(ctx.exception.status, 413)
+
+    def test_chunk_checksum_mismatch(self):
+        session = self.start()
+        with self.assertRaisesMessage(staging.StagingError, "Checksum da parte"):
+            self.put(session, 0, sha256=_sha(b"outra coisa"))
+        self.assertEqual((session.received, self.staged(session)), (0, b""))
+        self.assertEqual(self.put(session, 0, sha256=_sha(self.DATA[:16])), 16)
+
+    def test_resume_after_interrupted_chunk(self):
+        session = self.start()
+        self.put(session, 0)
+        # conexão caiu no meio da parte: bytes a menos que o Content-Length
+        with self.assertRaisesMessage(staging.StagingError, "Parte incompleta"):
+            staging.append_chunk(session, 16, io.BytesIO(self.DATA[16:24]), 16)
+        self.assertEqual(self.staged(session), self.DATA[:16])
+        # processo morreu gravando: sobra lixo depois do offset recebido
+        with open(session.staging_path, "ab") as fh:
+            fh.write(b"lixo")
+
+        session = UploadSession.objects.get(pk=session.pk)
+        self.upload_all(session)
+        self.assertEqual(self.staged(session), self.DATA)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            batch = staging.finish(session)
+        batch.refresh_from_db()
+        self.assertEqual((batch.status, batch.report["imported"]), ("imported", 10))
+        session.refresh_from_db()
+        self.assertEqual((session.status, session.batch_id, session.sha256), ("imported", batch.id, _sha(self.DATA)))
+        self.assertFalse(os.path.exists(session.staging_path))
+        self.assertFalse(os.path.exists(batch.staging_path))
+        with self.assertRaises(staging.StagingError):
+            staging.finish(session)
+
+    def test_file_checksum_mismatch(self):
+        session = self.start(sha256=_sha(b"outro arquivo"))
+        self.upload_all(session)
+        with self.assertRaisesMessage(staging.StagingError, "Checksum do arquivo"):
+            staging.finish(session)
+        self.assertEqual(UploadSession.objects.get(pk=session.pk).status, "failed")
+        self.assertFalse(os.path.exists(session.staging_path))
+        self.assertFalse(UploadBatch.objects.exists())
+
+    def test_file_changed_on_disk(self):
+        session = self.start()
+        self.upload_all(session)
+        with open(session.staging_path, "r+b") as fh:
+            fh.truncate(10)
+        with self.assertRaisesMessage(staging.StagingError, "não confere com o tamanho"):
+            staging.finish(session)
+        self.assertEqual(UploadSession.objects.get(pk=session.pk).status, "failed")
+
+    def test_incomplete_upload_cannot_finish(self):
+        session = self.start()
+        self.put(session, 0)
+        with self.assertRaises(staging.StagingError) as ctx:
+            staging.finish(session)
+        self.assertEqual(ctx.exception.status, 409)
+
+    def test_purge_stale(self):
+        old = self.start()
+        self.put(old, 0)
+        UploadSession.objects.filter(pk=old.pk).update(updated_at=timezone.now() - timedelta(hours=49))
+        recent = self.start()
+        orphan = os.path.join(self.staging_dir, "00000000-0000-0000-0000-000000000000.part")
+        queued = os.path.join(self.staging_dir, "batch-1.csv")
+        for path in (orphan, queued):
+            open(path, "wb").close()
+
+        self.assertEqual(staging.purge_stale(), 1)
+        self.assertFalse(UploadSession.objects.filter(pk=old.pk).exists())
+        self.assertFalse(os.path.exists(old.staging_path))
+        self.assertFalse(os.path.exists(orphan))
+        # sessão ativa e arquivo na fila de import ficam
+        self.assertTrue(os.path.exists(recent.staging_path))
+        self.assertTrue(os.path.exists(queued))
+
+        out = StringIO()
+        call_command("purge_upload_staging", "--max-age-hours", "0", stdout=out)
+        self.assertIn("1 sessão(ões) removida(s).", out.getvalue())
+        self.assertFalse(os.path.exists(recent.staging_path))
+
+    def test_http_flow(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse("uploads:session_start"), {
+            "metric_type": self.metric.id, "filename": "m.csv", "size": len(self.DATA), "sha256": _sha(self.DATA),
+        })
+        url = reverse("uploads:session_chunk", args=[response.json()["id"]])
+
+        def put(offset):
+            return self.client.put(
+                url, self.DATA[offset:offset + 16], content_type="application/octet-stream",
+                headers={"X-Upload-Offset": str(offset)},
+            )
+
+        self.assertEqual(put(0).json()["received"], 16)
+        conflict = put(32)
+        self.assertEqual((conflict.status_code, conflict.json()["received"]), (409, 16))
+        self.assertEqual(self.client.get(url).json()["received"], 16)
+        offset = 16
+        while offset < len(self.DATA):
+            offset = put(offset).json()["received"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            data = self.client.post(url + "finish/").json()
+        self.assertEqual(data["status"], "imported")
+        self.assertEqual(data["next_url"], f"{reverse('uploads:upload')}?batch={data['batch_id']}")
+        self.assertEqual(self.client.get(data["status_url"]).json()["imported"], 10)
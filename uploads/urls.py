@@ -6,4 +6,11 @@ app_name = "uploads"
 urlpatterns = [
     # /uploads/  -> formulário e POST
     path("", views.upload_csv, name="upload"),
+    path("preview/", views.upload_preview, name="preview"),
+    path("<int:pk>/status/", views.upload_status, name="status"),
+    # upload em partes (retomável)
+    path("sessions/", views.upload_session_start, name="session_start"),
+    path("sessions/<uuid:pk>/", views.upload_session_chunk, name="session_chunk"),
+    path("sessions/<uuid:pk>/preview/", views.upload_session_preview, name="session_preview"),
+    path("sessions/<uuid:pk>/finish/", views.upload_session_finish, name="session_finish"),
 ]
@@ -1,9 +1,15 @@
 from django.contrib.auth.decorators import login_required, user_passes_test  # ou permission_required
-from django.shortcuts import render, redirect
+from django.core.cache import cache
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, render, redirect
+from django.urls import reverse
 from django.contrib import messages
+from django.views.decorators.http import require_http_methods, require_POST
 
 from metrics.models import MetricType
-from .services import import_xlsx
+from . import staging
+from .models import UploadBatch, UploadSession
+from .services import preview_import, progress_key, queue_import
 
 @login_required
 @user_passes_test(lambda u: u.is_staff)  # ou @permission_required('uploads.can_upload_metrics', raise_exception=True)
@@ -16,26 +22,194 @@ def upload_csv(request):
 
         if not metric_id or not file:
             messages.error(request, "Selecione a métrica e o arquivo.")
-            return render(request, "uploads/upload.html", {"metric_types": metric_types})
+            return render(request, "uploads/upload.html", _upload_context(metric_types))
 
         try:
             metric = MetricType.objects.get(pk=metric_id)
         except MetricType.DoesNotExist:
             messages.error(request, "Métrica inválida.")
-            return render(request, "uploads/upload.html", {"metric_types": metric_types})
+            return render(request, "uploads/upload.html", _upload_context(metric_types))
 
         fname = (file.name or "").lower()
-        if not (fname.endswith(".xlsx") or fname.endswith(".xls")):
-            messages.error(request, "Envie um arquivo Excel (.xlsx ou .xls).")
-            return render(request, "uploads/upload.html", {"metric_types": metric_types})
+        if not fname.endswith((".xlsx", ".xls", ".csv")):
+            messages.error(request, "Envie um arquivo Excel (.xlsx ou .xls) ou CSV.")
+            return render(request, "uploads/upload.html", _upload_context(metric_types))
 
-        ok, report = import_xlsx(metric, file, request.user)
-        if ok:
-            messages.success(request, f"Importação concluída. Linhas importadas: {report.get('imported', 0)}.")
-        else:
-            msg = report.get("error") or f"Falhas: {len(report.get('errors', []))}"
-            messages.error(request, f"Falha no import: {msg}")
+        try:
+            staging.check_upload_size(file.size)
+        except staging.StagingError as exc:
+            messages.error(request, str(exc))
+            return render(request, "uploads/upload.html", _upload_context(metric_types))
+
+        # o import roda fora da requisição; a página acompanha o lote (upload_status)
+        batch = queue_import(metric, request.user, file.name, file)
+        messages.info(request, f"Arquivo recebido (lote #{batch.id}). A importação continua em segundo plano.")
+        return redirect(_batch_url(batch.id))
+
+    return render(request, "uploads/upload.html", _upload_context(metric_types, request.GET.get("batch")))
+
+
+def _batch_url(batch_id: int) -> str:
+    return f"{reverse('uploads:upload')}?batch={batch_id}"
+
+
+def _upload_context(metric_types, batch_id: str | None = None) -> dict:
+    return {
+        "metric_types": metric_types,
+        "chunk_size": staging.chunk_bytes(),
+        "max_upload_mb": staging.max_bytes() // (1024 * 1024),
+        # lote cujo andamento a página acompanha
+        "batch_id": int(batch_id) if batch_id and batch_id.isdigit() else None,
+    }
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+@require_POST
+def upload_preview(request):
+    """Dry-run do formulário simples: cabeçalho + amostra, sem gravar (JSON)."""
+    file = request.FILES.get("file")
+    try:
+        metric = MetricType.objects.get(pk=request.POST.get("metric_type"))
+    except (MetricType.DoesNotExist, ValueError):
+        return JsonResponse({"ok": False, "error": "Métrica inválida."}, status=400)
+    if not file or not (file.name or "").lower().endswith((".xlsx", ".xls", ".csv")):
+        return JsonResponse({"ok": False, "error": "Envie um arquivo Excel (.xlsx ou .xls) ou CSV."}, status=400)
+    return JsonResponse(preview_import(metric, file))
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+async def upload_status(request, pk):
+    """
+    Status/progresso de um lote (JSON), para o polling da página de upload
+    (leve sob ASGI). Durante o import, rows_processed e stage vêm do
+    progresso que services._import grava no cache (leitura a cada
+    READ_PROGRESS_ROWS linhas, gravação a cada lote); depois, do relatório final.
+    """
+    try:
+        batch = await UploadBatch.objects.only(
+            "id", "status", "rows_total", "error_count", "report", "original_filename", "created_at",
+        ).aget(pk=pk)
+    except UploadBatch.DoesNotExist:
+        raise Http404("Lote não encontrado.")
+    report = batch.report or {}
+    processed = report.get("imported", 0) + batch.error_count
+    stage = ""
+    if batch.status == "pending":
+        stage = "queued"
+    elif batch.status == "processing":
+        progress = await cache.aget(progress_key(batch.id)) or {}
+        processed = progress.get("rows", 0)
+        stage = progress.get("stage", "")
+    return JsonResponse({
+        "id": batch.id,
+        "status": batch.status,
+        "original_filename": batch.original_filename,
+        "created_at": batch.created_at,
+        "rows_total": batch.rows_total,
+        "rows_processed": processed,
+        # queued (na fila), read (lendo o arquivo), upsert (gravando linhas)
+        # ou evaluate (metas e contadores do lote)
+        "stage": stage,
+        "imported": report.get("imported", 0),
+        "created": report.get("created", 0),
+        "updated": report.get("updated", 0),
+        "error_count": batch.error_count,
+        "error": report.get("error", ""),
+    })
+
+
+# ---------- upload em partes (retomável), ver staging.py ----------
 
-        return redirect("uploads:upload")  # << nome/namespace corretos
+def _session_json(session: UploadSession, **extra) -> JsonResponse:
+    return JsonResponse({
+        "id": str(session.pk),
+        "status": session.status,
+        "received": session.received,
+        "total_size": session.total_size,
+        "chunk_size": staging.chunk_bytes(),
+        **extra,
+    })
 
-    return render(request, "uploads/upload.html", {"metric_types": metric_types})
+
+def _error_json(exc: staging.StagingError, session: UploadSession | None = None) -> JsonResponse:
+    data = {"error": str(exc)}
+    if session is not None:
+        data["received"] = session.received
+    return JsonResponse(data, status=exc.status)
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+@require_POST
+def upload_session_start(request):
+    """Abre a sessão: metric_type, filename, size e (opcional) sha256 no POST."""
+    try:
+        metric = MetricType.objects.get(pk=request.POST.get("metric_type"))
+    except (MetricType.DoesNotExist, ValueError):
+        return JsonResponse({"error": "Métrica inválida."}, status=400)
+    try:
+        size = int(request.POST.get("size", ""))
+    except ValueError:
+        return JsonResponse({"error": "Tamanho inválido."}, status=400)
+    try:
+        session = staging.start_session(
+            request.user, metric, request.POST.get("filename", ""), size, request.POST.get("sha256", ""),
+        )
+    except staging.StagingError as exc:
+        return _error_json(exc)
+    return _session_json(session)
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+@require_http_methods(["GET", "PUT"])
+def upload_session_chunk(request, pk):
+    """
+    GET: offset já recebido (para retomar).
+    PUT: corpo cru da parte, com X-Upload-Offset e (opcional) X-Chunk-SHA256.
+    """
+    session = get_object_or_404(UploadSession, pk=pk, user=request.user)
+    if request.method == "GET":
+        return _session_json(session)
+
+    try:
+        offset = int(request.headers.get("X-Upload-Offset", ""))
+        length = int(request.headers.get("Content-Length", ""))
+    except ValueError:
+        return JsonResponse({"error": "Cabeçalhos X-Upload-Offset/Content-Length obrigatórios."}, status=400)
+    try:
+        # lê o corpo em blocos direto do stream (request.body carregaria tudo na memória)
+        staging.append_chunk(session, offset, request, length, request.headers.get("X-Chunk-SHA256", ""))
+    except staging.StagingError as exc:
+        return _error_json(exc, session)
+    return _session_json(session)
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def upload_session_preview(request, pk):
+    session = get_object_or_404(UploadSession.objects.select_related("metric_type"), pk=pk, user=request.user)
+    try:
+        return JsonResponse(staging.preview(session))
+    except staging.StagingError as exc:
+        return _error_json(exc, session)
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+@require_POST
+def upload_session_finish(request, pk):
+    session = get_object_or_404(UploadSession.objects.select_related("metric_type"), pk=pk, user=request.user)
+    try:
+        batch = staging.finish(session)
+    except staging.StagingError as exc:
+        return _error_json(exc, session)
+    messages.info(request, f"Arquivo recebido (lote #{batch.id}). A importação continua em segundo plano.")
+    return _session_json(
+        session,
+        batch_id=batch.id,
+        status_url=reverse("uploads:status", args=[batch.id]),
+        next_url=_batch_url(batch.id),
+    )
@@ -0,0 +1,529 @@
+"""
+Leitor enxuto de .xlsx para o import de métricas.
+
+Lê o XML da planilha direto do zip com expat (sem montar objetos de célula
+do openpyxl), extrai apenas as colunas mapeadas e converte seriais de
+data/hora do Excel na hora da leitura, usando os estilos só para saber
+quais células têm formato de data. Para arquivos fora do padrão o
+chamador deve cair no openpyxl (XlsxReaderError).
+"""
+from __future__ import annotations
+
+import html
+import posixpath
+import re
+import zipfile
+from datetime import datetime
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from xml.etree import ElementTree as ET
+from xml.parsers import expat
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel
+
+MAIN_NS = (
+    "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "http://purl.oclc.org/ooxml/spreadsheetml/main",
+)
+REL_NS = (
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "http://purl.oclc.org/ooxml/officeDocument/relationships",
+)
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+# quanto ler do zip por vez
+READ_CHUNK = 256 * 1024
+
+
+class XlsxReaderError(Exception):
+    """Arquivo que o leitor rápido não sabe ler (usar openpyxl)."""
+
+
+def _local_tags(*names: str) -> Dict[str, str]:
+    """Mapa 'namespace nome' (como o expat entrega) -> nome local."""
+    return {f"{ns} {n}": n for ns in MAIN_NS for n in names}
+
+
+_SHEET_TAGS = _local_tags("row", "dimension")
+_SST_TAGS = _local_tags("si", "t", "rPh")
+
+# varredura do XML da aba (prefixo de namespace opcional, ex.: <x:c>)
+_P = rb"(?:[A-Za-z_][\w.-]*:)?"
+_ROW_REF = re.compile(rb'\br="(\d+)"')
+_TYPE_ATTR = re.compile(rb'\bt="(\w+)"')
+_STYLE_ATTR = re.compile(rb'\bs="(\d+)"')
+_V_TEXT = re.compile(rb"<" + _P + rb"v>([^<]*)</" + _P + rb"v>")
+_T_TEXT = re.compile(rb"<" + _P + rb"t(?:\s[^>]*)?>([^<]*)</" + _P + rb"t>")
+_ROW_END = re.compile(rb"</" + _P + rb"row>|<" + _P + rb"row\b[^>]*/>")
+_CELL_WITHOUT_REF = re.compile(rb"<" + _P + rb"c(?:\s(?![^>]*\br=)[^>]*)?/?>")
+_COLUMN_LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def _column_letter(idx: int) -> str:
+    letters = ""
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = _COLUMN_LETTERS[rem] + letters
+    return letters
+
+
+def _cell_pattern(columns: Optional[Set[int]]):
+    """
+    Casa <row ...> (grupo 1) ou uma célula das colunas pedidas:
+    grupo 2 = atributos, 3 = letras da coluna, 4 = conteúdo.
+    """
+    if columns is None:
+        cols = rb"[A-Z]+"
+    else:
+        cols = b"(?:" + b"|".join(sorted((_column_letter(c).encode() for c in columns), key=len, reverse=True)) + b")"
+    return re.compile(
+        rb"<" + _P + rb"row\b([^>]*)>"
+        rb"|<" + _P + rb"c\s(?=[^>]*\br=\"" + cols + rb"\d)([^>]*?\br=\"([A-Z]+)\d+\"[^>]*?)"
+        rb"(?:/>|>(.*?)</" + _P + rb"c>)",
+        re.DOTALL,
+    )
+
+
+def _last_row_end(buf: bytes) -> int:
+    """Posição logo após o último fim de linha completo no buffer (-1 se nenhum)."""
+    pos = -1
+    # uma linha nunca chega perto de 64 KB: basta olhar o final do buffer
+    for m in _ROW_END.finditer(buf, max(0, len(buf) - 65536)):
+        pos = m.end()
+    if pos < 0 and len(buf) > 65536:
+        for m in _ROW_END.finditer(buf):
+            pos = m.end()
+    return pos
+
+
+def _row_blocks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Junta pedaços do XML em blocos que terminam em fim de linha (o resto vai no último)."""
+    buf = b""
+    for chunk in chunks:
+        buf += chunk
+        cut = _last_row_end(buf)
+        if cut < 0:
+            continue
+        yield buf[:cut]
+        buf = buf[cut:]
+    if buf:
+        yield buf
+
+
+def row_boundaries(mm, parts: int) -> List[int]:
+    """
+    Posições de corte do XML de uma aba (mmap/bytes) em até `parts` faixas,
+    cada uma logo após um fim de linha: nenhuma linha fica dividida.
+    Devolve [0, corte1, ..., len].
+    """
+    size = len(mm)
+    cuts = [0]
+    for k in range(1, parts):
+        pos = max(size * k // parts, cuts[-1])
+        while pos < size:
+            window = mm[pos:pos + 65536]
+            m = _ROW_END.search(window)
+            if m:
+                pos += m.end()
+                break
+            # a janela pode ter cortado a tag ao meio: recua um pouco
+            pos += max(len(window) - 16, 1)
+        else:
+            break
+        if pos >= size:
+            break
+        if pos > cuts[-1]:
+            cuts.append(pos)
+    cuts.append(size)
+    return cuts
+
+
+def column_index(ref: str) -> int:
+    """'A1' -> 0, 'C7' -> 2, 'AB3' -> 27."""
+    idx = 0
+    for ch in ref:
+        o = ord(ch)
+        if 65 <= o <= 90:
+            idx = idx * 26 + (o - 64)
+        else:
+            break
+    return idx - 1
+
+
+def _cast_number(text: str):
+    # mesma regra do openpyxl: inteiro quando não há ponto/expoente
+    if "." in text or "E" in text or "e" in text:
+        return float(text)
+    return int(text)
+
+
+def _find(elem, local: str, namespaces: Iterable[str]):
+    for ns in namespaces:
+        found = elem.find(f"{{{ns}}}{local}")
+        if found is not None:
+            return found
+    return None
+
+
+def _findall(elem, path_locals: Tuple[str, ...], namespaces: Iterable[str]):
+    for ns in namespaces:
+        path = "/".join(f"{{{ns}}}{p}" for p in path_locals)
+        found = elem.findall(path)
+        if found:
+            return found
+    return []
+
+
+class XlsxSheetReader:
+    """
+    Abre um .xlsx (caminho ou arquivo) e lê as abas em streaming.
+
+        reader = XlsxSheetReader(f)
+        sheet = reader.active_sheet()
+        header = reader.header(sheet)
+        for excel_row, values in reader.iter_rows(sheet, {0, 2, 5}):
+            ...   # values: {indice_coluna: valor}
+    """
+
+    def __init__(self, source):
+        try:
+            self.zf = zipfile.ZipFile(source)
+        except (zipfile.BadZipFile, OSError) as exc:
+            raise XlsxReaderError(str(exc)) from exc
+        try:
+            self._load_workbook()
+            self._shared_strings: Optional[List[str]] = None
+            self._load_styles()
+        except (KeyError, ET.ParseError, ValueError) as exc:
+            raise XlsxReaderError(str(exc)) from exc
+
+    # ---------- metadados do workbook ----------
+
+    def _load_workbook(self) -> None:
+        wb_path = "xl/workbook.xml"
+        root = ET.fromstring(self.zf.read(wb_path))
+        rels = self._load_rels(wb_path)
+
+        pr = _find(root, "workbookPr", MAIN_NS)
+        date1904 = pr is not None and pr.get("date1904") in ("1", "true")
+        self.epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+
+        self.sheets: List[Tuple[str, str]] = []  # (nome, caminho no zip)
+        for sheet in _findall(root, ("sheets", "sheet"), MAIN_NS):
+            rid = next((sheet.get(f"{{{ns}}}id") for ns in REL_NS if sheet.get(f"{{{ns}}}id")), None)
+            target = rels.get(rid)
+            if target and "worksheets/" in target:
+                self.sheets.append((sheet.get("name") or "", target))
+        if not self.sheets:
+            raise XlsxReaderError("Nenhuma aba encontrada")
+
+        self.active_index = 0
+        views = _find(root, "bookViews", MAIN_NS)
+        view = _find(views, "workbookView", MAIN_NS) if views is not None else None
+        if view is not None and view.get("activeTab"):
+            self.active_index = min(int(view.get("activeTab")), len(self.sheets) - 1)
+
+        self._sst_path = next((t for t in rels.values() if t.endswith("sharedStrings.xml")), None)
+        self._styles_path = next((t for t in rels.values() if t.endswith("styles.xml")), None)
+
+    def _load_rels(self, part: str) -> Dict[str, str]:
+        folder, name = posixpath.split(part)
+        rels_path = posixpath.join(folder, "_rels", f"{name}.rels")
+        try:
+            root = ET.fromstring(self.zf.read(rels_path))
+        except KeyError:
+            return {}
+        rels = {}
+        for rel in root.iter(f"{{{PKG_REL_NS}}}Relationship"):
+            target = rel.get("Target") or ""
+            if target.startswith("/"):
+                target = target.lstrip("/")
+            else:
+                target = posixpath.normpath(posixpath.join(folder, target))
+            rels[rel.get("Id")] = target
+        return rels
+
+    def _load_styles(self) -> None:
+        """Índices de estilo (atributo s da célula) com formato de data/duração."""
+        self.date_styles: Set[str] = set()
+        self.timedelta_styles: Set[str] = set()
+        if not self._styles_path or self._styles_path not in self.zf.namelist():
+            return
+        root = ET.fromstring(self.zf.read(self._styles_path))
+        formats = dict(BUILTIN_FORMATS)
+        for fmt in _findall(root, ("numFmts", "numFmt"), MAIN_NS):
+            formats[int(fmt.get("numFmtId"))] = fmt.get("formatCode") or ""
+        for i, xf in enumerate(_findall(root, ("cellXfs", "xf"), MAIN_NS)):
+            code = formats.get(int(xf.get("numFmtId") or 0), "")
+            if is_timedelta_format(code):
+                self.timedelta_styles.add(str(i))
+            elif is_date_format(code):
+                self.date_styles.add(str(i))
+
+    @property
+    def shared_strings(self) -> List[str]:
+        if self._shared_strings is None:
+            self._shared_strings = self._load_shared_strings()
+        return self._shared_strings
+
+    def _load_shared_strings(self) -> List[str]:
+        strings: List[str] = []
+        if not self._sst_path or self._sst_path not in self.zf.namelist():
+            return strings
+        parts: List[str] = []
+        state = {"in_t": False, "in_rph": False}
+
+        def start(name, attrs):
+            tag = _SST_TAGS.get(name)
+            if tag == "si":
+                parts.clear()
+            elif tag == "t" and not state["in_rph"]:
+                state["in_t"] = True
+            elif tag == "rPh":
+                state["in_rph"] = True
+
+        def end(name):
+            tag = _SST_TAGS.get(name)
+            if tag == "si":
+                strings.append("".join(parts))
+            elif tag == "t":
+                state["in_t"] = False
+            elif tag == "rPh":
+                state["in_rph"] = False
+
+        def data(text):
+            if state["in_t"]:
+                parts.append(text)
+
+        parser = expat.ParserCreate(namespace_separator=" ")
+        parser.buffer_text = True
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = data
+        with self.zf.open(self._sst_path) as fh:
+            parser.ParseFile(fh)
+        return strings
+
+    # ---------- leitura das linhas ----------
+
+    def active_sheet(self) -> str:
+        return self.sheets[self.active_index][1]
+
+    def header(self, sheet: str, header_row: int = 1) -> List:
+        for r_idx, values in self.iter_rows(sheet, None, min_row=header_row, max_row=header_row):
+            if not values:
+                return []
+            width = max(values) + 1
+            return [values.get(i) for i in range(width)]
+        return []
+
+    def dimension_rows(self, sheet: str) -> Optional[int]:
+        """Última linha segundo <dimension ref="A1:C999">, sem ler a aba toda."""
+        found: List[str] = []
+
+        def start(name, attrs):
+            tag = _SHEET_TAGS.get(name)
+            if tag == "dimension":
+                found.append(attrs.get("ref") or "")
+                raise _StopParsing
+            if tag == "row":
+                raise _StopParsing
+
+        parser = expat.ParserCreate(namespace_separator=" ")
+        parser.StartElementHandler = start
+        with self.zf.open(sheet) as fh:
+            try:
+                while True:
+                    chunk = fh.read(64 * 1024)
+                    if not chunk:
+                        break
+                    parser.Parse(chunk, False)
+            except _StopParsing:
+                pass
+        if not found:
+            return None
+        last = found[0].split(":")[-1]
+        digits = "".join(ch for ch in last if ch.isdigit())
+        return int(digits) if digits else None
+
+    def iter_rows(
+        self,
+        sheet: str,
+        columns: Optional[Set[int]],
+        min_row: int = 1,
+        max_row: Optional[int] = None,
+    ) -> Iterator[Tuple[int, Dict[int, object]]]:
+        """
+        Gera (linha_excel, {coluna: valor}) só com as colunas pedidas
+        (None = todas). Como no openpyxl, linhas ausentes entre a primeira e a
+        última do XML aparecem vazias ({}).
+
+        O XML é varrido por expressão regular que só casa células das colunas
+        pedidas; as demais são puladas dentro do motor de regex, sem custo
+        de Python por célula.
+        """
+        try:
+            fh = self.zf.open(sheet)
+        except KeyError as exc:
+            raise XlsxReaderError(str(exc)) from exc
+        with fh:
+            yield from self._parse_rows(_row_blocks(iter(lambda: fh.read(READ_CHUNK), b"")),
+                                        columns, min_row, max_row)
+
+    def extract_sheet(self, sheet: str, dest) -> int:
+        """Copia o XML descompactado da aba para `dest` (arquivo binário); devolve os bytes copiados."""
+        try:
+            fh = self.zf.open(sheet)
+        except KeyError as exc:
+            raise XlsxReaderError(str(exc)) from exc
+        size = 0
+        with fh:
+            for chunk in iter(lambda: fh.read(READ_CHUNK), b""):
+                dest.write(chunk)
+                size += len(chunk)
+        return size
+
+    def iter_rows_in_range(
+        self,
+        xml_path: str,
+        start: int,
+        end: int,
+        columns: Optional[Set[int]],
+        min_row: int = 1,
+        fill_from_min_row: bool = False,
+    ) -> Iterator[Tuple[int, Dict[int, object]]]:
+        """
+        Como iter_rows, mas sobre os bytes [start, end) do XML já extraído
+        (extract_sheet), cortados em fim de linha (row_boundaries). Só a
+        faixa que começa a aba preenche as linhas vazias desde min_row; nas
+        outras as linhas que faltam antes da primeira ficam para quem junta
+        as faixas.
+        """
+        def chunks():
+            with open(xml_path, "rb") as fh:
+                fh.seek(start)
+                left = end - start
+                while left > 0:
+                    chunk = fh.read(min(READ_CHUNK, left))
+                    if not chunk:
+                        break
+                    left -= len(chunk)
+                    yield chunk
+
+        yield from self._parse_rows(_row_blocks(chunks()), columns, min_row, None, fill_from_min_row)
+
+    def _parse_rows(
+        self,
+        blocks: Iterator[bytes],
+        columns: Optional[Set[int]],
+        min_row: int,
+        max_row: Optional[int],
+        fill_from_min_row: bool = True,
+    ) -> Iterator[Tuple[int, Dict[int, object]]]:
+        cell_re = _cell_pattern(columns)
+        sst = None
+        epoch = self.epoch
+        date_styles = self.date_styles
+        timedelta_styles = self.timedelta_styles
+
+        row = 0
+        # última linha entregue (None = ainda nenhuma e sem preencher o começo)
+        last: Optional[int] = min_row - 1 if fill_from_min_row else None
+        vals: Optional[Dict[int, object]] = None
+
+        done = False
+        for block in chain(blocks, [None]):
+            if block is None:
+                # fim do XML: fecha a última linha
+                block, done = b"", True
+
+            if _CELL_WITHOUT_REF.search(block):
+                raise XlsxReaderError("Célula sem referência (r=)")
+
+            out: List[Tuple[int, Dict[int, object]]] = []
+            for m in cell_re.finditer(block):
+                row_attrs = m.group(1)
+                if row_attrs is not None:
+                    # início de <row>: fecha a anterior
+                    if vals is not None:
+                        for gap in range(row if last is None else last + 1, row):
+                            out.append((gap, {}))
+                        out.append((row, vals))
+                        last = row
+                    rm = _ROW_REF.search(row_attrs)
+                    row = int(rm.group(1)) if rm else row + 1
+                    if max_row is not None and row > max_row:
+                        # linhas vazias até max_row (como se a leitura seguisse)
+                        if last is not None:
+                            for gap in range(last + 1, min(row, max_row + 1)):
+                                out.append((gap, {}))
+                        vals = None
+                        done = True
+                        break
+                    vals = {} if row >= min_row else None
+                    continue
+                if vals is None:
+                    continue
+                attrs = m.group(2)
+                col = column_index(m.group(3).decode())
+                body = m.group(4)
+                tm = _TYPE_ATTR.search(attrs)
+                ctype = tm.group(1).decode() if tm else "n"
+                if ctype == "inlineStr":
+                    text = "".join(t.decode("utf-8") for t in _T_TEXT.findall(body or b""))
+                else:
+                    vm = _V_TEXT.search(body) if body else None
+                    text = vm.group(1).decode("utf-8") if vm else ""
+                if "&" in text:
+                    text = html.unescape(text)
+                try:
+                    if ctype == "n":
+                        if text == "":
+                            value = None
+                        else:
+                            value = _cast_number(text)
+                            sm = _STYLE_ATTR.search(attrs)
+                            if sm:
+                                style = sm.group(1).decode()
+                                if style in date_styles:
+                                    value = from_excel(value, epoch)
+                                elif style in timedelta_styles:
+                                    value = from_excel(value, epoch, timedelta=True)
+                    elif ctype == "s":
+                        if sst is None:
+                            sst = self.shared_strings
+                        value = sst[int(text)]
+                    elif ctype == "b":
+                        value = text == "1"
+                    elif ctype == "d":
+                        value = datetime.fromisoformat(text)
+                    else:  # str, inlineStr, e
+                        value = text
+                except (ValueError, IndexError) as exc:
+                    raise XlsxReaderError(str(exc)) from exc
+                vals[col] = value
+
+            if done and vals is not None:
+                for gap in range(row if last is None else last + 1, row):
+                    out.append((gap, {}))
+                out.append((row, vals))
+                last = row
+                vals = None
+            yield from out
+            if done:
+                return
+
+    def close(self) -> None:
+        self.zf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _StopParsing(Exception):
+    pass
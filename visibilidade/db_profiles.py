@@ -0,0 +1,98 @@
+"""
+Perfis de conexão com o banco, escolhidos por variável de ambiente.
+
+DB_PROFILE:
+  - "basic":  só DATABASE_URL + conexões persistentes (comportamento antigo)
+  - "tuned":  (padrão) health checks; no SQLite, WAL + pragmas e escrita
+              com BEGIN IMMEDIATE para evitar "database is locked"
+  - "pooled": igual ao "tuned", mas no PostgreSQL usa o pool do psycopg 3
+              (pacote psycopg-pool) no lugar das conexões persistentes
+
+Ajustes finos (todos opcionais):
+  DB_CONN_MAX_AGE, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT,
+  DB_DISABLE_SERVER_SIDE_CURSORS (necessário atrás de pgbouncer em modo
+  transaction), DB_SQLITE_BUSY_TIMEOUT_MS, DB_SQLITE_CACHE_KB,
+  DB_SQLITE_MMAP_MB, DB_SQLITE_SYNCHRONOUS.
+"""
+from __future__ import annotations
+
+import os
+
+import dj_database_url
+
+PROFILES = ("basic", "tuned", "pooled")
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _sqlite_options(profile: str) -> dict:
+    if profile == "basic":
+        return {}
+    busy_ms = _env_int("DB_SQLITE_BUSY_TIMEOUT_MS", 20000)
+    pragmas = [
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={os.getenv('DB_SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"PRAGMA busy_timeout={busy_ms}",
+        f"PRAGMA cache_size=-{_env_int('DB_SQLITE_CACHE_KB', 64000)}",
+        f"PRAGMA mmap_size={_env_int('DB_SQLITE_MMAP_MB', 256) * 1024 * 1024}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    return {
+        # aplicado a cada nova conexão
+        "init_command": ";".join(pragmas),
+        # pega o lock de escrita no BEGIN: uploads concorrentes esperam em vez de falhar
+        "transaction_mode": "IMMEDIATE",
+        "timeout": busy_ms / 1000,
+    }
+
+
+def _postgres_options(profile: str) -> dict:
+    if profile != "pooled":
+        return {}
+    return {
+        "pool": {
+            "min_size": _env_int("DB_POOL_MIN_SIZE", 2),
+            "max_size": _env_int("DB_POOL_MAX_SIZE", 10),
+            "timeout": _env_int("DB_POOL_TIMEOUT", 10),
+        },
+    }
+
+
+def database_config(url: str, profile: str | None = None) -> dict:
+    """Monta o dict de DATABASES[alias] para a URL e o perfil informados."""
+    profile = (profile or os.getenv("DB_PROFILE") or "tuned").strip().lower()
+    if profile not in PROFILES:
+        raise ValueError(f"DB_PROFILE inválido: {profile!r} (use {', '.join(PROFILES)})")
+
+    conn_max_age = _env_int("DB_CONN_MAX_AGE", 600)
+    config = dj_database_url.parse(url, conn_max_age=conn_max_age)
+    engine = config["ENGINE"]
+    options = config.setdefault("OPTIONS", {})
+
+    if profile != "basic":
+        # valida conexões persistentes antes de reutilizar (evita erro após restart do banco)
+        config["CONN_HEALTH_CHECKS"] = True
+
+    if engine.endswith("sqlite3"):
+        options.update(_sqlite_options(profile))
+    elif engine.endswith("postgresql"):
+        pg_options = _postgres_options(profile)
+        if pg_options:
+            options.update(pg_options)
+            # o pool já reaproveita conexões; o Django exige CONN_MAX_AGE=0 com pool
+            config["CONN_MAX_AGE"] = 0
+        config["DISABLE_SERVER_SIDE_CURSORS"] = _env_bool("DB_DISABLE_SERVER_SIDE_CURSORS")
+
+    return config
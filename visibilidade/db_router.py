@@ -0,0 +1,96 @@
+"""
+Leituras do dashboard, dos comparativos e das exportações na réplica.
+
+Só as views marcadas com @use_replica leem da réplica (DATABASE_REPLICA_URL);
+todo o resto, e toda escrita, vai para o banco principal. A escolha é feita
+uma vez por request e guardada numa ContextVar, que o ReplicaRouter lê em
+cada consulta (e que acompanha o sync_to_async das views assíncronas).
+
+Atraso da réplica: quando um lote de import termina, stick_to_primary()
+marca no cache uma janela (REPLICA_STICKY_SECONDS) em que as leituras
+voltam para o principal, para ninguém abrir o dashboard logo depois do
+upload e ver os dados antigos.
+
+Para testar localmente, aponte DATABASE_REPLICA_URL para um segundo banco
+(ex. sqlite:///replica.sqlite3 + manage.py migrate --database replica e uma
+cópia dos dados); nos testes automatizados a réplica espelha o default.
+"""
+from __future__ import annotations
+
+import time
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import cache
+
+STICKY_KEY = "db:primary_until"
+
+_read_alias: ContextVar[str | None] = ContextVar("db_read_alias", default=None)
+
+
+def replica_alias() -> str | None:
+    alias = getattr(settings, "DATABASE_REPLICA_ALIAS", "replica")
+    return alias if alias in settings.DATABASES else None
+
+
+def stick_to_primary(seconds: int | None = None) -> None:
+    """Leituras no principal pelos próximos `seconds` (padrão REPLICA_STICKY_SECONDS)."""
+    if replica_alias() is None:
+        return
+    if seconds is None:
+        seconds = getattr(settings, "REPLICA_STICKY_SECONDS", 30)
+    cache.set(STICKY_KEY, time.time() + seconds, seconds)
+
+
+def _choose(primary_until) -> str | None:
+    alias = replica_alias()
+    if alias is None or (primary_until or 0) > time.time():
+        return None
+    return alias
+
+
+def use_replica(view):
+    """Marca uma view somente leitura: consultas dela vão para a réplica, fora da janela pós-import."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            alias = _choose(await cache.aget(STICKY_KEY)) if replica_alias() else None
+            token = _read_alias.set(alias)
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                _read_alias.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        alias = _choose(cache.get(STICKY_KEY)) if replica_alias() else None
+        token = _read_alias.set(alias)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+    return wrapper
+
+
+def pin_read(qs):
+    """
+    Fixa no queryset o banco escolhido para o request. Necessário quando a
+    consulta roda depois que a view retorna (StreamingHttpResponse).
+    """
+    alias = _read_alias.get()
+    return qs.using(alias) if alias else qs
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # réplica e principal têm os mesmos dados
+        return True
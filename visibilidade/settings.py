@@ -29,6 +29,7 @@ INSTALLED_APPS = [
 "metrics",
 "uploads",
 "dashboards",
+"resultados",
 ]
 
 
@@ -60,7 +61,6 @@ TEMPLATES = [
 {
 "BACKEND": "django.template.backends.django.DjangoTemplates",
 "DIRS": [BASE_DIR / "templates"],
-"APP_DIRS": True,
 "OPTIONS": {
 "context_processors": [
 "django.template.context_processors.debug",
@@ -68,6 +68,13 @@ TEMPLATES = [
 "django.contrib.auth.context_processors.auth",
 "django.contrib.messages.context_processors.messages",
 ],
+# templates compilados uma vez por processo (com DEBUG o autoreload limpa o cache)
+"loaders": [
+("django.template.loaders.cached.Loader", [
+"django.template.loaders.filesystem.Loader",
+"django.template.loaders.app_directories.Loader",
+]),
+],
 },
 },
 ]
@@ -76,11 +83,66 @@ TEMPLATES = [
 WSGI_APPLICATION = "visibilidade.wsgi.application"
 
 
-# DB via DATABASE_URL
-import dj_database_url
+# DB via DATABASE_URL; perfil de conexão via DB_PROFILE (ver visibilidade/db_profiles.py)
+from .db_profiles import database_config
 DATABASES = {
-"default": dj_database_url.parse(os.getenv("DATABASE_URL", "sqlite:///db.sqlite3"), conn_max_age=600)
+"default": database_config(os.getenv("DATABASE_URL", "sqlite:///db.sqlite3"))
+}
+
+# Réplica de leitura (opcional) para as views com @use_replica (visibilidade/db_router.py)
+DATABASE_REPLICA_ALIAS = "replica"
+if os.getenv("DATABASE_REPLICA_URL"):
+    DATABASES[DATABASE_REPLICA_ALIAS] = database_config(os.getenv("DATABASE_REPLICA_URL"))
+    # nos testes a réplica é o próprio banco default
+    DATABASES[DATABASE_REPLICA_ALIAS]["TEST"] = {"MIRROR": "default"}
+DATABASE_ROUTERS = ["visibilidade.db_router.ReplicaRouter"]
+# depois de um import, leituras ficam no principal por este tempo (atraso da réplica)
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "30"))
+
+# Cache: padrão em memória do processo, só para desenvolvimento. Com vários
+# workers use um backend compartilhado (ex. CACHE_BACKEND=
+# django.core.cache.backends.db.DatabaseCache, CACHE_LOCATION=cache_table +
+# manage.py createcachetable), senão a versão dos dados e o índice de acesso
+# (metrics/versions.py, accounts/access.py) não chegam aos outros processos:
+# fora do DEBUG o check metrics.W001 avisa, e no cache local as entradas
+# versionadas valem no máximo LOCAL_CACHE_SECONDS.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "visibilidade"),
+    }
 }
+LOCAL_CACHE_SECONDS = int(os.getenv("LOCAL_CACHE_SECONDS", "60"))
+# comparativos da equipe (dashboards/analytics.py)
+TEAM_ANALYTICS_CACHE_SECONDS = int(os.getenv("TEAM_ANALYTICS_CACHE_SECONDS", "3600"))
+# seções do dashboard individual e aviso de fora da meta (chave com a versão dos dados)
+DASHBOARD_CACHE_SECONDS = int(os.getenv("DASHBOARD_CACHE_SECONDS", "3600"))
+
+
+# Retenção de MetricRecord (metrics/partitions.py, comando compact_metrics):
+# meses inteiros mais antigos que isso vão para o arquivo frio
+METRICS_HOT_MONTHS = int(os.getenv("METRICS_HOT_MONTHS", "13"))
+# partições mensais criadas à frente (PostgreSQL)
+METRICS_PARTITION_AHEAD_MONTHS = int(os.getenv("METRICS_PARTITION_AHEAD_MONTHS", "3"))
+# Snapshot colunar (.npy) por métrica para análises em massa (metrics/snapshots.py,
+# comando snapshot_metrics). Opcional: precisa de numpy e de uma pasta, ex.
+# METRICS_SNAPSHOT_DIR=/srv/visibilidade/var/metric_snapshots; vazio = desligado.
+METRICS_SNAPSHOT_DIR = os.getenv("METRICS_SNAPSHOT_DIR", "")
+
+
+# Import paralelo (uploads/parallel.py): 0 ou 1 = desligado
+UPLOAD_PARALLEL_WORKERS = int(os.getenv("UPLOAD_PARALLEL_WORKERS", "0"))
+UPLOAD_PARALLEL_MAX_MEMORY_MB = int(os.getenv("UPLOAD_PARALLEL_MAX_MEMORY_MB", "1024"))
+UPLOAD_PARALLEL_MIN_BYTES = int(os.getenv("UPLOAD_PARALLEL_MIN_BYTES", str(5 * 1024 * 1024)))
+
+# Upload em partes (uploads/staging.py): arquivos vão direto para o disco
+UPLOAD_STAGING_DIR = os.getenv("UPLOAD_STAGING_DIR", str(BASE_DIR / "var" / "upload_staging"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_MB", "512")) * 1024 * 1024
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_MB", "8")) * 1024 * 1024
+# sessões incompletas mais velhas que isso são removidas por purge_upload_staging
+UPLOAD_STAGING_MAX_AGE_HOURS = int(os.getenv("UPLOAD_STAGING_MAX_AGE_HOURS", "48"))
+# uploads pelo formulário simples acima disso vão para arquivo temporário, não memória
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2 * 1024 * 1024
 
 
 # settings.py
@@ -0,0 +1,55 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from metrics.models import MetricRecord
+
+from . import db_router
+from .db_router import ReplicaRouter, pin_read, stick_to_primary, use_replica
+
+
+def with_replica():
+    """Réplica configurada (só a entrada em DATABASES; nenhuma consulta abre a conexão)."""
+    return mock.patch.dict(settings.DATABASES, {"replica": settings.DATABASES["default"]})
+
+
+@override_settings(REPLICA_STICKY_SECONDS=30)
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        cache.delete(db_router.STICKY_KEY)
+        self.router = ReplicaRouter()
+
+    def test_without_replica_reads_go_to_default(self):
+        self.assertIsNone(db_router.replica_alias())
+        self.assertIsNone(use_replica(lambda: self.router.db_for_read(MetricRecord))())
+
+    def test_marked_view_reads_from_replica(self):
+        with with_replica():
+            self.assertEqual(use_replica(lambda: self.router.db_for_read(MetricRecord))(), "replica")
+            # fora da view marcada, e para escrita, sempre o principal
+            self.assertIsNone(self.router.db_for_read(MetricRecord))
+            self.assertEqual(use_replica(lambda: self.router.db_for_write(MetricRecord))(), "default")
+
+    def test_sticky_window_after_import(self):
+        with with_replica():
+            stick_to_primary()
+            self.assertIsNone(use_replica(lambda: self.router.db_for_read(MetricRecord))())
+            cache.delete(db_router.STICKY_KEY)
+            self.assertEqual(use_replica(lambda: self.router.db_for_read(MetricRecord))(), "replica")
+
+    def test_pin_read_for_streaming(self):
+        with with_replica():
+            qs = use_replica(lambda: pin_read(MetricRecord.objects.all()))()
+        # o queryset guarda o banco e pode ser avaliado depois que a view retorna
+        self.assertEqual(qs.db, "replica")
+        self.assertEqual(pin_read(MetricRecord.objects.all()).db, "default")
+
+    async def test_async_view(self):
+        async def view():
+            return self.router.db_for_read(MetricRecord)
+
+        with with_replica():
+            self.assertEqual(await use_replica(view)(), "replica")
+        self.assertIsNone(self.router.db_for_read(MetricRecord))
@@ -13,5 +13,6 @@ urlpatterns = [
     path("accounts/", include("allauth.urls")),
     path("uploads/", include("uploads.urls")),
     path("dashboard/", include("dashboards.urls")),
+    path("resultados/", include("resultados.urls")),
     path("", home, name="home"),
 ]
\ No newline at end of file